@@ -1,14 +1,17 @@
 # app.py
 
 import os
+import json
+import time
 import uuid
-import shutil
+import asyncio
 import logging
-from pathlib import Path
+import zipfile
 from dotenv import load_dotenv
-from typing import Dict, Optional, List, Any
+from typing import Optional, List, Any
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 
 # Load environment variables FIRST
@@ -22,23 +25,45 @@ if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY environment variable not found. Please set it in your .env file.")
 
 # Now, import your modules that rely on the key
-from summarizer import generate_document_summary, extract_last_date
-from models import SummaryResponse, LegalDocSummary, LastDateResponse
+from summarizer import aanalyze_document, aextract_last_date, model_id
+from models import SummaryResponse, LegalDocSummary, LastDateResponse, DocumentAnalysis
 from utils import extract_text_from_pdf
-from modules.chunking import file_to_chunks
-from modules.embedding_store import build_faiss_from_chunks, INDEX_DIR
-from modules.retriever import answer_query
-from modules.chatbot import init_chat, add_user_message, add_bot_message
+from modules.embedding_store import (
+    warm_up_embedding_model, embedding_model_stats, embedding_engine_stats, shutdown_embedding_engines,
+)
+from modules.ingest_jobs import ingest_jobs, QueueFullError
+from modules.index_cache import index_cache
+from modules.corpus import corpus, SourceNotFoundError
+from modules.embedding_cache import EMBEDDING_CACHE_ENABLED, get_embedding_cache
+from modules.result_cache import get_result_cache, make_key
+from modules.answer_cache import answer_cache
+from modules.deadline_extractor import extract_deadline, head_and_tail
+from modules.retriever import aanswer_query, astream_answer_query
+from modules.llm_gateway import llm_gateway
+from modules.async_exec import get_limiter, run_blocking, run_cpu, concurrency_stats, shutdown_executor
+from modules.session_store import sessions
+from modules.uploads import read_upload, is_zip, expand_zip, UploadTooLargeError, UploadRoute
+from modules.extraction import SUPPORTED, shutdown_page_pool
+from modules.metrics import REGISTRY, TimingMiddleware, register_callback, stage
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global state for the application
-db_session: Dict[str, dict] = {}
+# /extract-last-date/ has no language field; its combined analysis is cached under this one
+ANALYSIS_DEFAULT_LANGUAGE = os.getenv("ANALYSIS_DEFAULT_LANGUAGE", "English")
+
+# documents per /summarize/batch/ request, and how many of them are summarized at once
+SUMMARY_BATCH_MAX_FILES = int(os.getenv("SUMMARY_BATCH_MAX_FILES", "100"))
+SUMMARY_BATCH_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_CONCURRENCY", "8"))
+
+# /extract-last-date/ only calls the LLM when the rule-based extractor is less confident than this
+DEADLINE_RULES_MIN_CONFIDENCE = float(os.getenv("DEADLINE_RULES_MIN_CONFIDENCE", "0.75"))
 
 # Initialize FastAPI
 app = FastAPI()
+# uploads stay in memory up to UPLOAD_MEMORY_BYTES instead of Starlette's 1 MB spool
+app.router.route_class = UploadRoute
 
 # Configure CORS
 origins = ["*"]
@@ -49,47 +74,204 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# request latency by route, and the Server-Timing header when METRICS_TIMING_HEADERS is set
+app.add_middleware(TimingMiddleware)
+
+# Ingest job status, corpus manifests and loaded indexes live in this process, so the API
+# runs as one worker process; the ingest pool and the blocking thread pool scale it instead.
+# Sessions persisted to SQLite survive restarts but do not make several workers coherent.
+@app.on_event("startup")
+def check_single_worker():
+    if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        logger.warning("WEB_CONCURRENCY > 1: workers do not share ingest jobs or index updates; run one worker")
+
+def drop_conversation_index(session_id: str, index_key: str):
+    # a session that ended can never be resumed, so nothing will search its index again
+    answer_cache.invalidate(index_key)
+    corpus.delete(index_key)
+
+sessions.on_end(drop_conversation_index)
+
+@app.on_event("startup")
+def load_embedding_model():
+    # Load the embedding weights once per worker so no request pays for it
+    if os.getenv("EMBEDDING_WARMUP", "true").lower() == "true":
+        warm_up_embedding_model()
+        logger.info(f"Embedding model ready: {embedding_model_stats()}")
+
+@app.on_event("shutdown")
+def stop_ingest_workers():
+    ingest_jobs.shutdown()
+    corpus.shutdown()
+    shutdown_embedding_engines()
+    shutdown_executor()
+    shutdown_page_pool()
+
+@app.get("/stats/embedding-models")
+def get_embedding_model_stats():
+    return {"models": embedding_model_stats()}
+
+@app.get("/stats/embedding-engine")
+def get_embedding_engine_stats():
+    return {"engines": embedding_engine_stats()}
+
+@app.get("/stats/index-cache")
+def get_index_cache_stats():
+    return index_cache.stats()
+
+@app.get("/stats/embedding-cache")
+def get_embedding_cache_stats():
+    return get_embedding_cache().stats()
+
+@app.get("/stats/ingest-queue")
+def get_ingest_queue_stats():
+    return ingest_jobs.stats()
+
+@app.get("/stats/result-cache")
+def get_result_cache_stats():
+    return get_result_cache().stats()
+
+@app.get("/stats/answer-cache")
+def get_answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/stats/sessions")
+def get_session_stats():
+    return sessions.stats()
+
+@app.get("/stats/llm-gateway")
+def get_llm_gateway_stats():
+    return llm_gateway.stats()
+
+@app.get("/stats/concurrency")
+def get_concurrency_stats():
+    return concurrency_stats()
+
+def _cache_lookups():
+    caches = {"index": index_cache, "answer": answer_cache, "result": get_result_cache()}
+    if EMBEDDING_CACHE_ENABLED:
+        caches["embedding"] = get_embedding_cache()
+    samples = {}
+    for name, cache in caches.items():
+        samples[(name, "hit")] = cache.hits
+        samples[(name, "miss")] = cache.misses
+    return samples
+
+def _gateway_counts():
+    stats = llm_gateway.stats()
+    return {(event,): stats[event] for event in ("calls", "coalesced", "retries", "failures", "throttled")}
+
+# state the modules already track, read when /metrics is scraped
+register_callback("legaldoc_cache_lookups_total", "Cache lookups by cache and outcome.", "counter",
+                  ["cache", "result"], _cache_lookups)
+register_callback("legaldoc_llm_gateway_events_total", "LLM gateway upstream calls, coalesced calls, retries, failures and throttles.",
+                  "counter", ["event"], _gateway_counts)
+register_callback("legaldoc_ingest_jobs_active", "Ingestion jobs queued or running.", "gauge", [],
+                  lambda: {(): ingest_jobs.stats()["active"]})
+register_callback("legaldoc_limiter_waiting", "Callers waiting for a concurrency slot.", "gauge", ["limiter"],
+                  lambda: {(name,): stats["waiting"] for name, stats in concurrency_stats().items()})
+register_callback("legaldoc_sessions_cached", "Chat sessions held in memory.", "gauge", [],
+                  lambda: {(): sessions.stats()["cached_sessions"]})
+
+@app.get("/metrics")
+def get_metrics():
+    """Stage timings, token counts, cache hits and queue waits in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # Pydantic model for the chat request body
 class ChatRequest(BaseModel):
     conversation_id: Optional[str] = None
     query: str
+    # restrict retrieval to these uploaded documents (filenames); all documents when omitted
+    sources: Optional[List[str]] = None
+    # also return this page of the chat history; by default only this turn's messages come back
+    history_offset: Optional[int] = None
+    history_limit: int = 0
 
 # --- Chat Endpoints ---
 
-@app.post("/upload-and-build/")
+async def buffer_upload(file: UploadFile):
+    """Read the upload into memory (or a spill file), rejecting oversized ones with 413."""
+    try:
+        with stage("upload_read"):
+            return await read_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+async def queue_ingest(file: UploadFile, index_key: str, on_success=None) -> dict:
+    """Buffer the upload and queue it for ingestion into the index `index_key`."""
+    upload = await buffer_upload(file)
+
+    try:
+        job_id = ingest_jobs.submit(upload, index_key, on_success=on_success)
+    except QueueFullError as e:
+        upload.close()
+        raise HTTPException(status_code=429, detail=str(e))
+    except RuntimeError as e:
+        # the worker pool broke or is shutting down
+        upload.close()
+        logger.error(f"Could not queue ingestion: {e}")
+        raise HTTPException(status_code=503, detail="Document processing is unavailable, please retry.")
+
+    return {
+        "message": "Document queued for processing.",
+        "job_id": job_id,
+        "status_url": f"/upload-and-build/{job_id}"
+    }
+
+@app.post("/upload-and-build/", status_code=202)
 async def upload_and_build_db(file: UploadFile = File(...)):
-    # ... (no change, existing code for RAG) ...
-    global db_session
-    
-    filepath = Path("data") / file.filename
-    filepath.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(filepath, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    # Parsing and embedding run on the ingestion process pool; poll the job for the result
+    conversation_id = str(uuid.uuid4())
 
+    def register_conversation(job):
+        # every conversation gets its own index namespace so uploads never overwrite each other
+        sessions.create(job["conversation_id"], job["conversation_id"])
+
+    return await queue_ingest(file, conversation_id, on_success=register_conversation)
+
+def get_session(conversation_id: Optional[str]) -> dict:
+    session_data = sessions.get(conversation_id) if conversation_id else None
+    if session_data is None:
+        raise HTTPException(status_code=400, detail="Invalid or missing conversation ID. Please upload a document first.")
+    return session_data
+
+@app.post("/conversations/{conversation_id}/documents/", status_code=202)
+async def add_document(conversation_id: str, file: UploadFile = File(...)):
+    # only the new document is embedded; its vectors are appended to the conversation's index
+    session_data = get_session(conversation_id)
+    return await queue_ingest(file, session_data["index_key"])
+
+@app.get("/conversations/{conversation_id}/history")
+async def get_history(conversation_id: str, offset: Optional[int] = None, limit: int = 50):
+    """A page of the chat history; the latest `limit` messages when no offset is given."""
+    get_session(conversation_id)
+    messages, total = await run_blocking(sessions.history, conversation_id, offset, limit)
+    return {"conversation_id": conversation_id, "messages": messages, "total_messages": total}
+
+@app.get("/conversations/{conversation_id}/documents/")
+async def list_documents(conversation_id: str):
+    session_data = get_session(conversation_id)
     try:
-        chunks = file_to_chunks(str(filepath))
-        if not chunks:
-            raise HTTPException(status_code=400, detail="The document is empty or could not be processed.")
-        
-        metadatas = [{"source": file.filename, "chunk_id": i} for i in range(len(chunks))]
-        db = build_faiss_from_chunks(chunks, metadatas=metadatas, index_path=str(INDEX_DIR))
-        
-        conversation_id = str(uuid.uuid4())
-        db_session[conversation_id] = {
-            "faiss_db": db,
-            "chat_history": init_chat()
-        }
-
-        return {
-            "message": f"Successfully processed {len(chunks)} chunks and built the vector DB.",
-            "conversation_id": conversation_id
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {e}")
-    finally:
-        os.remove(filepath)
+        return await run_blocking(corpus.list_documents, session_data["index_key"])
+    except FileNotFoundError:
+        raise HTTPException(status_code=400, detail="Vector DB not found. Please upload a document first.")
+
+@app.delete("/conversations/{conversation_id}/documents/{source}")
+async def remove_document(conversation_id: str, source: str):
+    session_data = get_session(conversation_id)
+    try:
+        entry = await run_blocking(corpus.remove_document, session_data["index_key"], source)
+    except SourceNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No document named {source} in this conversation.")
+    return {"message": "Document removed.", "source": source, "chunks": entry["chunks"]}
+
+@app.get("/upload-and-build/{job_id}")
+def get_ingest_job_status(job_id: str):
+    status = ingest_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job ID.")
+    return status
 
 @app.post("/chat/")
 async def chat_with_docs(request: ChatRequest):
@@ -97,59 +279,214 @@ async def chat_with_docs(request: ChatRequest):
     conversation_id = request.conversation_id
     query = request.query
     
-    if not conversation_id or conversation_id not in db_session:
-        raise HTTPException(status_code=400, detail="Invalid or missing conversation ID. Please upload a document first.")
-    
-    session_data = db_session[conversation_id]
+    session_data = get_session(conversation_id)
     
-    add_user_message(session_data["chat_history"], query)
+    await run_blocking(sessions.add_message, conversation_id, "user", query)
     
     try:
-        answer = answer_query(query, index_path=str(INDEX_DIR))
+        async with get_limiter("chat").slot():
+            db = await run_blocking(index_cache.get, session_data["index_key"])
+            search_filter = await run_blocking(corpus.search_filter, session_data["index_key"], request.sources)
+            answer = await aanswer_query(query, db=db, cache_key=session_data["index_key"], filter=search_filter)
     except FileNotFoundError:
         raise HTTPException(status_code=400, detail="Vector DB not found. Please upload a document first.")
     
-    add_bot_message(session_data["chat_history"], answer)
+    total = await run_blocking(sessions.add_message, conversation_id, "bot", answer)
     
-    db_session[conversation_id]["chat_history"] = session_data["chat_history"]
-    
-    return {
+    response = {
         "conversation_id": conversation_id,
         "answer": answer,
-        "chat_history": session_data["chat_history"]
+        "messages": [{"role": "user", "text": query}, {"role": "bot", "text": answer}],
+        "total_messages": total
     }
+    if request.history_limit > 0:
+        response["chat_history"], _ = await run_blocking(
+            sessions.history, conversation_id, request.history_offset, request.history_limit)
+    return response
+
+@app.post("/chat/stream/")
+async def chat_with_docs_stream(request: ChatRequest):
+    """
+    Same as /chat/ but streams Server-Sent Events: a `sources` event with the retrieved
+    chunk metadata, `token` events as the answer is generated, then a final `done` event.
+    """
+    conversation_id = request.conversation_id
+    query = request.query
+    
+    session_data = get_session(conversation_id)
+    
+    try:
+        db = await run_blocking(index_cache.get, session_data["index_key"])
+        search_filter = await run_blocking(corpus.search_filter, session_data["index_key"], request.sources)
+    except FileNotFoundError:
+        raise HTTPException(status_code=400, detail="Vector DB not found. Please upload a document first.")
+
+    await run_blocking(sessions.add_message, conversation_id, "user", query)
+
+    async def event_stream():
+        async with get_limiter("chat").slot():
+            async for event in astream_answer_query(query, db=db, cache_key=session_data["index_key"],
+                                                   filter=search_filter):
+                if event["type"] == "done":
+                    total = await run_blocking(sessions.add_message, conversation_id, "bot", event["answer"])
+                    event = {**event, "conversation_id": conversation_id, "total_messages": total}
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 # --- Summarizer Endpoints ---
 
+def analysis_cache_keys(doc_hash: str, language: str):
+    # the last date does not depend on the summary language, so it gets its own key
+    return make_key("analysis", doc_hash, language, model_id()), make_key("last_date", doc_hash, model_id())
+
+async def extract_upload(upload):
+    """Text of an upload, extracted on the worker pool, and the seconds it took."""
+    extract_start = time.perf_counter()
+    with stage("extract"):
+        document_content = await run_cpu(extract_text_from_pdf, upload.content, upload.filename)
+    return document_content, round(time.perf_counter() - extract_start, 4)
+
+async def analyze_and_cache(upload, language: str, extracted=None):
+    """
+    Run the combined summary + last-date analysis, caching both. The document is
+    extracted first unless `extracted` (the result of extract_upload) is given.
+    """
+    document_content, extract_seconds = extracted or await extract_upload(upload)
+    if not document_content:
+        raise HTTPException(status_code=400, detail="Could not extract text from the document.")
+
+    analysis, timings = await aanalyze_document(document_content, language, GOOGLE_API_KEY)
+    timings["extract_seconds"] = extract_seconds
+
+    # never cache the "Error" placeholder summary, or one missing sections that failed
+    if analysis.summary.category != "Error" and not timings.get("failed_sections"):
+        analysis_key, date_key = analysis_cache_keys(upload.sha256, language)
+        result_cache = get_result_cache()
+        result_cache.set(analysis_key, analysis.model_dump(mode="json"))
+        result_cache.set(date_key, {"last_date": analysis.last_date})
+    return analysis, timings
+
 @app.post("/summarize/", response_model=SummaryResponse)
 async def summarize_document(file: UploadFile = File(...), language: str = Form(...)):
-    # ... (no change, existing code for summarization) ...
-    file_location = f"temp/{file.filename}"
-    Path(file_location).parent.mkdir(parents=True, exist_ok=True)
+    upload = await buffer_upload(file)
     
     try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        document_content = extract_text_from_pdf(file_location)
-        if not document_content:
-            raise HTTPException(status_code=400, detail="Could not extract text from the document.")
-
-        summary_result: LegalDocSummary = generate_document_summary(document_content, language, GOOGLE_API_KEY)
+        async with get_limiter("summarize").slot():
+            cached = get_result_cache().get(analysis_cache_keys(upload.sha256, language)[0])
+            if cached is not None:
+                summary_result = DocumentAnalysis(**cached).summary
+                timings = {"cache": "hit"}
+            else:
+                analysis, timings = await analyze_and_cache(upload, language)
+                summary_result = analysis.summary
         
         logger.info("--- Document Summary ---")
         logger.info(summary_result.model_dump_json(indent=2))
+        logger.info(f"Summary timings: {timings}")
         
         return SummaryResponse(
             summary=summary_result,
-            is_summarized=False
+            is_summarized=False,
+            timings=timings
         )
     except Exception as e:
         logger.error(f"An internal error occurred: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
     finally:
-        if os.path.exists(file_location):
-            os.remove(file_location)
+        upload.close()
+
+
+async def summarize_batch_document(upload, language: str, semaphore: asyncio.Semaphore) -> dict:
+    """One NDJSON record of a batch: the document's summary, or its error."""
+    try:
+        cached = get_result_cache().get(analysis_cache_keys(upload.sha256, language)[0])
+        if cached is not None:
+            summary, timings = DocumentAnalysis(**cached).summary, {"cache": "hit"}
+        else:
+            # extraction is bounded by the worker pool only; the LLM calls by the batch limit
+            extracted = await extract_upload(upload)
+            async with semaphore, get_limiter("summarize").slot():
+                analysis, timings = await analyze_and_cache(upload, language, extracted)
+            summary = analysis.summary
+        if summary.category == "Error":
+            return {"type": "error", "error": "; ".join(summary.main_takeaway)}
+        return {"type": "summary", "summary": summary.model_dump(mode="json"), "timings": timings}
+    except HTTPException as e:
+        return {"type": "error", "error": e.detail}
+    except Exception as e:
+        logger.error(f"Batch summary of {upload.filename} failed: {e}", exc_info=True)
+        return {"type": "error", "error": str(e)}
+
+@app.post("/summarize/batch/")
+async def summarize_batch(files: List[UploadFile] = File(...), language: str = Form(...),
+                          sort_by_urgency: bool = Form(False)):
+    """
+    Summarize several documents, or the PDF/DOCX/TXT files inside zip archives, at once.
+    Streams NDJSON: one `summary` or `error` record per document as soon as it is ready,
+    in completion order, then a `done` record. With `sort_by_urgency`, the `done` record
+    ranks the summarized documents by urgency_percentage, most urgent first.
+    """
+    documents = []
+    try:
+        for file in files:
+            upload = await buffer_upload(file)
+            if not is_zip(upload):
+                documents.append(upload)
+                continue
+            try:
+                documents.extend(await run_blocking(expand_zip, upload, SUPPORTED))
+            except UploadTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive.")
+            finally:
+                upload.close()
+            if len(documents) > SUMMARY_BATCH_MAX_FILES:
+                break
+        if not documents:
+            raise HTTPException(status_code=400, detail="No documents to summarize.")
+        if len(documents) > SUMMARY_BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"A batch may hold at most {SUMMARY_BATCH_MAX_FILES} documents.")
+    except BaseException:
+        for upload in documents:
+            upload.close()
+        raise
+
+    async def results():
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(SUMMARY_BATCH_CONCURRENCY)
+
+        async def run(index: int, upload):
+            record = await summarize_batch_document(upload, language, semaphore)
+            upload.close()
+            return {"index": index, "filename": upload.filename, **record}
+
+        tasks = [asyncio.ensure_future(run(i, upload)) for i, upload in enumerate(documents)]
+        summarized = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                record = await next_done
+                if record["type"] == "summary":
+                    summarized.append(record)
+                yield json.dumps(record) + "\n"
+
+            done = {"type": "done", "documents": len(documents), "failed": len(documents) - len(summarized),
+                    "batch_seconds": round(time.perf_counter() - start, 4)}
+            if sort_by_urgency:
+                ranked = sorted(summarized, key=lambda r: r["summary"]["urgency_percentage"], reverse=True)
+                done["ranking"] = [{"index": r["index"], "filename": r["filename"],
+                                    "urgency_percentage": r["summary"]["urgency_percentage"],
+                                    "urgency_level": r["summary"]["urgency_level"]} for r in ranked]
+            yield json.dumps(done) + "\n"
+        finally:
+            # the client went away: stop the remaining work
+            for task in tasks:
+                task.cancel()
+            for upload in documents:
+                upload.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 
 # --- New Endpoint for Date Extraction ---
@@ -158,26 +495,38 @@ async def extract_date_from_document(file: UploadFile = File(...)):
     """
     Extracts the last date from a legal document.
     """
-    file_location = f"temp/{file.filename}"
-    Path(file_location).parent.mkdir(parents=True, exist_ok=True)
+    upload = await buffer_upload(file)
     
     try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        async with get_limiter("extract_last_date").slot():
+            date_key = analysis_cache_keys(upload.sha256, ANALYSIS_DEFAULT_LANGUAGE)[1]
+            cached = get_result_cache().get(date_key)
+            if cached is not None:
+                return LastDateResponse(last_date=cached["last_date"], source="cache")
 
-        document_content = extract_text_from_pdf(file_location)
-        if not document_content:
-            raise HTTPException(status_code=400, detail="Could not extract text from the document.")
+            document_content = await run_cpu(extract_text_from_pdf, upload.content, upload.filename)
+            if not document_content:
+                raise HTTPException(status_code=400, detail="Could not extract text from the document.")
 
-        last_date = extract_last_date(document_content, GOOGLE_API_KEY)
+            # local rules answer most notices; the LLM only sees the candidate windows, or the
+            # head and tail of a document whose deadline is written out in words
+            result = await run_cpu(extract_deadline, document_content)
+            if result.confidence >= DEADLINE_RULES_MIN_CONFIDENCE:
+                last_date, source = result.last_date, "rules"
+            else:
+                context = "\n...\n".join(result.windows) if result.windows else head_and_tail(document_content)
+                last_date, source = await aextract_last_date(context, GOOGLE_API_KEY), "llm"
+            if last_date is not None:
+                get_result_cache().set(date_key, {"last_date": last_date})
         
-        return LastDateResponse(last_date=last_date)
+        return LastDateResponse(last_date=last_date, source=source, confidence=result.confidence)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"An error occurred during date extraction: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An internal error occurred during date extraction.")
     finally:
-        if os.path.exists(file_location):
-            os.remove(file_location)
+        upload.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,71 @@
+# benchmarks/concurrency.py
+"""
+Throughput of /summarize/ as the number of concurrent clients grows, against the fake LLM.
+
+    python -m benchmarks.concurrency --clients 1 2 4 8 16 --requests 4 --latency 0.5
+
+With the LLM call awaited natively, throughput should scale roughly linearly with the
+number of clients until LLM_CONCURRENCY is reached.
+"""
+import os
+import time
+import asyncio
+import argparse
+
+
+def _sample_pdf() -> bytes:
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "NOTICE: The respondent shall file a reply on or before 2025-03-31.")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def _run(clients: int, requests_per_client: int, pdf: bytes) -> float:
+    import httpx
+    from app import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker(n: int):
+            for i in range(requests_per_client):
+                resp = await client.post(
+                    "/summarize/",
+                    files={"file": (f"notice-{n}-{i}.pdf", pdf, "application/pdf")},
+                    data={"language": "English"},
+                )
+                resp.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=4, help="requests per client")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    args = parser.parse_args()
+
+    # must be set before the app and its modules are imported
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+
+    asyncio.run(_sweep(args.clients, args.requests, _sample_pdf()))
+
+
+async def _sweep(client_counts, requests_per_client: int, pdf: bytes):
+    # one event loop for the whole sweep: the app's limiters bind to the loop they first run on
+    print(f"{'clients':>8} {'requests':>9} {'seconds':>9} {'req/s':>8}")
+    for clients in client_counts:
+        elapsed = await _run(clients, requests_per_client, pdf)
+        total = clients * requests_per_client
+        print(f"{clients:>8} {total:>9} {elapsed:>9.2f} {total / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/corpus.py
+"""
+Synthetic legal documents for benchmarks: notices, agreements and orders with parties,
+clauses, amounts and deadlines, as PDF, DOCX or TXT of any number of pages.
+
+    python -m benchmarks.corpus --out bench_corpus --kinds pdf docx txt --pages 1 10 100 1000
+
+Documents are generated from a seed, so the same arguments always give the same bytes.
+A page holds about 2,500 characters, close to a typed legal page.
+"""
+import io
+import random
+import argparse
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List
+
+KINDS = ["pdf", "docx", "txt"]
+PAGE_CHARS = 2500
+
+_TITLES = ["LEGAL NOTICE", "LEASE AGREEMENT", "SUMMONS", "EMPLOYMENT AGREEMENT", "DEMAND NOTICE",
+           "ORDER OF THE COURT", "LOAN AGREEMENT", "SHOW CAUSE NOTICE"]
+_PARTIES = ["Asha Verma", "Rohan Mehta", "Kiran Rao", "Northwind Traders Pvt. Ltd.", "Acme Housing LLP",
+            "Sunrise Finance Ltd.", "Meera Iyer", "Vikram Singh", "Blue River Logistics", "City Municipal Corporation"]
+_SUBJECTS = ["rent", "security deposit", "salary", "loan instalment", "maintenance charges", "penalty",
+             "compensation", "licence fee", "service charges", "arrears"]
+_CLAUSES = [
+    "The {a} shall pay to the {b} the sum of Rs. {amount} towards {subject} on or before {deadline}.",
+    "Failing payment by {deadline}, the {b} shall be entitled to initiate proceedings without further notice.",
+    "The {a} is hereby directed to appear before the court on {hearing} at 10:30 a.m. with all relevant documents.",
+    "Interest at the rate of {rate}% per annum shall accrue on the outstanding {subject} from {start}.",
+    "Either party may terminate this agreement by giving {notice_days} days' written notice to the other party.",
+    "The {a} shall not sublet, assign or part with possession of the premises without prior written consent.",
+    "All disputes arising out of this agreement shall be referred to arbitration seated at {city}.",
+    "A reply to this notice must be filed within {notice_days} days, that is, no later than {deadline}.",
+    "The {b} reserves the right to recover costs of Rs. {amount} incurred in connection with this matter.",
+    "This document is issued without prejudice to any other rights and remedies available under law.",
+]
+_CITIES = ["Mumbai", "Delhi", "Bengaluru", "Chennai", "Pune", "Hyderabad", "Kolkata"]
+
+
+def document_text(pages: int, seed: int = 0) -> List[str]:
+    """The text of each page of one synthetic document."""
+    rng = random.Random(seed)
+    a, b = rng.sample(_PARTIES, 2)
+    issued = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    out = []
+    for page in range(pages):
+        lines = [f"{rng.choice(_TITLES)} - Page {page + 1} of {pages}", f"Between {a} and {b}, dated {issued.isoformat()}.", ""]
+        clause = 1
+        while sum(len(line) + 1 for line in lines) < PAGE_CHARS:
+            deadline = issued + timedelta(days=rng.randrange(7, 120))
+            text = rng.choice(_CLAUSES).format(
+                a=rng.choice(["tenant", "borrower", "respondent", "employee"]),
+                b=rng.choice(["landlord", "lender", "petitioner", "employer"]),
+                amount=f"{rng.randrange(5, 500) * 1000:,}", subject=rng.choice(_SUBJECTS),
+                deadline=deadline.isoformat(), hearing=(deadline + timedelta(days=14)).isoformat(),
+                rate=rng.choice([9, 12, 18, 24]), start=issued.isoformat(),
+                notice_days=rng.choice([7, 15, 30, 60]), city=rng.choice(_CITIES),
+            )
+            lines.append(f"{page + 1}.{clause} {text}")
+            clause += 1
+        out.append("\n".join(lines))
+    return out
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_docx(pages: List[str]) -> bytes:
+    import docx
+    doc = docx.Document()
+    for i, text in enumerate(pages):
+        if i:
+            doc.add_page_break()
+        # one paragraph per page with line breaks; python-docx slows down with every paragraph
+        run = doc.add_paragraph().add_run()
+        for j, line in enumerate(text.split("\n")):
+            if j:
+                run.add_break()
+            run.add_text(line)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def make_txt(pages: List[str]) -> bytes:
+    return "\n\f\n".join(pages).encode("utf-8")
+
+
+def make_document(kind: str, pages: int, seed: int = 0) -> bytes:
+    """One synthetic document of `pages` pages as PDF, DOCX or TXT bytes."""
+    builder = {"pdf": make_pdf, "docx": make_docx, "txt": make_txt}[kind]
+    return builder(document_text(pages, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench_corpus")
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for kind in args.kinds:
+        for pages in args.pages:
+            path = out / f"{kind}-{pages}p.{kind}"
+            path.write_bytes(make_document(kind, pages, args.seed))
+            print(f"{path} ({path.stat().st_size / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
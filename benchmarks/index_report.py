@@ -0,0 +1,119 @@
+# benchmarks/index_report.py
+"""
+Recall versus latency of every index type and vector storage, to pick INDEX_TYPE and
+INDEX_STORAGE for a corpus size.
+
+    python -m benchmarks.index_report --sizes 1000 10000 100000 --dim 384 --queries 200 --k 10
+    python -m benchmarks.index_report --index <conversation_id>
+
+Synthetic vectors are drawn around random cluster centres, which is closer to real chunk
+embeddings than uniform noise. With --index, the vectors of a saved index are used instead.
+Recall@k is measured against exact flat search over the same vectors.
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+TYPES = ["flat", "ivf", "hnsw"]
+STORAGES = ["float32", "float16", "pq"]
+
+
+def _synthetic(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, n // 50), dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+def _saved_vectors(namespace: str) -> np.ndarray:
+    from pathlib import Path
+    from modules.vector_index import read_store
+    from modules.embedding_store import index_path_for
+    index, _, _, _ = read_store(Path(index_path_for(namespace)), mmap=False)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _measure(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, index_type: str, storage: str):
+    from pathlib import Path
+    from langchain.schema import Document
+    from modules.vector_index import build_index, read_store, write_store, INDEX_FILE
+
+    start = time.perf_counter()
+    index = build_index(vectors, index_type, storage)
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ids = [str(i) for i in range(len(vectors))]
+        write_store(Path(tmp), index, ids, [Document(page_content="") for _ in ids])
+        size = os.path.getsize(Path(tmp) / INDEX_FILE)
+        start = time.perf_counter()
+        index, _, _, _ = read_store(Path(tmp))
+        open_seconds = time.perf_counter() - start
+
+        latencies, found = [], []
+        for q in queries:
+            start = time.perf_counter()
+            _, ids_found = index.search(q[None, :], k)
+            latencies.append(time.perf_counter() - start)
+            found.append(ids_found[0])
+        del index
+
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {
+        "build_s": build_seconds,
+        "size_mb": size / 1e6,
+        "open_ms": open_seconds * 1000,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "recall": float(recall),
+    }
+
+
+def report(vectors: np.ndarray, num_queries: int, k: int, configs):
+    import faiss
+    from modules.vector_index import plan_index
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), num_queries)] + 0.05 * rng.normal(size=(num_queries, vectors.shape[1]))
+    queries = queries.astype(np.float32)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    n, dim = vectors.shape
+    print(f"\n{n} vectors, dim {dim}, {num_queries} queries, recall@{k}")
+    print(f"{'config':<16}{'factory':<18}{'build s':>9}{'size MB':>9}{'open ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall':>8}")
+    for index_type, storage in configs:
+        factory, used_type, used_storage = plan_index(dim, n, index_type, storage)
+        if (used_type, used_storage) != (index_type, storage):
+            print(f"{index_type + '/' + storage:<16}{factory:<18}  (too few vectors to train; same as {used_type}/{used_storage})")
+            continue
+        m = _measure(vectors, queries, truth, k, index_type, storage)
+        print(f"{index_type + '/' + storage:<16}{factory:<18}{m['build_s']:>9.2f}{m['size_mb']:>9.2f}"
+              f"{m['open_ms']:>9.2f}{m['p50_ms']:>9.3f}{m['p95_ms']:>9.3f}{m['recall']:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--index", help="measure the vectors of this saved index namespace instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=TYPES, choices=TYPES)
+    parser.add_argument("--storages", nargs="+", default=STORAGES, choices=STORAGES)
+    args = parser.parse_args()
+
+    configs = [(t, s) for t in args.types for s in args.storages]
+    if args.index:
+        report(_saved_vectors(args.index), args.queries, args.k, configs)
+    else:
+        for n in args.sizes:
+            report(_synthetic(n, args.dim), args.queries, args.k, configs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# benchmarks/suite.py
+"""
+End-to-end benchmarks of the API, fully offline: the fake LLM (LLM_BACKEND=fake) and the
+hashing embedder (EMBEDDING_BACKEND=hash) stand in for Gemini and the HuggingFace model.
+
+    python -m benchmarks.suite --out bench_results.json
+    python -m benchmarks.suite --quick --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --quick --save-baseline benchmarks/baseline.json
+
+Scenarios (--scenarios), each against synthetic documents from benchmarks.corpus:
+  ingest     upload -> parsed, embedded and indexed, per file type and page count
+  chat       /chat/ latency percentiles under N concurrent clients
+  summarize  /summarize/ latency per file type and page count
+
+Every run also reports the peak RSS of the API process and of its ingest workers
+(memory.peak_rss_mb, memory.peak_worker_rss_mb).
+
+The app runs in-process on a scratch working directory, so nothing under vectorstore/ is
+touched. Caches that would turn repeated requests into lookups are disabled. Results are
+written as JSON; with --baseline, metrics that regressed by more than --tolerance (and,
+for timings, by more than --min-delta-ms) are listed and the exit status is 1. Ingest and
+summarize timings are the median of --repeat runs. Baselines are host-specific: record
+one with --save-baseline on the machine that will run the comparisons.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import KINDS, make_document
+
+QUESTIONS = [
+    "When is the rent due?",
+    "What is the deadline to reply to the notice?",
+    "What interest rate applies to the outstanding amount?",
+    "Where will disputes be arbitrated?",
+    "How many days of notice are needed to terminate?",
+    "When must the respondent appear before the court?",
+    "What costs can be recovered?",
+    "Can the tenant sublet the premises?",
+]
+
+PROFILES = {
+    "full": {"ingest_pages": [1, 10, 100, 1000], "summarize_pages": [1, 10, 100], "chat_pages": 100,
+             "chat_clients": [1, 4, 16, 32], "chat_requests": 20},
+    "quick": {"ingest_pages": [1, 10, 50], "summarize_pages": [1, 10], "chat_pages": 20,
+              "chat_clients": [1, 8], "chat_requests": 10},
+}
+
+
+def _configure(args):
+    """Offline stand-ins and benchmark settings; must run before the app is imported."""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "EMBEDDING_BACKEND": "hash",
+        "ANSWER_CACHE_ENABLED": "false",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "RESULT_CACHE_BACKEND": "memory",
+        "SESSION_STORE_BACKEND": "memory",
+        "LLM_REQUESTS_PER_MINUTE": "0",
+        "LLM_TOKENS_PER_MINUTE": "0",
+    })
+    os.environ.setdefault("GOOGLE_API_KEY", "offline")
+    os.chdir(tempfile.mkdtemp(prefix="legaldoc-bench-"))
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {f"p{p}_ms": round(float(np.percentile(values, p)) * 1000, 2) for p in (50, 95, 99)}
+
+
+def _rss_mb(who=resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+async def _wait_for_job(client, job_id: str) -> dict:
+    while True:
+        status = (await client.get(f"/upload-and-build/{job_id}")).json()
+        if status["status"] in ("done", "failed"):
+            if status["status"] == "failed":
+                raise RuntimeError(f"Ingestion failed: {status['error']}")
+            return status
+        await asyncio.sleep(0.02)
+
+
+async def _ingest(client, kind: str, pages: int, seed: int) -> dict:
+    data = make_document(kind, pages, seed)
+    start = time.perf_counter()
+    resp = await client.post("/upload-and-build/", files={"file": (f"{kind}-{pages}p-{seed}.{kind}", data)})
+    resp.raise_for_status()
+    status = await _wait_for_job(client, resp.json()["job_id"])
+    return {"seconds": time.perf_counter() - start, "chunks": status["chunks"],
+            "conversation_id": status["conversation_id"]}
+
+
+async def bench_ingest(client, profile: dict, metrics: dict, details: dict):
+    # the first job pays for starting the worker pool; keep it out of the numbers
+    await _ingest(client, "txt", 1, seed=999)
+    total_pages, total_chunks, total_seconds = 0, 0, 0.0
+    for kind in KINDS:
+        for pages in profile["ingest_pages"]:
+            runs = [await _ingest(client, kind, pages, seed=pages) for _ in range(profile["repeat"])]
+            seconds = float(np.median([r["seconds"] for r in runs]))
+            chunks = runs[0]["chunks"]
+            details.setdefault("ingest", []).append({"kind": kind, "pages": pages, "seconds": round(seconds, 4),
+                                                     "chunks": chunks})
+            metrics[f"ingest.{kind}.{pages}p.seconds"] = round(seconds, 4)
+            total_pages += pages
+            total_chunks += chunks
+            total_seconds += seconds
+    metrics["ingest.pages_per_second"] = round(total_pages / total_seconds, 2)
+    metrics["ingest.chunks_per_second"] = round(total_chunks / total_seconds, 2)
+
+
+async def bench_chat(client, profile: dict, metrics: dict, details: dict):
+    conversation_id = (await _ingest(client, "pdf", profile["chat_pages"], seed=7))["conversation_id"]
+
+    for clients in profile["chat_clients"]:
+        latencies = []
+
+        async def worker(n: int):
+            for i in range(profile["chat_requests"]):
+                query = QUESTIONS[(n + i) % len(QUESTIONS)]
+                start = time.perf_counter()
+                resp = await client.post("/chat/", json={"conversation_id": conversation_id, "query": query})
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - start
+        for name, value in _percentiles(latencies).items():
+            metrics[f"chat.{clients}c.{name}"] = value
+        metrics[f"chat.{clients}c.requests_per_second"] = round(len(latencies) / elapsed, 2)
+        details.setdefault("chat", []).append({"clients": clients, "requests": len(latencies),
+                                               "seconds": round(elapsed, 4), **_percentiles(latencies)})
+
+
+async def bench_summarize(client, profile: dict, metrics: dict, details: dict):
+    for kind in KINDS:
+        for pages in profile["summarize_pages"]:
+            runs = []
+            for repeat in range(profile["repeat"]):
+                # a fresh seed per run keeps the result cache out of the measurement
+                data = make_document(kind, pages, seed=1000 * (repeat + 1) + pages)
+                start = time.perf_counter()
+                resp = await client.post("/summarize/", files={"file": (f"{kind}-{pages}p.{kind}", data)},
+                                         data={"language": "English"})
+                resp.raise_for_status()
+                runs.append(time.perf_counter() - start)
+            seconds = float(np.median(runs))
+            metrics[f"summarize.{kind}.{pages}p.seconds"] = round(seconds, 4)
+            details.setdefault("summarize", []).append({"kind": kind, "pages": pages, "seconds": round(seconds, 4),
+                                                        "mode": resp.json()["timings"].get("mode")})
+
+
+async def run(profile: dict, scenarios: List[str]) -> dict:
+    import httpx
+    from app import app, stop_ingest_workers
+
+    # the app logs every summary at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+    metrics, details = {}, {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in scenarios:
+                start = time.perf_counter()
+                await {"ingest": bench_ingest, "chat": bench_chat, "summarize": bench_summarize}[name](
+                    client, profile, metrics, details)
+                print(f"{name}: {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    finally:
+        stop_ingest_workers()
+    metrics["memory.peak_rss_mb"] = _rss_mb()
+    metrics["memory.peak_worker_rss_mb"] = _rss_mb(resource.RUSAGE_CHILDREN)
+    return {"metrics": metrics, "details": details}
+
+
+def lower_is_better(name: str) -> bool:
+    return not name.endswith("per_second")
+
+
+def _delta_ms(name: str, delta: float) -> float:
+    """Absolute change of a timing metric in milliseconds; None for other metrics."""
+    if name.endswith("_ms"):
+        return abs(delta)
+    if name.endswith(".seconds"):
+        return abs(delta) * 1000
+    return None
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float], tolerance: float,
+            min_delta_ms: float = 0.0) -> List[str]:
+    """
+    Print every metric next to its baseline; return the names that regressed beyond
+    `tolerance`. Timings must also have moved by more than `min_delta_ms`, so jitter on
+    millisecond-scale operations does not count.
+    """
+    regressions = []
+    print(f"{'metric':<40}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, base in sorted(baseline.items()):
+        if name not in current or not base:
+            continue
+        change = (current[name] - base) / base
+        worse = change > tolerance if lower_is_better(name) else change < -tolerance
+        delta_ms = _delta_ms(name, current[name] - base)
+        if delta_ms is not None and delta_ms <= min_delta_ms:
+            worse = False
+        if worse:
+            regressions.append(name)
+        print(f"{name:<40}{base:>12.4g}{current[name]:>12.4g}{change:>+8.0%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller documents and fewer clients")
+    parser.add_argument("--scenarios", nargs="+", default=["ingest", "chat", "summarize"],
+                        choices=["ingest", "chat", "summarize"])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="write the results JSON here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=20.0, help="smaller timing changes never count")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per ingest and summarize measurement")
+    args = parser.parse_args()
+
+    # resolve output paths before moving to the scratch directory
+    out, baseline, save = (os.path.abspath(p) if p else None for p in (args.out, args.baseline, args.save_baseline))
+    profile_name = "quick" if args.quick else "full"
+    _configure(args)
+
+    profile = {**PROFILES[profile_name], "repeat": args.repeat}
+    results = asyncio.run(run(profile, args.scenarios))
+    results["meta"] = {
+        "profile": profile_name,
+        "scenarios": args.scenarios,
+        "llm_latency": args.llm_latency,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    text = json.dumps(results, indent=2)
+    for path in (out, save):
+        if path:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+    if not (out or save or baseline):
+        print(text)
+
+    if baseline:
+        with open(baseline) as f:
+            reference = json.load(f)
+        if reference["meta"]["profile"] != profile_name:
+            print(f"Warning: baseline profile is {reference['meta']['profile']}, this run is {profile_name}")
+        regressions = compare(results["metrics"], reference["metrics"], args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import date
 
 class LegalDocSummary(BaseModel):
@@ -12,6 +12,10 @@ class LegalDocSummary(BaseModel):
     urgency_percentage: int = Field(..., ge=0, le=100, description="Numerical urgency score between 0-100.")
     urgency_level: str = Field(..., description="Categorical urgency level (e.g., High, Medium, Low).")
 
+class DocumentAnalysis(BaseModel):
+    summary: LegalDocSummary = Field(..., description="Structured summary of the document.")
+    last_date: Optional[date] = Field(None, description="The last date to take action, in YYYY-MM-DD format. Return null if not found.")
+
 class SummaryRequest(BaseModel):
     document_content: str
     language: str
@@ -19,6 +23,9 @@ class SummaryRequest(BaseModel):
 class SummaryResponse(BaseModel):
     summary: LegalDocSummary
     is_summarized: bool
+    timings: Optional[Dict[str, Any]] = Field(None, description="Summarization mode, token count and per-stage latency in seconds.")
 
 class LastDateResponse(BaseModel):
-    last_date: Optional[date] = Field(..., description="The last date to take action mentioned in the document.")
\ No newline at end of file
+    last_date: Optional[date] = Field(..., description="The last date to take action mentioned in the document.")
+    source: Optional[str] = Field(None, description="Which path produced the date: cache, rules or llm.")
+    confidence: Optional[float] = Field(None, description="Confidence of the rule-based extractor, when it was used.")
\ No newline at end of file
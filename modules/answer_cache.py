@@ -0,0 +1,142 @@
+# modules/answer_cache.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# cosine similarity a new question needs with a cached one to reuse its answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_MAX_INDEXES = int(os.getenv("ANSWER_CACHE_MAX_INDEXES", "256"))
+
+
+def chunk_key(docs) -> Tuple:
+    """Order-independent identity of a retrieved chunk set."""
+    return tuple(sorted((str(d.metadata.get("source", "")), d.metadata.get("chunk_id", -1)) for d in docs))
+
+
+# rows of the embedding matrix allocated by an index's first answer; it doubles as it fills
+_INITIAL_ROWS = 8
+
+
+class _IndexEntries:
+    """Cached answers for one index, with query embeddings kept in one matrix grown geometrically."""
+
+    def __init__(self, dim: int, capacity: int, version: int):
+        self.version = version
+        self.capacity = capacity
+        rows = min(capacity, _INITIAL_ROWS)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.last_used = np.zeros(rows, dtype=np.int64)
+        self.chunks = []
+        self.answers = []
+        self.size = 0
+
+    def _grow(self):
+        rows = min(self.capacity, 2 * len(self.vectors))
+        self.vectors = np.concatenate([self.vectors, np.zeros((rows - len(self.vectors), self.vectors.shape[1]),
+                                                              dtype=np.float32)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(rows - len(self.last_used), dtype=np.int64)])
+
+    def lookup(self, query_vec: np.ndarray, chunks: Tuple, threshold: float, tick: int) -> Optional[str]:
+        if self.size == 0:
+            return None
+        # one matrix-vector product scores every cached question
+        sims = self.vectors[:self.size] @ query_vec
+        close = np.flatnonzero(sims >= threshold)
+        for slot in close[np.argsort(-sims[close])]:
+            if self.chunks[slot] == chunks:
+                self.last_used[slot] = tick
+                return self.answers[slot]
+        return None
+
+    def store(self, query_vec: np.ndarray, chunks: Tuple, answer: str, tick: int):
+        if self.size < self.capacity:
+            if self.size == len(self.vectors):
+                self._grow()
+            slot = self.size
+            self.size += 1
+            self.chunks.append(chunks)
+            self.answers.append(answer)
+        else:
+            slot = int(np.argmin(self.last_used))
+            self.chunks[slot] = chunks
+            self.answers[slot] = answer
+        self.vectors[slot] = query_vec
+        self.last_used[slot] = tick
+
+
+class AnswerCache:
+    """
+    Semantic cache of chat answers, scoped per index.
+
+    A question is answered from cache when its embedding is within `threshold` cosine
+    similarity of a cached question and retrieval returned the same chunk set. Each index
+    keeps at most `max_entries` answers, evicting the least recently used; all of an index's
+    answers are dropped when its version changes. At most `max_indexes` indexes are tracked.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_indexes: int = ANSWER_CACHE_MAX_INDEXES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_indexes = max_indexes
+        self._indexes: Dict[str, _IndexEntries] = OrderedDict()
+        self._lock = threading.Lock()
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, index_key: str, version: int, query_vec, docs) -> Optional[str]:
+        with self._lock:
+            self._tick += 1
+            entries = self._indexes.get(index_key)
+            answer = None
+            if entries is not None and entries.version == version:
+                self._indexes.move_to_end(index_key)
+                answer = entries.lookup(self._normalize(query_vec), chunk_key(docs), self.threshold, self._tick)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def store(self, index_key: str, version: int, query_vec, docs, answer: str):
+        query_vec = self._normalize(query_vec)
+        with self._lock:
+            self._tick += 1
+            entries = self._indexes.get(index_key)
+            if entries is None or entries.version != version:
+                entries = _IndexEntries(len(query_vec), self.max_entries, version)
+                self._indexes[index_key] = entries
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(index_key)
+            entries.store(query_vec, chunk_key(docs), answer, self._tick)
+
+    def invalidate(self, index_key: str):
+        with self._lock:
+            self._indexes.pop(index_key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "indexes": len(self._indexes),
+                "entries": sum(e.size for e in self._indexes.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,157 @@
+# modules/async_exec.py
+import os
+import time
+import asyncio
+import functools
+import contextvars
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from modules.metrics import QUEUE_WAIT_SECONDS
+from modules.extraction import disable_page_pool
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+ENDPOINT_CONCURRENCY = int(os.getenv("ENDPOINT_CONCURRENCY", "32"))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "4"))
+# "thread" suits PyMuPDF, which spends most of its time in C; "process" sidesteps the GIL entirely
+EXTRACTION_EXECUTOR = os.getenv("EXTRACTION_EXECUTOR", "thread")
+
+
+class ConcurrencyLimiter:
+    """
+    Async semaphore that also records how many callers are running, how many are
+    waiting, and how long they waited for a slot.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        QUEUE_WAIT_SECONDS.observe(wait, queue=self.name)
+        self.in_flight += 1
+        try:
+            yield wait
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "avg_wait_seconds": round(self.total_wait / self.completed, 4) if self.completed else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
+
+
+_limiters = {}
+
+
+def get_limiter(name: str, limit: int = None) -> ConcurrencyLimiter:
+    """Named limiter shared across the process; `<NAME>_CONCURRENCY` overrides the default limit."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        if limit is None:
+            limit = int(os.getenv(f"{name.upper()}_CONCURRENCY", str(ENDPOINT_CONCURRENCY)))
+        limiter = ConcurrencyLimiter(name, limit)
+        _limiters[name] = limiter
+    return limiter
+
+
+def concurrency_stats():
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+async def run_llm(runnable, inputs):
+    """Invoke a LangChain runnable natively async, bounded by the shared LLM limiter."""
+    async with get_limiter("llm", LLM_CONCURRENCY).slot():
+        return await runnable.ainvoke(inputs)
+
+
+async def stream_llm(runnable, inputs):
+    """Stream chunks from a LangChain runnable; the LLM slot is held until the stream ends."""
+    async with get_limiter("llm", LLM_CONCURRENCY).slot():
+        async for chunk in runnable.astream(inputs):
+            yield chunk
+
+
+# blocking I/O and work on in-process state (index cache, corpus, sessions) always runs on threads
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+
+_executor = None
+_blocking_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if EXTRACTION_EXECUTOR == "process":
+            # spawn, like the other pools: a forked child inherits the parent's threads and locks;
+            # the workers are the pool, so they parse long PDFs without a page pool of their own
+            _executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=disable_page_pool)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extract")
+    return _executor
+
+
+def _get_blocking_executor():
+    global _blocking_executor
+    if _blocking_executor is None:
+        _blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+    return _blocking_executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Run blocking work off the event loop on a thread: index loads, corpus and session
+    updates, retrieval. `fn` may use in-process state and need not be picklable.
+    """
+    loop = asyncio.get_running_loop()
+    # threads see the caller's context, so stage timings still reach the request
+    call = functools.partial(contextvars.copy_context().run, functools.partial(fn, *args, **kwargs))
+    return await loop.run_in_executor(_get_blocking_executor(), call)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run CPU-bound work (text extraction, deadline rules) on the extraction executor, a
+    process pool when EXTRACTION_EXECUTOR=process. `fn` and its arguments must be
+    picklable and it must not rely on in-process state.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    if EXTRACTION_EXECUTOR != "process":
+        call = functools.partial(contextvars.copy_context().run, call)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+def shutdown_executor():
+    global _executor, _blocking_executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _blocking_executor is not None:
+        _blocking_executor.shutdown(wait=False, cancel_futures=True)
+        _blocking_executor = None
@@ -1,51 +1,82 @@
 # modules/chunking.py
-from pathlib import Path
-from typing import List
-import docx
-import os
-from pypdf import PdfReader
+from bisect import bisect_right
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-SUPPORTED = (".pdf", ".txt", ".docx")
-
-def load_txt(path: Path) -> str:
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
-
-def load_docx(path: Path) -> str:
-    doc = docx.Document(path)
-    full = []
-    for para in doc.paragraphs:
-        full.append(para.text)
-    return "\n".join(full)
-
-def load_pdf(path: Path) -> str:
-    reader = PdfReader(str(path))
-    full = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            full.append(text)
-    return "\n".join(full)
+from modules.extraction import SUPPORTED, extract_text, iter_pages
 
 def load_file_to_text(filepath: str) -> str:
-    path = Path(filepath)
-    ext = path.suffix.lower()
-    if ext not in SUPPORTED:
-        raise ValueError(f"Unsupported file type: {ext}")
-    if ext == ".txt":
-        return load_txt(path)
-    if ext == ".docx":
-        return load_docx(path)
-    if ext == ".pdf":
-        return load_pdf(path)
+    return extract_text(filepath)
 
 def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
     splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     chunks = splitter.split_text(text)
     return chunks
 
-def file_to_chunks(filepath: str, chunk_size: int = 1000, chunk_overlap: int = 200):
-    text = load_file_to_text(filepath)
-    chunks = chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    return chunks
\ No newline at end of file
+def iter_chunks(pages: Iterable[Tuple[Optional[int], str]], chunk_size: int = 1000,
+                chunk_overlap: int = 200) -> Iterator[Tuple[str, dict]]:
+    """
+    Incrementally chunk a stream of (page_number, text) pages.
+
+    Only a few chunks' worth of text is buffered at a time, so memory does not grow with
+    the document. Each chunk is yielded with {"page": <page it starts on>}.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    flush_at = chunk_size * 8
+    buffer = ""
+    offsets, page_nums = [], []  # where each page starts in the buffer
+
+    def page_at(offset: int):
+        return page_nums[bisect_right(offsets, offset) - 1]
+
+    def locate(chunks):
+        pos, last = 0, 0
+        for chunk in chunks:
+            start = buffer.find(chunk, pos)
+            if start < 0:
+                start = last
+            last, pos = start, start + 1
+            yield chunk, start
+
+    for page, text in pages:
+        if not text or not text.strip():
+            continue
+        if buffer:
+            buffer += "\n"
+        offsets.append(len(buffer))
+        page_nums.append(page)
+        buffer += text
+        if len(buffer) < flush_at:
+            continue
+
+        # the last chunk may continue on the next page, so it stays in the buffer
+        located = list(locate(splitter.split_text(buffer)))
+        for chunk, start in located[:-1]:
+            yield chunk, {"page": page_at(start)}
+        keep = located[-1][1]
+        first = bisect_right(offsets, keep) - 1
+        offsets = [0] + [off - keep for off in offsets[first + 1:]]
+        page_nums = page_nums[first:]
+        buffer = buffer[keep:]
+
+    if buffer.strip():
+        for chunk, start in locate(splitter.split_text(buffer)):
+            yield chunk, {"page": page_at(start)}
+
+def file_to_chunk_records(filepath, chunk_size: int = 1000, chunk_overlap: int = 200,
+                          on_page: Optional[Callable[[int], None]] = None,
+                          filename: Optional[str] = None) -> Tuple[List[str], List[dict]]:
+    """
+    Chunks of a file plus per-chunk metadata ({"page": ...}), built page by page.
+    `filepath` may also be the file's bytes, with `filename` giving its type.
+    """
+    chunks, metadatas = [], []
+    for chunk, meta in iter_chunks(iter_pages(filepath, on_page=on_page, filename=filename), chunk_size, chunk_overlap):
+        chunks.append(chunk)
+        metadatas.append(meta)
+    return chunks, metadatas
+
+def file_to_chunks(filepath: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                   on_page: Optional[Callable[[int], None]] = None):
+    chunks, _ = file_to_chunk_records(filepath, chunk_size, chunk_overlap, on_page=on_page)
+    return chunks
@@ -0,0 +1,142 @@
+# modules/context_packing.py
+import os
+import logging
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from modules.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_FETCH_K = int(os.getenv("CONTEXT_FETCH_K", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.5"))
+# longest overlap trimmed when merging neighbouring chunks (chunk_text's default overlap)
+CONTEXT_MAX_OVERLAP = int(os.getenv("CONTEXT_MAX_OVERLAP", "200"))
+
+SEPARATOR = "\n\n---\n\n"
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def fetch_candidates(db, query: str, fetch_k: int, filter: Optional[Callable[[dict], bool]] = None,
+                     min_matches: int = 0) -> Tuple[np.ndarray, List[Document], np.ndarray]:
+    """
+    Over-fetch nearest chunks. Returns the query vector, the documents and their stored vectors.
+    With a metadata `filter`, the search widens until `min_matches` chunks pass it or the
+    whole index has been searched.
+    """
+    query_vec = np.asarray(db._embed_query(query), dtype=np.float32)
+    if db.index.ntotal == 0:
+        # e.g. every document of a corpus was removed; faiss rejects a search for 0 neighbours
+        return query_vec, [], np.zeros((0, db.index.d), dtype=np.float32)
+    while True:
+        _, found = db.index.search(query_vec[None, :], min(fetch_k, db.index.ntotal))
+        ids, docs = [], []
+        for i in found[0]:
+            if i == -1:
+                continue
+            doc = db.docstore.search(db.index_to_docstore_id[int(i)])
+            if not isinstance(doc, Document):
+                # the docstore answers a missing ID with a "not found" string
+                continue
+            if filter is None or filter(doc.metadata):
+                ids.append(int(i))
+                docs.append(doc)
+        if filter is None or len(docs) >= min_matches or fetch_k >= db.index.ntotal:
+            break
+        fetch_k *= 4
+    try:
+        vectors = db.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+    except Exception:
+        # index types that cannot reconstruct (e.g. without a direct map): re-embed the candidates
+        vectors = np.asarray(db.embedding_function.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+    return query_vec, docs, np.asarray(vectors, dtype=np.float32)
+
+
+def mmr_order(query_vec: np.ndarray, doc_vecs: np.ndarray, k: int, lambda_mult: float = CONTEXT_MMR_LAMBDA) -> List[int]:
+    """
+    Maximal marginal relevance over candidate embeddings. The pairwise similarity matrix is
+    computed once; each greedy step is a vectorized update of the running max-similarity.
+    """
+    if len(doc_vecs) == 0:
+        return []
+    docs = _normalize(doc_vecs)
+    relevance = docs @ _normalize(query_vec)
+    pairwise = docs @ docs.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(len(docs), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, len(docs)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
+
+
+def _overlap(a: str, b: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `a` that is also a prefix of `b`."""
+    for n in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def merge_adjacent(docs: List[Document], max_overlap: int = CONTEXT_MAX_OVERLAP) -> List[str]:
+    """
+    Put chunks in document order and join runs of consecutive `chunk_id`s from the same
+    source into one passage, dropping the text they share.
+    """
+    ordered = sorted(docs, key=lambda d: (str(d.metadata.get("source", "")), d.metadata.get("chunk_id", 0)))
+    passages, prev = [], None
+    for doc in ordered:
+        meta = doc.metadata
+        if (prev is not None and "chunk_id" in meta
+                and meta.get("source") == prev.metadata.get("source")
+                and meta["chunk_id"] == prev.metadata.get("chunk_id", -2) + 1):
+            trim = _overlap(passages[-1], doc.page_content, max_overlap)
+            passages[-1] += ("" if trim else "\n") + doc.page_content[trim:]
+        else:
+            passages.append(doc.page_content)
+        prev = doc
+    return passages
+
+
+def pack_context(db, query: str, top_k: int = 4, fetch_k: int = CONTEXT_FETCH_K,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 filter: Optional[Callable[[dict], bool]] = None) -> Tuple[List[Document], str, np.ndarray]:
+    """
+    Select up to `top_k` chunks for the prompt: over-fetch, order by MMR, fill the token budget,
+    then merge neighbouring chunks and trim their overlap. Returns the selected documents,
+    the context and the query embedding. `filter` restricts candidates by chunk metadata.
+    """
+    query_vec, candidates, vectors = fetch_candidates(db, query, max(fetch_k, top_k), filter=filter, min_matches=top_k)
+    if not candidates:
+        return [], "", query_vec
+
+    selected, used = [], 0
+    for i in mmr_order(query_vec, vectors, top_k):
+        tokens = count_tokens(candidates[i].page_content)
+        if selected and used + tokens > token_budget:
+            continue
+        selected.append(candidates[i])
+        used += tokens
+
+    context = SEPARATOR.join(merge_adjacent(selected))
+
+    # what the plain top-k join would have sent
+    naive = count_tokens(SEPARATOR.join(d.page_content for d in candidates[:top_k]))
+    packed = count_tokens(context)
+    logger.info(f"Context packing: {len(selected)} chunks, {packed} prompt tokens "
+                f"(plain top-{top_k}: {naive}, saved {naive - packed})")
+    return selected, context, query_vec
@@ -0,0 +1,295 @@
+# modules/corpus.py
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from modules.embedding_store import (
+    append_faiss, clone_faiss, index_path_for, needs_rebuild, new_faiss, rebuild_faiss, remove_faiss, save_faiss,
+)
+from modules.index_cache import index_cache
+from modules.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# indexes share this many locks, so the lock table does not grow with the number of conversations
+KEY_LOCK_STRIPES = 64
+
+
+class SourceNotFoundError(KeyError):
+    """Raised when a corpus has no document with the given source name."""
+
+
+def _empty_manifest() -> dict:
+    return {"next_id": 0, "ntotal": 0, "sources": {}, "tombstones": []}
+
+
+def _adopt(db, old: dict) -> tuple:
+    """
+    Rebuild the manifest from the stored chunks. Indexes built before the corpus manager
+    (random docstore IDs, no `doc_id` metadata) are re-keyed to chunk-ID ranges first.
+    Returns the store to use and its manifest.
+    """
+    docs = [db.docstore.search(db.index_to_docstore_id[i]) for i in range(db.index.ntotal)]
+    keyed = all(db.index_to_docstore_id[i].isdigit() and "doc_id" in d.metadata for i, d in enumerate(docs))
+
+    manifest = _empty_manifest()
+    previous = {entry["doc_id"]: (name, entry) for name, entry in old.get("sources", {}).items()}
+    if keyed:
+        removed = {doc_id: count for doc_id, count in old.get("tombstones", [])}
+        present = set()
+        for i, doc in enumerate(docs):
+            doc_id = doc.metadata["doc_id"]
+            present.add(doc_id)
+            manifest["next_id"] = max(manifest["next_id"], int(db.index_to_docstore_id[i]) + 1)
+            if doc_id in removed:
+                continue
+            name, entry = previous.get(doc_id, (str(doc.metadata.get("source", "")), {}))
+            current = manifest["sources"].setdefault(
+                name, {"doc_id": doc_id, "chunks": 0, "added_at": entry.get("added_at", time.time())})
+            if current["doc_id"] == doc_id:
+                current["chunks"] += 1
+        manifest["tombstones"] = [[doc_id, count] for doc_id, count in removed.items() if doc_id in present]
+    else:
+        db = clone_faiss(db)
+        # chunks of one source are contiguous in a from-scratch build
+        new_docs, index_to_id = {}, {}
+        for i, doc in enumerate(docs):
+            name = str(doc.metadata.get("source", ""))
+            entry = manifest["sources"].get(name)
+            if entry is None:
+                entry = manifest["sources"][name] = {"doc_id": manifest["next_id"], "chunks": 0, "added_at": time.time()}
+            doc_key = str(manifest["next_id"])
+            new_docs[doc_key] = Document(page_content=doc.page_content, metadata={**doc.metadata, "doc_id": entry["doc_id"]})
+            index_to_id[i] = doc_key
+            entry["chunks"] += 1
+            manifest["next_id"] += 1
+        db.docstore = InMemoryDocstore(new_docs)
+        db.index_to_docstore_id = index_to_id
+    manifest["ntotal"] = db.index.ntotal
+    return db, manifest
+
+
+class CorpusManager:
+    """
+    Multi-document indexes that grow and shrink without rebuilds.
+
+    Each index keeps a manifest of its sources. A source owns the contiguous chunk-ID range
+    [doc_id, doc_id + chunks); docstore IDs are those chunk IDs and every chunk carries its
+    `doc_id` in the metadata. Adding a document only embeds that document and appends its
+    vectors and text to the loaded store in place, under the store's write lock, which
+    searches read under. Removing one tombstones its range, which searches filter out at
+    once, and the vectors are dropped by a background compaction, which also rebuilds
+    indexes that have outgrown their index type; compacted stores are copies swapped into
+    the index cache, so in-flight searches keep the old one.
+
+    Saving still rewrites the whole index and docstore, since faiss writes indexes whole.
+    It runs on the maintenance thread, off the request path, and saves requested while one
+    is queued are merged into it, so a burst of uploads costs one rewrite.
+
+    Manifests and loaded indexes are held per process and never re-read from disk while
+    cached, so every index must be modified by one API process only (see app.py). A
+    manifest is dropped from memory, after being saved, when its index leaves the cache.
+    """
+
+    def __init__(self):
+        self._manifests: Dict[str, dict] = {}
+        self._locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix="corpus-maintenance")
+        index_cache.on_evict(self._index_evicted)
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    @staticmethod
+    def _manifest_path(key: str) -> Path:
+        return Path(index_path_for(key)) / MANIFEST_NAME
+
+    def _write_manifest(self, key: str, manifest: dict):
+        path = self._manifest_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, path)
+
+    def _load(self, key: str):
+        """Current store and manifest of `key`, or (None, empty manifest). Caller holds the key lock."""
+        try:
+            db = index_cache.get(key)
+        except FileNotFoundError:
+            self._manifests[key] = _empty_manifest()
+            return None, self._manifests[key]
+
+        manifest = self._manifests.get(key)
+        if manifest is None:
+            path = self._manifest_path(key)
+            manifest = json.loads(path.read_text()) if path.exists() else _empty_manifest()
+        if manifest["ntotal"] != db.index.ntotal:
+            # no manifest yet, or the index was saved without it: rebuild from the chunks
+            adopted, manifest = _adopt(db, manifest)
+            if adopted is not db:
+                db = index_cache.put(key, adopted, dirty=True)
+                self._schedule(key, self._flush)
+            else:
+                self._write_manifest(key, manifest)
+        self._manifests[key] = manifest
+        return db, manifest
+
+    def add_document(self, key: str, source: str, chunks: List[str], vectors: np.ndarray,
+                     metadatas: Optional[List[dict]] = None) -> dict:
+        """
+        Append one embedded document to the index `key`, creating the index if needed.
+        A document with the same `source` already in the index is replaced.
+        """
+        with self._key_lock(key), stage("index_add"):
+            db, manifest = self._load(key)
+            if source in manifest["sources"]:
+                old = manifest["sources"].pop(source)
+                manifest["tombstones"].append([old["doc_id"], old["chunks"]])
+
+            doc_id = manifest["next_id"]
+            ids = [str(doc_id + i) for i in range(len(chunks))]
+            metas = []
+            for i in range(len(chunks)):
+                meta = dict(metadatas[i]) if metadatas and i < len(metadatas) else {}
+                meta.setdefault("chunk_id", i)
+                metas.append({**meta, "source": source, "doc_id": doc_id})
+
+            if db is None:
+                db = new_faiss(chunks, vectors, metas, ids)
+            else:
+                db = append_faiss(db, chunks, vectors, metas, ids)
+
+            entry = {"doc_id": doc_id, "chunks": len(chunks), "added_at": time.time()}
+            manifest["sources"][source] = entry
+            manifest["next_id"] = doc_id + len(chunks)
+            manifest["ntotal"] = db.index.ntotal
+            index_cache.put(key, db, dirty=True)
+
+        # a corpus that outgrew its index type (e.g. too small for IVF at first) is rebuilt
+        self._schedule(key, self._compact if manifest["tombstones"] or needs_rebuild(db) else self._flush)
+        return entry
+
+    def remove_document(self, key: str, source: str) -> dict:
+        """Remove a document by source. It disappears from searches immediately."""
+        with self._key_lock(key):
+            _, manifest = self._load(key)
+            entry = manifest["sources"].pop(source, None)
+            if entry is None:
+                raise SourceNotFoundError(source)
+            manifest["tombstones"].append([entry["doc_id"], entry["chunks"]])
+            # the saved index still holds the vectors, so the manifest alone records the removal
+            self._write_manifest(key, manifest)
+        self._schedule(key, self._compact)
+        return entry
+
+    def list_documents(self, key: str) -> dict:
+        with self._key_lock(key):
+            db, manifest = self._load(key)
+            if db is None:
+                raise FileNotFoundError(f"No index for {key}")
+            return {
+                "sources": {name: dict(entry) for name, entry in manifest["sources"].items()},
+                "chunks": manifest["ntotal"],
+                "tombstoned_chunks": sum(count for _, count in manifest["tombstones"]),
+            }
+
+    def search_filter(self, key: str, sources: Optional[List[str]] = None) -> Optional[Callable[[dict], bool]]:
+        """
+        Metadata filter for searches on `key`: only chunks of live documents, restricted to
+        `sources` when given. None when nothing needs filtering.
+        """
+        with self._key_lock(key):
+            _, manifest = self._load(key)
+            if sources is None and not manifest["tombstones"]:
+                return None
+            wanted = manifest["sources"] if sources is None else sources
+            allowed = {manifest["sources"][name]["doc_id"] for name in wanted if name in manifest["sources"]}
+        return lambda metadata: metadata.get("doc_id") in allowed
+
+    def delete(self, key: str):
+        """Delete the index `key` from memory and disk, in the background after pending saves."""
+        self._schedule(key, self._delete)
+
+    def _schedule(self, key: str, task):
+        with self._lock:
+            if (key, task.__name__) in self._pending:
+                return
+            self._pending.add((key, task.__name__))
+
+        def run():
+            with self._lock:
+                self._pending.discard((key, task.__name__))
+            try:
+                task(key)
+            except Exception as e:
+                logger.error(f"Corpus {task.__name__} of {key} failed: {e}", exc_info=True)
+
+        self._maintenance.submit(run)
+
+    def _flush(self, key: str):
+        """Save the index and its manifest together."""
+        with self._key_lock(key):
+            db, manifest = self._load(key)
+            if db is None:
+                return
+            save_faiss(db, index_path_for(key))
+            self._write_manifest(key, manifest)
+            index_cache.mark_clean(key, db)
+
+    def _compact(self, key: str):
+        """Drop the vectors of removed documents and rebuild an outgrown index, then save."""
+        with self._key_lock(key):
+            db, manifest = self._load(key)
+            if db is None or not (manifest["tombstones"] or needs_rebuild(db)):
+                return
+            start = time.perf_counter()
+            ids = [str(doc_id + i) for doc_id, count in manifest["tombstones"] for i in range(count)]
+            db = rebuild_faiss(db, ids) if needs_rebuild(db) else remove_faiss(db, ids)
+            manifest["tombstones"] = []
+            manifest["ntotal"] = db.index.ntotal
+            index_cache.put(key, db, dirty=True)
+            logger.info(f"Compacted corpus {key}: removed {len(ids)} chunks in {time.perf_counter() - start:.3f}s")
+        self._flush(key)
+
+    def _index_evicted(self, key: str):
+        # possibly called while another key lock is held, so the work goes to the maintenance thread
+        try:
+            self._schedule(key, self._forget_manifest)
+        except RuntimeError:
+            pass  # shutting down
+
+    def _forget_manifest(self, key: str):
+        """Save and drop the manifest of an index that is no longer cached."""
+        with self._key_lock(key):
+            manifest = self._manifests.get(key)
+            if manifest is None or index_cache.contains(key):
+                return
+            if Path(index_path_for(key)).is_dir():
+                self._write_manifest(key, manifest)
+            del self._manifests[key]
+
+    def _delete(self, key: str):
+        with self._key_lock(key):
+            index_cache.invalidate(key)
+            self._manifests.pop(key, None)
+            shutil.rmtree(index_path_for(key), ignore_errors=True)
+
+    def shutdown(self):
+        self._maintenance.shutdown(wait=True)
+
+
+# Shared by every endpoint in the process
+corpus = CorpusManager()
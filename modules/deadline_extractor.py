@@ -0,0 +1,180 @@
+# modules/deadline_extractor.py
+import os
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+# Numeric dates like 05/03/2025 are read day-first, as Indian legal documents write them
+DATE_DAY_FIRST = os.getenv("DATE_DAY_FIRST", "true").lower() == "true"
+
+# how far before a date a deadline phrase may appear and still refer to it
+CUE_DISTANCE = 80
+# characters of context kept on each side of a candidate for the LLM fallback
+WINDOW_CHARS = 200
+MAX_WINDOWS = 20
+# characters from each end of a document with no candidates at all, for the LLM fallback
+EXCERPT_CHARS = int(os.getenv("DEADLINE_EXCERPT_CHARS", "4000"))
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH = (r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+          r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)")
+_ORD = r"(?:st|nd|rd|th)?"
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fourteen": 14, "fifteen": 15,
+    "twenty": 20, "twenty one": 21, "twenty-one": 21, "thirty": 30, "forty five": 45,
+    "forty-five": 45, "sixty": 60, "ninety": 90,
+}
+
+# One pass over the text finds every date, deadline phrase and relative deadline.
+_SCAN = re.compile(
+    r"(?P<iso>\b(?P<iy>\d{4})-(?P<im>\d{1,2})-(?P<id>\d{1,2})\b)"
+    r"|(?P<num>\b(?P<n1>\d{1,2})[/.\-](?P<n2>\d{1,2})[/.\-](?P<ny>\d{4}|\d{2})\b)"
+    rf"|(?P<dmy>\b(?P<dd>\d{{1,2}}){_ORD}(?:\s+day\s+of)?[\s\-]+(?P<dmon>{_MONTH})\.?,?[\s\-]+(?P<dy>\d{{4}})\b)"
+    rf"|(?P<mdy>\b(?P<mmon>{_MONTH})\.?\s+(?P<md>\d{{1,2}}){_ORD},?\s+(?P<my>\d{{4}})\b)"
+    r"|(?P<rel>\bwithin\s+(?:a\s+period\s+of\s+)?(?P<rn>\d{1,3}|" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) +
+    r")\s*(?:\(\d+\)\s*)?(?P<runit>days?|weeks?|months?)\s+(?:of|from|after)\b)"
+    r"|(?P<strong>\b(?:last\s+date|on\s+or\s+before|not\s+later\s+than|no\s+later\s+than|due\s+date|deadline"
+    r"|latest\s+by|time\s+limit)\b)"
+    r"|(?P<weak>\b(?:by|before|until|till)\b)"
+    r"|(?P<dated>\b(?:dated|date\s+of\s+(?:this\s+)?(?:notice|order|letter|agreement)|issued\s+on)\b)",
+    re.IGNORECASE,
+)
+
+_STRONG_CONFIDENCE = 0.9
+_WEAK_CONFIDENCE = 0.6
+_RELATIVE_CONFIDENCE = 0.75
+_RELATIVE_UNANCHORED_CONFIDENCE = 0.5
+_BARE_DATE_CONFIDENCE = 0.2
+
+
+class DeadlineResult(NamedTuple):
+    last_date: Optional[date]
+    confidence: float
+    reason: str
+    windows: List[str]
+
+
+def _to_date(year: int, month: int, day: int) -> Optional[date]:
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _parse_date(m: re.Match) -> Optional[date]:
+    if m.group("iso"):
+        return _to_date(int(m.group("iy")), int(m.group("im")), int(m.group("id")))
+    if m.group("num"):
+        a, b, y = int(m.group("n1")), int(m.group("n2")), int(m.group("ny"))
+        day, month = (a, b) if DATE_DAY_FIRST else (b, a)
+        return _to_date(y, month, day) or _to_date(y, day, month)
+    if m.group("dmy"):
+        return _to_date(int(m.group("dy")), _MONTHS[m.group("dmon")[:3].lower()], int(m.group("dd")))
+    return _to_date(int(m.group("my")), _MONTHS[m.group("mmon")[:3].lower()], int(m.group("md")))
+
+
+def _add_period(anchor: date, amount: int, unit: str) -> date:
+    unit = unit.lower()
+    if unit.startswith("week"):
+        return anchor + timedelta(weeks=amount)
+    if unit.startswith("month"):
+        month = anchor.month - 1 + amount
+        year, month = anchor.year + month // 12, month % 12 + 1
+        for day in (anchor.day, 30, 29, 28):
+            d = _to_date(year, month, day)
+            if d:
+                return d
+    return anchor + timedelta(days=amount)
+
+
+def _windows(text: str, positions: List[int]) -> List[str]:
+    """Merge overlapping context windows around the given positions."""
+    spans = []
+    for pos in sorted(positions):
+        start, end = max(0, pos - WINDOW_CHARS), min(len(text), pos + WINDOW_CHARS)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return [text[s:e].strip() for s, e in spans]
+
+
+def head_and_tail(text: str, chars: int = EXCERPT_CHARS) -> str:
+    """The start and end of a document, where dates and deadlines are usually stated."""
+    if len(text) <= 2 * chars:
+        return text
+    return text[:chars] + "\n...\n" + text[-chars:]
+
+
+def extract_deadline(text: str) -> DeadlineResult:
+    """
+    Rule-based last-date extraction in a single scan of the text.
+
+    A date preceded by a deadline phrase ("last date", "on or before", "not later than")
+    scores highest; "within N days of" deadlines are resolved against the document's own
+    date. Candidates are ranked by confidence and then by lateness. The result carries the
+    text windows around every candidate so a fallback LLM call can see just those.
+    """
+    dates: List[Tuple[int, date]] = []
+    cues: List[Tuple[int, float]] = []
+    relatives: List[Tuple[int, int, str]] = []
+    dated_at: List[int] = []
+
+    for m in _SCAN.finditer(text):
+        if m.group("rel"):
+            raw = m.group("rn").lower()
+            amount = int(raw) if raw.isdigit() else _NUMBER_WORDS[re.sub(r"\s+", " ", raw)]
+            relatives.append((m.start(), amount, m.group("runit")))
+        elif m.group("strong"):
+            cues.append((m.end(), _STRONG_CONFIDENCE))
+        elif m.group("weak"):
+            cues.append((m.end(), _WEAK_CONFIDENCE))
+        elif m.group("dated"):
+            dated_at.append(m.end())
+        else:
+            parsed = _parse_date(m)
+            if parsed:
+                dates.append((m.start(), parsed))
+
+    candidates: List[Tuple[float, date, str, int]] = []
+    cue_positions = [pos for pos, _ in cues]
+    for pos, d in dates:
+        # strongest cue that ends shortly before this date
+        near = [conf for _, conf in cues[bisect_left(cue_positions, pos - CUE_DISTANCE):bisect_right(cue_positions, pos)]]
+        if near:
+            candidates.append((max(near), d, "deadline phrase before date", pos))
+
+    if relatives and dates:
+        # the document's own date: the first date right after "dated", else the first date in the text
+        anchor = dates[0][1]
+        anchored = False
+        for dated_pos in dated_at:
+            following = [d for pos, d in dates if 0 <= pos - dated_pos <= CUE_DISTANCE]
+            if following:
+                anchor, anchored = following[0], True
+                break
+        for pos, amount, unit in relatives:
+            conf = _RELATIVE_CONFIDENCE if anchored else _RELATIVE_UNANCHORED_CONFIDENCE
+            candidates.append((conf, _add_period(anchor, amount, unit), f"within {amount} {unit} of {anchor}", pos))
+
+    if not candidates and dates:
+        latest_pos, latest = max(dates, key=lambda x: x[1])
+        candidates.append((_BARE_DATE_CONFIDENCE, latest, "latest date in document", latest_pos))
+
+    positions = [pos for pos, _ in dates] + [pos for pos, _, _ in relatives]
+    positions += [pos for pos, conf in cues if conf >= _STRONG_CONFIDENCE]
+    windows = _windows(text, positions)[:MAX_WINDOWS]
+
+    if not candidates:
+        return DeadlineResult(None, 0.0, "no dates found", windows)
+
+    confidence, best, reason, _ = max(candidates, key=lambda c: (c[0], c[1]))
+    return DeadlineResult(best, confidence, reason, windows)
@@ -0,0 +1,295 @@
+# modules/embedding_cache.py
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", "vectorstore/embedding_cache"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# sqlite caps the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _slug(model: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of chunk embeddings keyed by (embedding model, sha256 of chunk text).
+
+    Vectors are appended to one float32 file per model and read back through a memory map;
+    a small SQLite table maps each key to its row and tracks when it was last used. Once the
+    cache holds more than `max_entries` keys the least recently used ones are dropped, and the
+    vector file is rewritten when dead rows outnumber live ones.
+    """
+
+    def __init__(self, cache_dir: Path = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._maps = {}
+
+    # --- storage helpers ---
+
+    def _db(self):
+        # connections must not cross a fork, so reconnect in child processes
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(str(self.cache_dir / "index.sqlite"), timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER, file TEXT, rows INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors (model TEXT, text_hash TEXT, row INTEGER, last_used REAL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (model, last_used)")
+            self._conn.commit()
+            self._pid = os.getpid()
+            self._maps = {}
+        return self._conn
+
+    def _file_lock(self, shared: bool = False):
+        return _FileLock(self.cache_dir / ".lock", shared)
+
+    def _vectors(self, model: str, file: str, rows: int, dim: int):
+        """Memory-map the model's vector file, remapping when it grew or was compacted."""
+        mapped = self._maps.get(model)
+        if mapped is None or mapped[0] != file or mapped[1].shape[0] < rows:
+            path = self.cache_dir / file
+            total_rows = path.stat().st_size // (4 * dim)
+            mapped = (file, np.memmap(path, dtype=np.float32, mode="r", shape=(total_rows, dim)))
+            self._maps[model] = mapped
+        return mapped[1]
+
+    # --- public API ---
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for whichever of `hashes` are present."""
+        if not hashes:
+            return {}
+        # shared: a writer in another process must not compact the file (renumbering rows and
+        # removing the old file) between reading the row numbers and reading the vectors
+        with self._lock, self._file_lock(shared=True):
+            conn = self._db()
+            meta = conn.execute("SELECT dim, file, rows FROM models WHERE model = ?", (model,)).fetchone()
+            if meta is None:
+                self.misses += len(hashes)
+                return {}
+            dim, file, file_rows = meta
+
+            rows = {}
+            for start in range(0, len(hashes), _SQL_BATCH):
+                batch = hashes[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows.update(conn.execute(
+                    f"SELECT text_hash, row FROM vectors WHERE model = ? AND text_hash IN ({marks})",
+                    (model, *batch),
+                ).fetchall())
+
+            found = {}
+            if rows:
+                try:
+                    vectors = self._vectors(model, file, file_rows, dim)
+                except FileNotFoundError:
+                    # without fcntl (Windows) another process may have compacted the file away
+                    self._maps.pop(model, None)
+                    rows = {}
+                for h, row in rows.items():
+                    found[h] = np.array(vectors[row])
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE vectors SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+            return found
+
+    def put_many(self, model: str, hashes: List[str], vectors) -> None:
+        """Append new vectors for `hashes`; keys already present are left untouched."""
+        if not hashes:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            conn = self._db()
+            meta = conn.execute("SELECT dim, file, rows FROM models WHERE model = ?", (model,)).fetchone()
+            if meta is None:
+                dim, file, rows = vectors.shape[1], f"{_slug(model)}.0.f32", 0
+                conn.execute("INSERT INTO models VALUES (?, ?, ?, ?)", (model, dim, file, rows))
+            else:
+                dim, file, rows = meta
+            if vectors.shape[1] != dim:
+                raise ValueError(f"Embedding dimension changed for {model}: {vectors.shape[1]} != {dim}")
+
+            # vectors are written before their rows are registered, so readers never see a partial row
+            with open(self.cache_dir / file, "ab") as f:
+                f.write(vectors.tobytes())
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO vectors VALUES (?, ?, ?, ?)",
+                [(model, h, rows + i, now) for i, h in enumerate(hashes)],
+            )
+            conn.execute("UPDATE models SET rows = ? WHERE model = ?", (rows + len(hashes), model))
+            conn.commit()
+            self._evict(conn, model)
+
+    def _evict(self, conn, model: str):
+        live = conn.execute("SELECT COUNT(*) FROM vectors WHERE model = ?", (model,)).fetchone()[0]
+        if live > self.max_entries:
+            conn.execute(
+                "DELETE FROM vectors WHERE model = ? AND text_hash IN "
+                "(SELECT text_hash FROM vectors WHERE model = ? ORDER BY last_used LIMIT ?)",
+                (model, model, live - self.max_entries),
+            )
+            conn.commit()
+            live = self.max_entries
+        dim, file, rows = conn.execute("SELECT dim, file, rows FROM models WHERE model = ?", (model,)).fetchone()
+        if rows > 2 * live:
+            self._compact(conn, model, dim, file, rows)
+
+    def _compact(self, conn, model: str, dim: int, file: str, rows: int):
+        """Rewrite the vector file with only live rows under a new name, then switch over."""
+        old = np.memmap(self.cache_dir / file, dtype=np.float32, mode="r", shape=(rows, dim))
+        live = conn.execute("SELECT text_hash, row FROM vectors WHERE model = ? ORDER BY row", (model,)).fetchall()
+        generation = int(file.rsplit(".", 2)[-2]) + 1
+        new_file = f"{_slug(model)}.{generation}.f32"
+        with open(self.cache_dir / new_file, "wb") as f:
+            for start in range(0, len(live), 4096):
+                batch = [row for _, row in live[start:start + 4096]]
+                f.write(np.ascontiguousarray(old[batch]).tobytes())
+        del old
+        conn.executemany(
+            "UPDATE vectors SET row = ? WHERE model = ? AND text_hash = ?",
+            [(i, model, h) for i, (h, _) in enumerate(live)],
+        )
+        conn.execute("UPDATE models SET file = ?, rows = ? WHERE model = ?", (new_file, len(live), model))
+        conn.commit()
+        self._maps.pop(model, None)
+        # processes still mapping the old file keep their view until they notice the new name
+        os.remove(self.cache_dir / file)
+
+    def record(self, hits: int, misses: int):
+        """Count lookups made through another process's instance of this cache."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self._lock:
+            conn = self._db()
+            entries = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class _FileLock:
+    """
+    Advisory lock so several worker processes can share the cache: exclusive for writers,
+    shared for readers.
+    """
+
+    def __init__(self, path: Path, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._f, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the underlying model."""
+
+    def __init__(self, embedding: Embeddings, model_key: str, cache: EmbeddingCache):
+        self.embedding = embedding
+        self.model_key = model_key
+        self.cache = cache
+
+    def embed_array(self, texts: List[str], on_progress=None, batch_size: int = None) -> np.ndarray:
+        """Embed `texts` into a float32 matrix; `on_progress(done, total)` counts cache hits as done."""
+        hashes = [text_hash(t) for t in texts]
+        unique = list(dict.fromkeys(hashes))
+        found = self.cache.get_many(self.model_key, unique)
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        batched = hasattr(self.embedding, "embed_array")
+        if missing:
+            if batched:
+                hits = len(texts) - len(missing)
+                progress = (lambda done, _: on_progress(hits + done, len(texts))) if on_progress else None
+                vectors = self.embedding.embed_array(list(missing.values()), on_progress=progress, batch_size=batch_size)
+            else:
+                vectors = np.asarray(self.embedding.embed_documents(list(missing.values())), dtype=np.float32)
+            self.cache.put_many(self.model_key, list(missing), vectors)
+            found.update(zip(missing, vectors))
+        if on_progress and not (missing and batched):
+            on_progress(len(texts), len(texts))
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[h] for h in hashes]).astype(np.float32, copy=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache, created on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
@@ -0,0 +1,180 @@
+# modules/embedding_engine.py
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# encode processes per host; 0 or 1 encodes in the calling process. Only a process that embeds
+# large jobs itself uses them (build_faiss_from_chunks, the benchmarks): the API hands document
+# embedding to the ingest workers, which encode in-process (see disable_worker_pool)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", str(min(4, (os.cpu_count() or 1) // 2))))
+# torch threads per encode process; 0 splits the host's cores between the workers
+EMBEDDING_WORKER_THREADS = int(os.getenv("EMBEDDING_WORKER_THREADS", "0"))
+# smaller jobs are encoded in-process, where they finish before a pool round trip would
+EMBEDDING_PARALLEL_MIN_CHUNKS = int(os.getenv("EMBEDDING_PARALLEL_MIN_CHUNKS", "256"))
+
+_pool_allowed = True
+
+
+def disable_worker_pool():
+    """
+    Encode in-process from here on. Called in processes that are themselves pool workers:
+    the ingest pool already runs INGEST_WORKERS encoders side by side, and an encode pool in
+    each of them would load the model INGEST_WORKERS * EMBEDDING_WORKERS times and
+    oversubscribe the cores. To give ingestion more encode capacity, raise INGEST_WORKERS.
+    """
+    global _pool_allowed
+    _pool_allowed = False
+
+
+def _encode(model, texts: List[str]) -> np.ndarray:
+    """One batch through the model, as float32 rows."""
+    client = getattr(model, "client", None)
+    if client is not None and hasattr(client, "encode"):
+        # sentence-transformers: straight to numpy, no per-vector Python lists
+        return np.asarray(client.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                        show_progress_bar=False), dtype=np.float32)
+    return np.asarray(model.embed_documents(texts), dtype=np.float32)
+
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, device: str, threads: int):
+    global _worker_model
+    disable_worker_pool()
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from modules.embedding_store import get_embedding_model
+    _worker_model = get_embedding_model(model_name, device, normalize=False)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _encode(_worker_model, texts)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Batched chunk encoder for one model.
+
+    Chunks are sorted by length so each batch holds texts of similar size and pads little,
+    split into `batch_size` batches and, for large jobs, fanned out over `workers` spawned
+    processes that each load the model once. Vectors come back in input order as one
+    float32 matrix, L2-normalized when `normalize` is set. Queries are encoded in-process.
+    """
+
+    def __init__(self, model_name: str, device: str, normalize: bool, batch_size: int,
+                 workers: int = EMBEDDING_WORKERS):
+        self.model_name = model_name
+        self.device = device
+        self.normalize = normalize
+        self.batch_size = batch_size
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.seconds = 0.0
+        self.last_chunks_per_second = 0.0
+
+    def _model(self):
+        from modules.embedding_store import get_embedding_model
+        return get_embedding_model(self.model_name, self.device, self.normalize)
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1 or not _pool_allowed:
+            return None
+        with self._lock:
+            if self._executor is not None and self._executor._broken:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._executor is None:
+                threads = EMBEDDING_WORKER_THREADS or max(1, (os.cpu_count() or 1) // self.workers)
+                # spawn: the parent may already hold torch threads, which do not survive fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.device, threads),
+                )
+            return self._executor
+
+    def embed_array(self, texts: List[str], on_progress: Optional[Callable[[int, int], None]] = None,
+                    batch_size: int = None) -> np.ndarray:
+        """Embed `texts` into a (len(texts), dim) float32 matrix. `on_progress(done, total)` runs per batch."""
+        batch_size = batch_size or self.batch_size
+        start = time.perf_counter()
+        total = len(texts)
+        if total == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        order = sorted(range(total), key=lambda i: len(texts[i]), reverse=True)
+        batches = [order[i:i + batch_size] for i in range(0, total, batch_size)]
+        out = None
+        done = 0
+
+        def place(batch, vectors):
+            nonlocal out, done
+            if out is None:
+                out = np.empty((total, vectors.shape[1]), dtype=np.float32)
+            out[batch] = vectors
+            done += len(batch)
+            if on_progress:
+                on_progress(done, total)
+
+        pool = self._pool() if total >= EMBEDDING_PARALLEL_MIN_CHUNKS else None
+        if pool is None:
+            model = self._model()
+            for batch in batches:
+                place(batch, _encode(model, [texts[i] for i in batch]))
+        else:
+            futures = {pool.submit(_encode_in_worker, [texts[i] for i in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                place(futures[future], future.result())
+
+        if self.normalize:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            np.divide(out, norms, out=out, where=norms > 0)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.chunks += total
+            self.seconds += elapsed
+            self.last_chunks_per_second = total / elapsed if elapsed else 0.0
+        logger.info(f"Embedded {total} chunks in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.1f} chunks/s, "
+                    f"{len(batches)} batches, {'%d workers' % self.workers if pool else 'in-process'})")
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._model().embed_query(text)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model_name": self.model_name,
+                "workers": self.workers if _pool_allowed and self.workers > 1 else 0,
+                "batch_size": self.batch_size,
+                "chunks": self.chunks,
+                "seconds": round(self.seconds, 3),
+                "chunks_per_second": round(self.chunks / self.seconds, 1) if self.seconds else 0.0,
+                "last_chunks_per_second": round(self.last_chunks_per_second, 1),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -1,38 +1,361 @@
 # modules/embedding_store.py
 import os
+import time
+import uuid
+import logging
+import threading
 from pathlib import Path
+from contextlib import contextmanager
+import numpy as np
 from dotenv import load_dotenv
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from modules.embedding_cache import EMBEDDING_CACHE_ENABLED, CachedEmbeddings, get_embedding_cache
+from modules.embedding_engine import EmbeddingEngine
+from modules.metrics import stage
+from modules.vector_index import (
+    INDEX_FILE, DOCSTORE_FILE, add_vectors, appends_in_place, build_index, bytes_per_vector, copy_index, index_kind, plan_index,
+    read_store, removes_in_place, write_store,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")  # "huggingface" or "hash" (offline)
+EMBEDDING_HASH_DIM = int(os.getenv("EMBEDDING_HASH_DIM", "384"))
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+if EMBEDDING_BACKEND == "hash":
+    # its own name keeps hashed vectors apart from real ones in the embedding cache
+    EMBEDDING_MODEL = f"hash-{EMBEDDING_HASH_DIM}"
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_NORMALIZE = os.getenv("EMBEDDING_NORMALIZE", "false").lower() == "true"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
 
 INDEX_DIR = Path("vectorstore/faiss_index")
 INDEX_DIR.mkdir(parents=True, exist_ok=True)
 
-def get_embedding_model():
-    """Get the Hugging Face embeddings model."""
-    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+# Process-wide registry of loaded embedding models, keyed by (model, device, normalize).
+# Loading the sentence-transformers weights takes a second or more, so every caller
+# shares one instance per key instead of building a new one per request.
+_MODEL_REGISTRY = {}
+_MODEL_STATS = {}
+_ENGINES = {}
+_REGISTRY_LOCK = threading.Lock()
 
-def build_faiss_from_chunks(chunks, metadatas=None, index_path: str = str(INDEX_DIR / "faiss_index")):
-    embedding = get_embedding_model()
-    docs = []
-    for i, chunk in enumerate(chunks):
-        meta = metadatas[i] if metadatas and i < len(metadatas) else {"chunk_id": i}
-        docs.append(Document(page_content=chunk, metadata=meta))
-    db = FAISS.from_documents(docs, embedding)
-    db.save_local(index_path)
+
+def _model_key(model_name: str, device: str, normalize: bool):
+    return (model_name, device, bool(normalize))
+
+
+def _model_memory_bytes(embedding) -> int:
+    """Best-effort size of the model weights held by the embedding wrapper."""
+    client = getattr(embedding, "client", None)
+    if client is None or not hasattr(client, "parameters"):
+        return 0
+    try:
+        return sum(p.numel() * p.element_size() for p in client.parameters())
+    except Exception:
+        return 0
+
+
+def get_embedding_model(model_name: str = None, device: str = None, normalize: bool = None):
+    """Get the shared Hugging Face embeddings model, loading it on first use."""
+    model_name = model_name or EMBEDDING_MODEL
+    device = device or EMBEDDING_DEVICE
+    normalize = EMBEDDING_NORMALIZE if normalize is None else normalize
+    key = _model_key(model_name, device, normalize)
+
+    embedding = _MODEL_REGISTRY.get(key)
+    if embedding is not None:
+        return embedding
+
+    with _REGISTRY_LOCK:
+        # another thread may have finished loading while we waited for the lock
+        embedding = _MODEL_REGISTRY.get(key)
+        if embedding is not None:
+            return embedding
+
+        start = time.perf_counter()
+        if EMBEDDING_BACKEND == "hash":
+            from modules.fake_embeddings import HashingEmbeddings
+            embedding = HashingEmbeddings(dim=EMBEDDING_HASH_DIM, normalize=normalize)
+        else:
+            embedding = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": device},
+                encode_kwargs={"normalize_embeddings": normalize},
+            )
+        _MODEL_STATS[key] = {
+            "model_name": model_name,
+            "device": device,
+            "normalize": normalize,
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "memory_bytes": _model_memory_bytes(embedding),
+            "loaded_at": time.time(),
+        }
+        _MODEL_REGISTRY[key] = embedding
+        return embedding
+
+
+def warm_up_embedding_model(model_name: str = None, device: str = None, normalize: bool = None):
+    """Load the embedding model and run one tiny encode so the first request pays nothing."""
+    embedding = get_embedding_model(model_name, device, normalize)
+    embedding.embed_query("warm up")
+    return embedding
+
+
+def get_embedding_engine(model_name: str = None, device: str = None, normalize: bool = None) -> EmbeddingEngine:
+    """The shared batched encoder for a model; it loads the model from this registry."""
+    model_name = model_name or EMBEDDING_MODEL
+    device = device or EMBEDDING_DEVICE
+    normalize = EMBEDDING_NORMALIZE if normalize is None else normalize
+    key = _model_key(model_name, device, normalize)
+    with _REGISTRY_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = _ENGINES[key] = EmbeddingEngine(model_name, device, normalize, EMBEDDING_BATCH_SIZE)
+        return engine
+
+
+def get_document_embedder(model_name: str = None, device: str = None, normalize: bool = None):
+    """Embedder for chunk text: the batched engine behind the content-addressed embedding cache."""
+    engine = get_embedding_engine(model_name, device, normalize)
+    if not EMBEDDING_CACHE_ENABLED:
+        return engine
+    model_key = f"{engine.model_name}|normalize={engine.normalize}"
+    return CachedEmbeddings(engine, model_key, get_embedding_cache())
+
+
+def embedding_engine_stats():
+    """Throughput of every embedding engine in this process."""
+    return [engine.stats() for engine in list(_ENGINES.values())]
+
+
+def shutdown_embedding_engines():
+    for engine in list(_ENGINES.values()):
+        engine.shutdown()
+
+
+def embedding_model_stats():
+    """Load time and memory of every model currently held by the registry."""
+    return [dict(stats) for stats in _MODEL_STATS.values()]
+
+
+def index_path_for(namespace: str) -> str:
+    """Directory holding the index of one conversation or document."""
+    return str(INDEX_DIR / namespace)
+
+
+class ReadWriteLock:
+    """Many readers or one writer. A waiting writer holds off new readers, so appends are not starved."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+def store_lock(db) -> ReadWriteLock:
+    """
+    Lock of a store modified in place (append_faiss): searches and saves read under it.
+    faiss indexes are not safe to search while vectors are being added.
+    """
+    lock = getattr(db, "rw_lock", None)
+    if lock is None:
+        with _REGISTRY_LOCK:
+            lock = db.__dict__.setdefault("rw_lock", ReadWriteLock())
+    return lock
+
+
+def estimate_index_bytes(db) -> int:
+    """Approximate in-memory size of a loaded FAISS store: vector codes plus stored chunk text."""
+    vector_bytes = db.index.ntotal * bytes_per_vector(db.index)
+    text_bytes = getattr(db.docstore, "text_bytes", None)
+    if text_bytes is None:
+        text_bytes = sum(len(doc.page_content) for doc in db.docstore._dict.values())
+    return vector_bytes + text_bytes
+
+
+def new_faiss(texts, vectors, metadatas=None, ids=None):
+    """FAISS store over precomputed vectors, with the index type set by INDEX_TYPE / INDEX_STORAGE."""
+    ids = ids or [str(uuid.uuid4()) for _ in texts]
+    metadatas = metadatas or [{} for _ in texts]
+    docs = {doc_id: Document(page_content=text, metadata=meta) for doc_id, text, meta in zip(ids, texts, metadatas)}
+    # queries go straight to the model; only chunk embeddings are worth caching
+    return FAISS(get_embedding_model(), build_index(vectors), InMemoryDocstore(docs), dict(enumerate(ids)))
+
+
+def clone_faiss(db):
+    """Modifiable in-memory copy of a store, so readers of the original are never disturbed."""
+    ids = [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
+    mmap_path = getattr(db, "mmap_path", None)
+    return FAISS(
+        db.embedding_function,
+        copy_index(db.index, Path(mmap_path) if mmap_path else None),
+        InMemoryDocstore({doc_id: db.docstore.search(doc_id) for doc_id in ids}),
+        dict(enumerate(ids)),
+        normalize_L2=db._normalize_L2,
+        distance_strategy=db.distance_strategy,
+    )
+
+
+def append_faiss(db, texts, vectors, metadatas, ids):
+    """
+    Add chunks with precomputed vectors to the store in place, under its write lock, so
+    the cost is that of the new chunks only. Returns the store, which is a copy when the
+    loaded index cannot grow in place (memory-mapped IVF lists); save it to persist.
+    """
+    if not appends_in_place(db.index):
+        db = clone_faiss(db)
+    docs = {doc_id: Document(page_content=text, metadata=meta) for doc_id, text, meta in zip(ids, texts, metadatas)}
+    with store_lock(db).write():
+        start = db.index.ntotal
+        add_vectors(db.index, vectors)
+        db.docstore.add(docs)
+        db.index_to_docstore_id.update({start + i: doc_id for i, doc_id in enumerate(ids)})
+        # no longer what the files it was opened from hold
+        db.mmap_path = None
+    return db
+
+
+def remove_faiss(db, drop_ids):
+    """A copy of the store without the chunks in `drop_ids`, removed in place where the index allows it."""
+    if not removes_in_place(db.index):
+        return rebuild_faiss(db, drop_ids)
+    db = clone_faiss(db)
+    db.delete(list(drop_ids))
+    return db
+
+
+def rebuild_faiss(db, drop_ids=()):
+    """
+    Rebuild a store with the configured index type, without the chunks in `drop_ids`.
+    Vectors come from the index itself, so nothing is re-embedded (quantized codes stay approximate).
+    """
+    drop = set(drop_ids)
+    keep = [i for i in range(db.index.ntotal) if db.index_to_docstore_id[i] not in drop]
+    ids = [db.index_to_docstore_id[i] for i in keep]
+    vectors = db.index.reconstruct_batch(np.asarray(keep, dtype=np.int64))
+    docs = [db.docstore.search(doc_id) for doc_id in ids]
+    return new_faiss([d.page_content for d in docs], vectors, [d.metadata for d in docs], ids)
+
+
+def needs_rebuild(db) -> bool:
+    """True when the store has grown enough to use a different index than the one it was built with."""
+    planned = plan_index(db.index.d, db.index.ntotal)[1:]
+    return index_kind(db.index) != planned
+
+
+def save_faiss(db, index_path: str):
+    """Persist the FAISS index and its columnar docstore to disk."""
+    if getattr(db, "mmap_path", None) == str(index_path):
+        # opened from these very files and never modified (append_faiss clears mmap_path)
+        return
+    with stage("index_save"), store_lock(db).read():
+        ids = [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
+        write_store(Path(index_path), db.index, ids, [db.docstore.search(doc_id) for doc_id in ids],
+                    {"normalize_L2": db._normalize_L2, "distance_strategy": str(db.distance_strategy.value)})
+
+
+def embed_chunks(chunks, on_progress=None, batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+    """
+    Embed chunk text through the embedding cache and the batched engine. Returns a float32
+    matrix ready for the index. `on_progress(done, total)` is called after every batch.
+    """
+    return get_document_embedder().embed_array(list(chunks), on_progress=on_progress, batch_size=batch_size)
+
+
+def build_faiss_from_chunks(chunks, metadatas=None, index_path: str = str(INDEX_DIR / "faiss_index"),
+                            on_progress=None, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    Embed chunks in batches and save a new FAISS index.
+    `on_progress(done, total)` is called after every batch.
+    """
+    metas = []
+    for i in range(len(chunks)):
+        metas.append(metadatas[i] if metadatas and i < len(metadatas) else {"chunk_id": i})
+
+    vectors = embed_chunks(chunks, on_progress=on_progress, batch_size=batch_size)
+
+    db = new_faiss(chunks, vectors, metas)
+    save_faiss(db, index_path)
     return db
 
+class LegacyIndexError(RuntimeError):
+    """Raised when loading an index still in the pickle format; see modules.migrate_indexes."""
+
+
+def is_pickled_index(index_path: str) -> bool:
+    idx_path = Path(index_path)
+    return not (idx_path / DOCSTORE_FILE).exists() and (idx_path / "index.pkl").exists()
+
+
+def convert_pickled_index(index_path: str):
+    """
+    Rewrite a pickled index in the columnar format. Unpickling runs arbitrary code, so
+    this is only done by the explicit migration command, for indexes this service wrote.
+    """
+    legacy = FAISS.load_local(index_path, get_embedding_model(), allow_dangerous_deserialization=True)
+    save_faiss(legacy, index_path)
+    (Path(index_path) / "index.pkl").unlink()
+
+
+@stage("index_load")
 def load_faiss(index_path: str = str(INDEX_DIR / "faiss_index")):
-    """Load the FAISS index."""
+    """
+    Open a saved FAISS index. Vectors are memory-mapped where the index type allows it
+    (INDEX_MMAP) and chunk text is read lazily. Pickled indexes are never loaded here.
+    """
     embedding = get_embedding_model()
     idx_path = Path(index_path)
-    if not idx_path.exists():
+    if not (idx_path / INDEX_FILE).exists():
         raise FileNotFoundError(f"No index at {index_path}")
-    
-    db = FAISS.load_local(index_path, embedding, allow_dangerous_deserialization=True)
-    return db
\ No newline at end of file
+    if is_pickled_index(index_path):
+        raise LegacyIndexError(f"Index at {index_path} is in the pickle format; "
+                               f"convert it with: python -m modules.migrate_indexes")
+
+    index, ids, docstore, extra = read_store(idx_path)
+    db = FAISS(
+        embedding, index, docstore, dict(enumerate(ids)),
+        normalize_L2=extra.get("normalize_L2", False),
+        distance_strategy=DistanceStrategy(extra.get("distance_strategy", DistanceStrategy.EUCLIDEAN_DISTANCE.value)),
+    )
+    db.mmap_path = str(index_path)
+    return db
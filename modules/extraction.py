@@ -0,0 +1,173 @@
+# modules/extraction.py
+import io
+import os
+import tempfile
+import multiprocessing
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+import docx
+import fitz  # PyMuPDF
+
+SUPPORTED = (".pdf", ".txt", ".docx")
+
+# PDFs with more pages than this are split into page ranges and parsed by worker processes
+EXTRACTION_PARALLEL_PAGES = int(os.getenv("EXTRACTION_PARALLEL_PAGES", "64"))
+EXTRACTION_PAGE_RANGE = int(os.getenv("EXTRACTION_PAGE_RANGE", "16"))
+EXTRACTION_PAGE_WORKERS = int(os.getenv("EXTRACTION_PAGE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# non-paginated formats are yielded in blocks of roughly this many characters
+TEXT_BLOCK_CHARS = 64 * 1024
+
+Page = Tuple[Optional[int], str]
+# a path on disk, or the document's bytes when the upload was kept in memory
+Source = Union[str, bytes]
+
+
+def _open_pdf(source: Source):
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _extract_range(source: Source, start: int, end: int) -> List[str]:
+    """Text of pages [start, end) of a PDF. Runs inside a worker process."""
+    with _open_pdf(source) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
+
+_page_pool = None
+_pool_allowed = True
+
+
+def disable_page_pool():
+    """Parse PDFs in-process from here on, e.g. in a process whose work is already spread over a pool."""
+    global _pool_allowed
+    _pool_allowed = False
+
+
+def _page_pool_allowed() -> bool:
+    # a child process (any pool worker) never starts its own pool: nested pools keep it from exiting
+    return _pool_allowed and multiprocessing.parent_process() is None
+
+
+def _get_page_pool():
+    global _page_pool
+    if _page_pool is None:
+        # spawn: the parent may already hold torch threads, which do not survive a fork
+        ctx = multiprocessing.get_context("spawn")
+        _page_pool = ProcessPoolExecutor(max_workers=EXTRACTION_PAGE_WORKERS, mp_context=ctx)
+    return _page_pool
+
+
+def shutdown_page_pool():
+    global _page_pool
+    if _page_pool is not None:
+        _page_pool.shutdown(wait=True, cancel_futures=True)
+        _page_pool = None
+
+
+def iter_pdf_pages(source: Source) -> Iterator[Page]:
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+        if page_count <= EXTRACTION_PARALLEL_PAGES or EXTRACTION_PAGE_WORKERS < 2 or not _page_pool_allowed():
+            for i in range(page_count):
+                yield i + 1, doc[i].get_text()
+            return
+
+    spill = None
+    if isinstance(source, bytes):
+        # workers get a path: sending the whole document with every page range would copy it many times
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(source)
+        source = spill = f.name
+
+    # keep only a couple of ranges per worker in flight so memory stays flat for huge filings
+    pool = _get_page_pool()
+    ranges = [(s, min(s + EXTRACTION_PAGE_RANGE, page_count)) for s in range(0, page_count, EXTRACTION_PAGE_RANGE)]
+    pending = deque()
+    next_range = 0
+    try:
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < 2 * EXTRACTION_PAGE_WORKERS:
+                start, end = ranges[next_range]
+                pending.append((start, pool.submit(_extract_range, source, start, end)))
+                next_range += 1
+            start, future = pending.popleft()
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if spill is not None:
+            # ranges still being parsed keep their open handle to the file
+            os.remove(spill)
+
+
+def iter_docx_pages(source: Source) -> Iterator[Page]:
+    doc = docx.Document(io.BytesIO(source) if isinstance(source, bytes) else source)
+    block, size = [], 0
+    for para in doc.paragraphs:
+        block.append(para.text)
+        size += len(para.text)
+        if size >= TEXT_BLOCK_CHARS:
+            yield None, "\n".join(block)
+            block, size = [], 0
+    if block:
+        yield None, "\n".join(block)
+
+
+def iter_txt_pages(source: Source) -> Iterator[Page]:
+    if isinstance(source, bytes):
+        f = io.StringIO(source.decode("utf-8", errors="ignore"))
+    else:
+        f = open(source, "r", encoding="utf-8", errors="ignore")
+    with f:
+        while True:
+            block = f.read(TEXT_BLOCK_CHARS)
+            if not block:
+                return
+            # finish the current line so a block never ends mid-word
+            block += f.readline()
+            yield None, block
+
+
+def _file_type(source: Source, filename: Optional[str]) -> str:
+    if filename is None and isinstance(source, bytes):
+        raise ValueError("A filename is needed to tell the type of an in-memory document")
+    ext = Path(filename or source).suffix.lower()
+    if ext not in SUPPORTED:
+        raise ValueError(f"Unsupported file type: {ext}")
+    return ext
+
+
+def iter_pages(source: Source, on_page: Optional[Callable[[int], None]] = None,
+               filename: Optional[str] = None) -> Iterator[Page]:
+    """
+    Yield (page_number, text) for a PDF, DOCX or TXT document, one page at a time.
+    `source` is a path or the file's bytes; for bytes, `filename` gives the type.
+    DOCX and TXT have no pages; they are yielded in blocks with page_number None.
+    `on_page(count)` is called after each yielded page or block.
+    """
+    ext = _file_type(source, filename)
+    if ext == ".pdf":
+        pages = iter_pdf_pages(source)
+    elif ext == ".docx":
+        pages = iter_docx_pages(source)
+    else:
+        pages = iter_txt_pages(source)
+
+    for count, page in enumerate(pages, start=1):
+        yield page
+        if on_page:
+            on_page(count)
+
+
+def extract_text(source: Source, filename: Optional[str] = None) -> str:
+    """Full text of a document (path or bytes), for callers that need it in one piece."""
+    ext = _file_type(source, filename)
+    # PDF pages and TXT blocks are concatenated as-is; DOCX blocks end at a paragraph
+    separator = "\n" if ext == ".docx" else ""
+    return separator.join(text for _, text in iter_pages(source, filename=filename))
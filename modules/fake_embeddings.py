@@ -0,0 +1,43 @@
+# modules/fake_embeddings.py
+import re
+import zlib
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for the sentence-transformers model, for offline benchmarks.
+
+    Each word and word pair is hashed to a signed bucket of a `dim`-sized vector, so texts
+    that share vocabulary land close together and retrieval behaves sensibly, with no
+    model download and a cost that grows only with text length.
+    """
+
+    def __init__(self, dim: int = 384, normalize: bool = False):
+        self.dim = dim
+        self.normalize = normalize
+
+    def _vector(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        features = words + [a + " " + b for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if features:
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vector, hashes % self.dim, signs)
+        if self.normalize:
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text).tolist()
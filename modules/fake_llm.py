@@ -0,0 +1,99 @@
+# modules/fake_llm.py
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_ISO_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for Gemini with a fixed response latency.
+
+    It answers the prompts used by this service in the shape their parsers expect,
+    so the summarizer and RAG paths run end to end without network access. With an
+    `error_rate`, that fraction of calls fails like a provider quota error would.
+    """
+
+    latency: float = 0.5
+    # number of pieces a streamed response is split into; latency is spread across them
+    stream_chunks: int = 10
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-legal"
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            from modules.llm_gateway import TransientLLMError
+            raise TransientLLMError("Fake quota exceeded")
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        dates = _ISO_DATE.findall(prompt)
+
+        if "urgency_percentage" in prompt:
+            urgency = digest % 101
+            summary = {
+                "category": "Notice",
+                "description": "Synthetic summary produced by the fake model.",
+                "important_timeline": dates[:3],
+                "main_takeaway": ["The document sets out obligations of the parties."],
+                "risk_factors": ["Missing the stated deadline may lead to penalties."],
+                "next_steps": ["Review the document with counsel."],
+                "urgency_percentage": urgency,
+                "urgency_level": "High" if urgency >= 67 else "Medium" if urgency >= 34 else "Low",
+            }
+            if "last_date" in prompt:
+                # combined analysis: summary plus deadline in one response
+                return json.dumps({"summary": summary, "last_date": max(dates) if dates else None})
+            return json.dumps(summary)
+        if "last_date" in prompt:
+            return json.dumps({"last_date": max(dates) if dates else None})
+
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0].strip()
+        return context[:300] or "Sorry it is not present in knowledge base, use google to get answer of general query"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        self._maybe_fail()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        self._maybe_fail()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    def _pieces(self, text: str) -> List[str]:
+        words = text.split(" ")
+        size = max(1, -(-len(words) // self.stream_chunks))
+        pieces = [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+        return [p if i == 0 else " " + p for i, p in enumerate(pieces)]
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self._maybe_fail()
+        pieces = self._pieces(self._respond(messages))
+        for piece in pieces:
+            time.sleep(self.latency / len(pieces))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self._maybe_fail()
+        pieces = self._pieces(self._respond(messages))
+        for piece in pieces:
+            await asyncio.sleep(self.latency / len(pieces))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
@@ -0,0 +1,173 @@
+# modules/index_cache.py
+import os
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Callable, List
+
+from modules.embedding_store import load_faiss, save_faiss, index_path_for, estimate_index_bytes
+
+INDEX_CACHE_MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class IndexCache:
+    """
+    Bounded LRU cache of loaded FAISS indexes, one entry per index namespace.
+
+    Entries are evicted least-recently-used first once the byte budget is exceeded.
+    Evicted indexes that changed since they were last saved are written to disk, and
+    any evicted index is reloaded from disk the next time it is requested. Listeners
+    registered with `on_evict` are told which key was evicted, so per-index state kept
+    elsewhere can be dropped with it.
+    """
+
+    def __init__(self, max_bytes: int = INDEX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._total_bytes = 0
+        # a fresh number whenever an index is loaded, replaced or modified, so dependent caches
+        # can tell; numbers are never reused, so entries only exist for cached indexes
+        self._versions = {}
+        self._counter = itertools.count(1)
+        self._listeners: List[Callable[[str], None]] = []
+        # evicted entries waiting to be saved and reported once the lock is released,
+        # and the dirty ones being saved, which get() hands out instead of the stale files
+        self._evicted = []
+        self._saving = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, key: str, db, dirty: bool = False):
+        """Insert a freshly built or modified index."""
+        with self._lock:
+            self._versions[key] = next(self._counter)
+            self._insert(key, db, dirty)
+        self._finish_evictions()
+        return db
+
+    def _insert(self, key: str, db, dirty: bool = False):
+        size = estimate_index_bytes(db)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old["bytes"]
+            self._entries[key] = {"db": db, "bytes": size, "dirty": dirty}
+            self._total_bytes += size
+            self._evict()
+        return db
+
+    def get(self, key: str):
+        """Return the loaded index for `key`, reading it from disk on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["db"]
+            self.misses += 1
+            saving = self._saving.get(key)
+            if saving is not None:
+                # evicted with unsaved changes and still being written: the files are stale
+                self._versions[key] = next(self._counter)
+                self._insert(key, saving, dirty=True)
+        if saving is not None:
+            self._finish_evictions()
+            return saving
+
+        # load outside the lock so hits on other indexes are not blocked by disk I/O
+        db = load_faiss(index_path=index_path_for(key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # another request loaded it while we were reading
+                self._entries.move_to_end(key)
+                return entry["db"]
+            self._versions[key] = next(self._counter)
+            self._insert(key, db)
+        self._finish_evictions()
+        return db
+
+    def mark_dirty(self, key: str):
+        """Flag an index as modified in memory so eviction saves it first."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                size = estimate_index_bytes(entry["db"])
+                self._total_bytes += size - entry["bytes"]
+                entry["bytes"] = size
+                entry["dirty"] = True
+                self._versions[key] = next(self._counter)
+                self._evict()
+        self._finish_evictions()
+
+    def mark_clean(self, key: str, db):
+        """Record that `db` was saved, unless it has been replaced in the meantime."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["db"] is db:
+                entry["dirty"] = False
+
+    def invalidate(self, key: str):
+        """Drop an index from memory without saving it."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry["bytes"]
+            self._versions.pop(key, None)
+
+    def version(self, key: str) -> int:
+        """Changes whenever the index stored under `key` changes; 0 when it is not loaded."""
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def on_evict(self, listener: Callable[[str], None]):
+        """Call `listener(key)` after an index is evicted (and saved, if it had changes)."""
+        self._listeners.append(listener)
+
+    def _evict(self):
+        """Drop least recently used entries over the budget. Caller holds the lock, then calls _finish_evictions."""
+        # always keep the most recent entry, even if it alone exceeds the budget
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["bytes"]
+            self._versions.pop(key, None)
+            self.evictions += 1
+            if entry["dirty"]:
+                self._saving[key] = entry["db"]
+            self._evicted.append((key, entry))
+
+    def _finish_evictions(self):
+        """Save and report evicted entries, outside the lock so a large save blocks no other request."""
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+        for key, entry in evicted:
+            try:
+                if entry["dirty"]:
+                    save_faiss(entry["db"], index_path_for(key))
+            finally:
+                with self._lock:
+                    if self._saving.get(key) is entry["db"]:
+                        del self._saving[key]
+            for listener in self._listeners:
+                listener(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by every endpoint in the process
+index_cache = IndexCache()
@@ -0,0 +1,241 @@
+# modules/ingest_jobs.py
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from modules.chunking import iter_chunks
+from modules.extraction import disable_page_pool, iter_pages
+from modules.embedding_cache import EMBEDDING_CACHE_ENABLED, get_embedding_cache
+from modules.embedding_store import embed_chunks, warm_up_embedding_model
+from modules.embedding_engine import disable_worker_pool
+from modules.corpus import corpus
+from modules.metrics import CHUNKS, QUEUE_WAIT_SECONDS, observe_stage
+from modules.uploads import BufferedUpload
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "8"))
+INGEST_JOB_RETENTION_SECONDS = int(os.getenv("INGEST_JOB_RETENTION_SECONDS", "3600"))
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue already holds the maximum number of jobs."""
+
+
+def _init_worker():
+    # each worker process loads the embedding model once, before its first job;
+    # a failure here must not break the pool, the job itself will report it
+    # ingest workers already run in parallel, so they encode and parse in-process rather than nest pools
+    disable_worker_pool()
+    disable_page_pool()
+    try:
+        warm_up_embedding_model()
+    except Exception as e:
+        logger.error(f"Could not warm up embedding model in ingest worker: {e}")
+
+
+def _timed(pages, timings: dict):
+    """Pass pages through, adding the time spent producing them to timings["extract"]."""
+    pages = iter(pages)
+    while True:
+        start = time.perf_counter()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        finally:
+            timings["extract"] += time.perf_counter() - start
+        yield page
+
+
+def _run_ingest(content, filename: str, progress) -> dict:
+    """
+    Parse, chunk and embed one document, given as bytes or a spilled upload's path.
+    Runs inside a worker process; the parent appends the returned vectors to the corpus index.
+    The result also carries per-stage timings and this job's embedding cache hits and misses.
+    """
+    progress["status"] = "running"
+    started_at = time.time()
+
+    def on_page(pages: int):
+        progress["pages_parsed"] = pages
+
+    def on_embedded(done: int, total: int):
+        progress["chunks_embedded"] = done
+
+    # extraction and chunking interleave page by page; chunking is the remainder
+    timings = {"extract": 0.0}
+    start = time.perf_counter()
+    chunks, metadatas = [], []
+    pages = _timed(iter_pages(content, on_page=on_page, filename=filename), timings)
+    for i, (chunk, meta) in enumerate(iter_chunks(pages)):
+        chunks.append(chunk)
+        metadatas.append({"chunk_id": i, **meta})
+    timings["chunk"] = time.perf_counter() - start - timings["extract"]
+    if not chunks:
+        raise ValueError("The document is empty or could not be processed.")
+    progress["chunks_total"] = len(chunks)
+
+    cache = get_embedding_cache() if EMBEDDING_CACHE_ENABLED else None
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    start = time.perf_counter()
+    vectors = embed_chunks(chunks, on_progress=on_embedded)
+    timings["embed"] = time.perf_counter() - start
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return {"chunks": chunks, "metadatas": metadatas, "vectors": vectors, "timings": timings,
+            "started_at": started_at, "cache": (hits, misses)}
+
+
+class IngestJobManager:
+    """
+    Runs document ingestion on a bounded process pool. Workers parse and embed; the
+    finished document is appended to the corpus index named by the job's `index_key`.
+
+    Finished results are added to the corpus on one finisher thread, in completion order,
+    so index work never holds up the pool's result delivery.
+
+    Jobs report progress through a shared dict updated by the worker. At most
+    `max_queue_depth` jobs may be queued or running at once; further submissions
+    raise `QueueFullError`.
+    """
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, max_queue_depth: int = INGEST_QUEUE_DEPTH):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._jobs: Dict[str, dict] = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._finisher = None
+        self._mp_manager = None
+
+    def _ensure_started(self):
+        if self._executor is not None and self._executor._broken:
+            # a worker died abruptly; start a fresh pool instead of failing every later job
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._mp_manager is None:
+            self._mp_manager = multiprocessing.get_context("spawn").Manager()
+        if self._executor is None:
+            # spawn avoids forking a process that already holds torch threads
+            ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx, initializer=_init_worker)
+        if self._finisher is None:
+            self._finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-finish")
+
+    def submit(self, upload: BufferedUpload, index_key: str,
+               on_success: Optional[Callable[[dict], None]] = None) -> str:
+        """
+        Queue an upload for ingestion into the index `index_key` and return its job ID.
+        Once queued, the job owns the upload and closes it when done; if queuing raises,
+        the caller still owns it.
+        """
+        filename = upload.filename
+        with self._lock:
+            if self._active >= self.max_queue_depth:
+                raise QueueFullError(f"Ingestion queue is full ({self.max_queue_depth} jobs).")
+            self._ensure_started()
+            self._prune()
+            self._active += 1
+            finisher = self._finisher
+
+            job_id = str(uuid.uuid4())
+            progress = self._mp_manager.dict(status="queued", pages_parsed=0, chunks_total=0, chunks_embedded=0)
+            job = {
+                "job_id": job_id,
+                "filename": filename,
+                "conversation_id": None,
+                "error": None,
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "progress": progress,
+            }
+            self._jobs[job_id] = job
+
+        try:
+            future = self._executor.submit(_run_ingest, upload.content, filename, progress)
+        except BaseException:
+            # e.g. BrokenProcessPool or a shutdown; the caller still owns the upload
+            with self._lock:
+                self._active -= 1
+                self._jobs.pop(job_id, None)
+            raise
+
+        def _finish(fut):
+            outcome = "failed"
+            try:
+                result = fut.result()
+                QUEUE_WAIT_SECONDS.observe(max(0.0, result["started_at"] - job["submitted_at"]), queue="ingest")
+                for stage_name, seconds in result["timings"].items():
+                    observe_stage(stage_name, seconds)
+                CHUNKS.inc(len(result["chunks"]))
+                if EMBEDDING_CACHE_ENABLED:
+                    # the worker's cache counters live in its own process
+                    get_embedding_cache().record(*result["cache"])
+                corpus.add_document(index_key, filename, result["chunks"], result["vectors"], result["metadatas"])
+                job["chunks"] = len(result["chunks"])
+                job["conversation_id"] = index_key
+                if on_success:
+                    on_success(job)
+                outcome = "done"
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed: {e}", exc_info=not isinstance(e, ValueError))
+                job["error"] = str(e)
+            finally:
+                upload.close()
+                job["finished_at"] = time.time()
+                with self._lock:
+                    self._active -= 1
+                # published last, so a client that sees it also sees the result and a free slot
+                progress["status"] = outcome
+
+        def _done(fut):
+            # runs on the pool's result thread; the corpus update happens on the finisher
+            try:
+                finisher.submit(_finish, fut)
+            except RuntimeError:
+                # finisher shut down with the manager
+                _finish(fut)
+
+        future.add_done_callback(_done)
+        return job_id
+
+    def _prune(self):
+        cutoff = time.time() - INGEST_JOB_RETENTION_SECONDS
+        for job_id in [j for j, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        # progress first: the status is published after the rest of the job record
+        progress = dict(job["progress"])
+        result = {k: v for k, v in job.items() if k != "progress"}
+        result.update(progress)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"active": self._active, "max_queue_depth": self.max_queue_depth, "workers": self.max_workers}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._finisher is not None:
+            self._finisher.shutdown(wait=True)
+            self._finisher = None
+        if self._mp_manager is not None:
+            self._mp_manager.shutdown()
+            self._mp_manager = None
+
+
+ingest_jobs = IngestJobManager()
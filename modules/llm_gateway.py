@@ -0,0 +1,380 @@
+# modules/llm_gateway.py
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import Field
+
+from modules.tokens import count_tokens
+from modules.metrics import LLM_TOKENS, QUEUE_WAIT_SECONDS, observe_stage
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")   # "gemini" or "fake"
+# provider quota; 0 disables the limit
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+# reserved for the response before it is known, then corrected to the actual size
+LLM_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKEN_ESTIMATE", "512"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+
+class TransientLLMError(Exception):
+    """A provider error worth retrying (quota, overload, timeout). Raised by the fake backend."""
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (TransientLLMError, ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    try:
+        from google.api_core import exceptions as google_errors
+    except ImportError:
+        return False
+    return isinstance(e, (google_errors.ResourceExhausted, google_errors.TooManyRequests,
+                          google_errors.ServiceUnavailable, google_errors.DeadlineExceeded,
+                          google_errors.InternalServerError, google_errors.Aborted))
+
+
+class TokenBucket:
+    """
+    Per-minute budget refilled continuously. A reservation is debited at once, possibly
+    into debt, and the caller waits until the debt is repaid, so callers are served in
+    the order they reserved.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self._level = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Debit `amount` and return how many seconds to wait before using it."""
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.capacity / 60)
+            self._updated = now
+            self._level -= min(amount, self.capacity)
+            return max(0.0, -self._level * 60 / self.capacity)
+
+    def adjust(self, amount: float):
+        """Correct an earlier reservation by `amount` (negative to refund)."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._level = min(self.capacity, self._level - amount)
+
+
+def _gemini_client(model: str, temperature: float, max_output_tokens: Optional[int], api_key: Optional[str]):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    extra = {"max_output_tokens": max_output_tokens} if max_output_tokens else {}
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=api_key, **extra)
+
+
+def _fake_client(model: str, temperature: float, max_output_tokens: Optional[int], api_key: Optional[str]):
+    from modules.fake_llm import FakeChatModel
+    return FakeChatModel(latency=FAKE_LLM_LATENCY, error_rate=FAKE_LLM_ERROR_RATE)
+
+
+_BACKENDS: Dict[str, Callable[..., BaseChatModel]] = {"gemini": _gemini_client, "fake": _fake_client}
+
+
+def register_backend(name: str, factory: Callable[..., BaseChatModel]):
+    """Add an LLM backend: `factory(model, temperature, max_output_tokens, api_key)` returns a chat model."""
+    _BACKENDS[name] = factory
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(f"{m.type}:{m.content}" for m in messages)
+
+
+def _result_text(result: ChatResult) -> str:
+    return "".join(str(g.message.content) for g in result.generations)
+
+
+class LLMGateway:
+    """
+    The one way this process talks to an LLM provider.
+
+    Clients are pooled per configuration, so connections are reused across requests.
+    Every upstream call first reserves a request and its estimated tokens from the
+    per-minute buckets, and transient failures are retried with jittered exponential
+    backoff. Identical prompts to the same client that are already in flight are not
+    sent again: later callers wait for the first call and share its result.
+    """
+
+    def __init__(self, requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self._clients: Dict[tuple, BaseChatModel] = {}
+        self._inflight: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+
+    def client(self, backend: str, model: str, temperature: float, max_output_tokens: Optional[int],
+               api_key: Optional[str]) -> BaseChatModel:
+        key = (backend, model, temperature, max_output_tokens, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if backend not in _BACKENDS:
+                    raise ValueError(f"Unknown LLM backend {backend!r}; expected one of {sorted(_BACKENDS)}")
+                client = self._clients[key] = _BACKENDS[backend](model, temperature, max_output_tokens, api_key)
+            return client
+
+    def _reserve(self, prompt_tokens: int) -> float:
+        wait = max(self.request_bucket.reserve(1), self.token_bucket.reserve(prompt_tokens + LLM_OUTPUT_TOKEN_ESTIMATE))
+        if wait > 0:
+            with self._lock:
+                self.throttled += 1
+                self.throttle_seconds += wait
+            QUEUE_WAIT_SECONDS.observe(wait, queue="llm_rate_limit")
+        return wait
+
+    def _settle(self, prompt_tokens: int, output_text: str, started: float):
+        """Record a successful upstream call that began at `started` (perf_counter)."""
+        observe_stage("llm", time.perf_counter() - started)
+        completion_tokens = count_tokens(output_text)
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+        self.token_bucket.adjust(completion_tokens - LLM_OUTPUT_TOKEN_ESTIMATE)
+
+    def _backoff(self, attempt: int, e: Exception) -> float:
+        if attempt >= self.max_retries or not _retryable(e):
+            with self._lock:
+                self.failures += 1
+            raise e
+        delay = min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+        with self._lock:
+            self.retries += 1
+        logger.warning(f"LLM call failed ({type(e).__name__}: {e}); retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    @staticmethod
+    def _key(client: BaseChatModel, text: str, stop: Optional[List[str]], kwargs: dict) -> str:
+        raw = "\x1f".join([str(id(client)), text, repr(stop), repr(sorted(kwargs.items()))])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _call(self, client: BaseChatModel, messages: List[BaseMessage], text: str,
+              stop: Optional[List[str]], kwargs: dict) -> ChatResult:
+        tokens = count_tokens(text)
+        attempt = 0
+        while True:
+            time.sleep(self._reserve(tokens))
+            try:
+                with self._lock:
+                    self.calls += 1
+                started = time.perf_counter()
+                result = client.generate([messages], stop=stop, **kwargs)
+                result = ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+                self._settle(tokens, _result_text(result), started)
+                return result
+            except Exception as e:
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    async def _acall(self, client: BaseChatModel, messages: List[BaseMessage], text: str,
+                     stop: Optional[List[str]], kwargs: dict) -> ChatResult:
+        tokens = count_tokens(text)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(tokens))
+            try:
+                with self._lock:
+                    self.calls += 1
+                started = time.perf_counter()
+                result = await client.agenerate([messages], stop=stop, **kwargs)
+                result = ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+                self._settle(tokens, _result_text(result), started)
+                return result
+            except Exception as e:
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def generate(self, client: BaseChatModel, messages: List[BaseMessage],
+                 stop: Optional[List[str]] = None, **kwargs) -> ChatResult:
+        text = _prompt_text(messages)
+        key = ("sync", self._key(client, text, stop, kwargs))
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result().copy(deep=True)
+        try:
+            result = self._call(client, messages, text, stop, kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def agenerate(self, client: BaseChatModel, messages: List[BaseMessage],
+                        stop: Optional[List[str]] = None, **kwargs) -> ChatResult:
+        text = _prompt_text(messages)
+        # tasks belong to one event loop, so only callers on the same loop share them
+        key = (asyncio.get_running_loop(), self._key(client, text, stop, kwargs))
+        with self._lock:
+            task = self._inflight.get(key)
+            leader = task is None
+            if leader:
+                task = self._inflight[key] = asyncio.ensure_future(self._acall(client, messages, text, stop, kwargs))
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.coalesced += 1
+        # shielded: a cancelled caller does not cancel the call others are waiting on
+        result = await asyncio.shield(task)
+        return result if leader else result.copy(deep=True)
+
+    def stream(self, client: BaseChatModel, messages: List[BaseMessage],
+               stop: Optional[List[str]] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        """Streams are not shared; a failed stream is retried only until its first chunk."""
+        text = _prompt_text(messages)
+        tokens = count_tokens(text)
+        attempt = 0
+        while True:
+            time.sleep(self._reserve(tokens))
+            emitted = []
+            try:
+                with self._lock:
+                    self.calls += 1
+                started = time.perf_counter()
+                for chunk in client.stream(messages, stop=stop, **kwargs):
+                    emitted.append(str(chunk.content))
+                    yield ChatGenerationChunk(message=chunk)
+                self._settle(tokens, "".join(emitted), started)
+                return
+            except Exception as e:
+                if emitted:
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    async def astream(self, client: BaseChatModel, messages: List[BaseMessage],
+                      stop: Optional[List[str]] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        text = _prompt_text(messages)
+        tokens = count_tokens(text)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(tokens))
+            emitted = []
+            try:
+                with self._lock:
+                    self.calls += 1
+                started = time.perf_counter()
+                async for chunk in client.astream(messages, stop=stop, **kwargs):
+                    emitted.append(str(chunk.content))
+                    yield ChatGenerationChunk(message=chunk)
+                self._settle(tokens, "".join(emitted), started)
+                return
+            except Exception as e:
+                if emitted:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": LLM_BACKEND,
+                "clients": len(self._clients),
+                "in_flight": len(self._inflight),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "throttle_seconds": round(self.throttle_seconds, 3),
+                "requests_per_minute": self.request_bucket.capacity,
+                "tokens_per_minute": self.token_bucket.capacity,
+            }
+
+
+# Shared by every chain in the process
+llm_gateway = LLMGateway()
+
+
+class GatewayChatModel(BaseChatModel):
+    """LangChain chat model that sends every call through the process-wide LLM gateway."""
+
+    backend: str = LLM_BACKEND
+    model: str
+    temperature: float = 0.0
+    max_output_tokens: Optional[int] = None
+    api_key: Optional[str] = Field(default=None, repr=False)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gateway-{self.backend}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "model": self.model, "temperature": self.temperature}
+
+    def _client(self) -> BaseChatModel:
+        return llm_gateway.client(self.backend, self.model, self.temperature, self.max_output_tokens, self.api_key)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return llm_gateway.generate(self._client(), messages, stop, **kwargs)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return await llm_gateway.agenerate(self._client(), messages, stop, **kwargs)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for chunk in llm_gateway.stream(self._client(), messages, stop, **kwargs):
+            if run_manager:
+                run_manager.on_llm_new_token(str(chunk.message.content), chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in llm_gateway.astream(self._client(), messages, stop, **kwargs):
+            if run_manager:
+                await run_manager.on_llm_new_token(str(chunk.message.content), chunk=chunk)
+            yield chunk
+
+
+_models: Dict[tuple, GatewayChatModel] = {}
+
+
+def get_chat_model(model: str, api_key: Optional[str] = None, temperature: float = 0.0,
+                   max_output_tokens: Optional[int] = None, backend: str = None) -> GatewayChatModel:
+    """Shared chat model for this configuration, on LLM_BACKEND unless `backend` is given."""
+    key = (backend or LLM_BACKEND, model, temperature, max_output_tokens, api_key)
+    chat_model = _models.get(key)
+    if chat_model is None:
+        chat_model = _models[key] = GatewayChatModel(backend=key[0], model=model, temperature=temperature,
+                                                     max_output_tokens=max_output_tokens, api_key=api_key)
+    return chat_model
@@ -0,0 +1,41 @@
+# modules/migrate_indexes.py
+"""
+One-off conversion of indexes saved in the old pickle format (index.faiss + index.pkl)
+to the columnar format. The API refuses to load pickled indexes, since unpickling can
+run arbitrary code; run this once, on indexes this service wrote, after upgrading.
+
+    python -m modules.migrate_indexes                 # every index under vectorstore/faiss_index
+    python -m modules.migrate_indexes <index dir> ...
+"""
+import sys
+import logging
+from pathlib import Path
+from typing import List
+
+from modules.embedding_store import INDEX_DIR, convert_pickled_index, is_pickled_index
+
+logger = logging.getLogger(__name__)
+
+
+def find_pickled(root: Path) -> List[Path]:
+    candidates = [root] + sorted(p for p in root.rglob("*") if p.is_dir()) if root.is_dir() else []
+    return [p for p in candidates if is_pickled_index(str(p))]
+
+
+def main(paths: List[str]) -> int:
+    roots = [Path(p) for p in paths] or [INDEX_DIR]
+    failed = 0
+    for root in roots:
+        for path in find_pickled(root):
+            try:
+                convert_pickled_index(str(path))
+                logger.info(f"Converted {path}")
+            except Exception as e:
+                failed += 1
+                logger.error(f"Could not convert {path}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(main(sys.argv[1:]))
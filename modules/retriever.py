@@ -1,13 +1,15 @@
 # modules/retriever.py
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.schema import Document
 
-from modules.embedding_store import load_faiss, INDEX_DIR
+from modules.embedding_store import load_faiss, store_lock, INDEX_DIR
+from modules.async_exec import run_llm, run_blocking, stream_llm
+from modules.llm_gateway import get_chat_model, LLM_BACKEND
+from modules.context_packing import pack_context, CONTEXT_FETCH_K
+from modules.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from modules.index_cache import index_cache
+from modules.metrics import stage
 
 load_dotenv()
 
@@ -15,6 +17,11 @@ load_dotenv()
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash") 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# MMR selection, neighbour merging and token budgeting between retrieval and the prompt
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+
+NOT_FOUND_ANSWER = "Sorry it is not present in knowledge base, use google to get answer of general query"
+
 # Template: feed system prompt + context
 PROMPT = """You are a helpful assistant. Use ONLY the provided context to answer the question.
 If the answer is not contained in the context, reply exactly: Sorry it is not present in knowledge base, use google to get answer of general query.
@@ -30,33 +37,66 @@ Answer:"""
 prompt = ChatPromptTemplate.from_template(PROMPT)
 
 def get_llm():
-    """Create a Google Gemini LLM wrapper."""
-    if not GOOGLE_API_KEY:
+    """The shared Gemini chat model, behind the LLM gateway."""
+    if LLM_BACKEND == "gemini" and not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY not set in environment.")
-    
-    llm = ChatGoogleGenerativeAI(
-        model=LLM_MODEL,
-        temperature=0.0,
-        google_api_key=GOOGLE_API_KEY
-    )
-    return llm
-
-def answer_query(query: str, top_k: int = 4, index_path: str = str(INDEX_DIR / "faiss_index")) -> str:
+    return get_chat_model(LLM_MODEL, GOOGLE_API_KEY, temperature=0.0)
+
+def _retrieve(query: str, top_k: int, index_path: str, db=None, filter=None):
     """
-    Returns generated answer or the "Sorry..." message if retrieved context is insufficient.
+    Returns the retrieved documents, the context built from them and the query embedding.
+    `filter` is an optional predicate on chunk metadata.
     """
-    db = load_faiss(index_path=index_path)
-    retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": top_k})
+    if db is None:
+        db = load_faiss(index_path=index_path)
+    # documents may be appended to the store in place; faiss cannot search during an add
+    with stage("retrieve"), store_lock(db).read():
+        if CONTEXT_PACKING:
+            return pack_context(db, query, top_k=top_k, filter=filter)
+        query_vec = db._embed_query(query)
+        if db.index.ntotal == 0:
+            return [], "", query_vec
+        results = db.similarity_search_by_vector(query_vec, k=top_k, filter=filter, fetch_k=CONTEXT_FETCH_K)
+        return results, _build_context(results), query_vec
 
-    # retrieve docs
-    results = retriever.get_relevant_documents(query)
-    
+def _cached_answer(cache_key, query_vec, results):
+    """Answer from the semantic answer cache of index `cache_key`, if any."""
+    if not (ANSWER_CACHE_ENABLED and cache_key):
+        return None
+    return answer_cache.lookup(cache_key, index_cache.version(cache_key), query_vec, results)
+
+def _cache_answer(cache_key, query_vec, results, answer: str):
+    if ANSWER_CACHE_ENABLED and cache_key:
+        answer_cache.store(cache_key, index_cache.version(cache_key), query_vec, results, answer)
+
+def _has_enough_context(results) -> bool:
     # simple heuristic: if no results or all results are very short, then fallback
-    if not results or len(" ".join([d.page_content for d in results]).strip()) < 50:
-        return "Sorry it is not present in knowledge base, use google to get answer of general query"
+    return bool(results) and len(" ".join([d.page_content for d in results]).strip()) >= 50
 
+def _build_context(results) -> str:
     # combine top docs into context
-    context = "\n\n---\n\n".join([d.page_content for d in results])
+    return "\n\n---\n\n".join([d.page_content for d in results])
+
+def _clean_answer(resp: str) -> str:
+    # If model hallucinates and returns something like "I don't know" - but we strictly want the exact phrase
+    if "sorry" in resp.lower() and "knowledge base" in resp.lower():
+        return NOT_FOUND_ANSWER
+    return resp
+
+def answer_query(query: str, top_k: int = 4, index_path: str = str(INDEX_DIR / "faiss_index"), db=None,
+                 cache_key: str = None, filter=None) -> str:
+    """
+    Returns generated answer or the "Sorry..." message if retrieved context is insufficient.
+    Pass an already-loaded `db` to skip reading the index from `index_path`, and the index's
+    `cache_key` to reuse answers to near-identical earlier questions. `filter` restricts
+    retrieval by chunk metadata (e.g. to some sources of a corpus).
+    """
+    results, context, query_vec = _retrieve(query, top_k, index_path, db, filter)
+    if not _has_enough_context(results):
+        return NOT_FOUND_ANSWER
+    cached = _cached_answer(cache_key, query_vec, results)
+    if cached is not None:
+        return cached
 
     # call LLM via LangChain wrapper
     llm = get_llm()
@@ -64,10 +104,62 @@ def answer_query(query: str, top_k: int = 4, index_path: str = str(INDEX_DIR / "
     # Using a more robust chain with RunnablePassthrough for better context handling
     rag_chain = prompt | llm
     
-    resp = rag_chain.invoke({"context": context, "question": query}).content
-    
-    # If model hallucinates and returns something like "I don't know" - but we strictly want the exact phrase
-    if "sorry" in resp.lower() and "knowledge base" in resp.lower():
-        return "Sorry it is not present in knowledge base, use google to get answer of general query"
+    resp = _clean_answer(rag_chain.invoke({"context": context, "question": query}).content)
+    _cache_answer(cache_key, query_vec, results, resp)
+    return resp
+
+async def aanswer_query(query: str, top_k: int = 4, index_path: str = str(INDEX_DIR / "faiss_index"), db=None,
+                        cache_key: str = None, filter=None) -> str:
+    """
+    Async variant of answer_query: retrieval runs in the worker pool and the LLM call
+    uses native async invocation behind the shared LLM limiter.
+    """
+    results, context, query_vec = await run_blocking(_retrieve, query, top_k, index_path, db, filter)
+    if not _has_enough_context(results):
+        return NOT_FOUND_ANSWER
+    cached = _cached_answer(cache_key, query_vec, results)
+    if cached is not None:
+        return cached
+
+    rag_chain = prompt | get_llm()
+    resp = await run_llm(rag_chain, {"context": context, "question": query})
+    answer = _clean_answer(resp.content)
+    _cache_answer(cache_key, query_vec, results, answer)
+    return answer
+
+
+def _source_metadata(results):
+    return [dict(d.metadata) for d in results]
+
+async def astream_answer_query(query: str, top_k: int = 4, index_path: str = str(INDEX_DIR / "faiss_index"), db=None,
+                               cache_key: str = None, filter=None):
+    """
+    Streaming variant of answer_query. Yields event dicts:
+    {"type": "sources", ...} first, then {"type": "token", "text": ...} as the LLM produces
+    them, and finally {"type": "done", "answer": ...} with the complete answer.
+    """
+    results, context, query_vec = await run_blocking(_retrieve, query, top_k, index_path, db, filter)
+    yield {"type": "sources", "sources": _source_metadata(results)}
+
+    if not _has_enough_context(results):
+        # no LLM call needed for the fallback
+        yield {"type": "token", "text": NOT_FOUND_ANSWER}
+        yield {"type": "done", "answer": NOT_FOUND_ANSWER}
+        return
+
+    cached = _cached_answer(cache_key, query_vec, results)
+    if cached is not None:
+        yield {"type": "token", "text": cached}
+        yield {"type": "done", "answer": cached, "cached": True}
+        return
+
+    rag_chain = prompt | get_llm()
+    parts = []
+    async for chunk in stream_llm(rag_chain, {"context": context, "question": query}):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield {"type": "token", "text": chunk.content}
 
-    return resp
\ No newline at end of file
+    answer = _clean_answer("".join(parts))
+    _cache_answer(cache_key, query_vec, results, answer)
+    yield {"type": "done", "answer": answer}
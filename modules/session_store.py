@@ -0,0 +1,306 @@
+# modules/session_store.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from modules.chatbot import init_chat
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")  # "memory" or "sqlite"
+SESSION_STORE_PATH = Path(os.getenv("SESSION_STORE_PATH", "vectorstore/sessions.sqlite"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+# memory held by cached sessions; with the sqlite backend evicted sessions are reloaded on demand
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# rough per-object cost of a session and a message beyond their text
+_SESSION_OVERHEAD = 512
+_MESSAGE_OVERHEAD = 200
+
+
+def _message_bytes(message: dict) -> int:
+    return len(message["text"]) + _MESSAGE_OVERHEAD
+
+
+class SQLiteSessions:
+    """Sessions and their messages on local disk, shared by every worker process on the host."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, index_key TEXT, created_at REAL,"
+            " last_used REAL, messages INTEGER)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages (session_id TEXT, seq INTEGER, role TEXT, text TEXT,"
+            " PRIMARY KEY (session_id, seq))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, session_id: str, index_key: str, now: float):
+        self._conn().execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, 0)",
+                             (session_id, index_key, now, now))
+
+    def header(self, session_id: str) -> Optional[tuple]:
+        """(index_key, created_at, last_used, message count) of a session, or None."""
+        return self._conn().execute(
+            "SELECT index_key, created_at, last_used, messages FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+
+    def messages(self, session_id: str, start: int = 0) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT role, text FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq", (session_id, start)
+        ).fetchall()
+        return [{"role": role, "text": text} for role, text in rows]
+
+    def append(self, session_id: str, role: str, text: str, now: float) -> int:
+        """Append a message after whatever other workers appended. Returns its sequence number."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT messages FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+            seq = row[0]
+            conn.execute("INSERT INTO messages VALUES (?, ?, ?, ?)", (session_id, seq, role, text))
+            conn.execute("UPDATE sessions SET messages = ?, last_used = ? WHERE id = ?", (seq + 1, now, session_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+    def purge(self, before: float) -> List[Tuple[str, str]]:
+        """Delete sessions unused since `before`. Returns the (id, index_key) of each one deleted."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute("SELECT id, index_key FROM sessions WHERE last_used < ?", (before,)).fetchall()
+            conn.execute("DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE last_used < ?)", (before,))
+            conn.execute("DELETE FROM sessions WHERE last_used < ?", (before,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    """
+    Conversation state: the index a conversation searches and its chat history.
+
+    Sessions expire `ttl` seconds after their last use and are kept in an LRU bounded by
+    `max_sessions` and by `max_bytes` of estimated memory; each session records its own
+    size. With SQLite persistence every message is written through, the in-memory LRU is
+    only a cache, and any worker process can resume a conversation another one started:
+    a cached session is checked against the stored message count and its tail reloaded.
+
+    Listeners registered with `on_end` are told when a session is gone for good: when it
+    expires, or, without persistence, when it is evicted, so its index can be deleted.
+    """
+
+    def __init__(self, persistence: Optional[SQLiteSessions] = None, ttl: int = SESSION_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES):
+        self.persistence = persistence
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._listeners: List[Callable[[str, str], None]] = []
+        # (session_id, index_key) of ended sessions, reported to listeners outside the lock
+        self._ended: List[Tuple[str, str]] = []
+        self.evictions = 0
+        self.expirations = 0
+
+    def _insert(self, session_id: str, session: dict):
+        """Cache a session and evict expired, then least recently used, ones. Caller holds the lock."""
+        old = self._sessions.pop(session_id, None)
+        if old is not None:
+            self._bytes -= old["bytes"]
+        self._sessions[session_id] = session
+        self._bytes += session["bytes"]
+
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest["last_used"] >= cutoff:
+                break
+            self._drop(oldest_id, ended=True)
+            self.expirations += 1
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)), ended=True)
+            self.evictions += 1
+
+    def _drop(self, session_id: str, ended: bool = False):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session["bytes"]
+        if ended and self.persistence is None:
+            # the cache is the only copy; persisted sessions end when purge deletes them
+            self._ended.append((session_id, session["index_key"]))
+
+    def _purge_persisted(self, now: float):
+        # at most once a minute; expired rows are also ignored on read
+        if self.persistence is not None and now - self._last_purge > 60:
+            self._last_purge = now
+            ended = self.persistence.purge(now - self.ttl)
+            with self._lock:
+                self.expirations += len(ended)
+                self._ended.extend(ended)
+
+    def on_end(self, listener: Callable[[str, str], None]):
+        """Call `listener(session_id, index_key)` whenever a session ends."""
+        self._listeners.append(listener)
+
+    def _notify(self):
+        with self._lock:
+            ended, self._ended = self._ended, []
+        for session_id, index_key in ended:
+            for listener in self._listeners:
+                try:
+                    listener(session_id, index_key)
+                except Exception as e:
+                    logger.error(f"Session end listener failed for {session_id}: {e}", exc_info=True)
+
+    def create(self, session_id: str, index_key: str) -> dict:
+        now = time.time()
+        if self.persistence is not None:
+            self._purge_persisted(now)
+            self.persistence.create(session_id, index_key, now)
+        session = {"index_key": index_key, "chat_history": init_chat(), "created_at": now,
+                   "last_used": now, "bytes": _SESSION_OVERHEAD}
+        with self._lock:
+            self._insert(session_id, session)
+        self._notify()
+        return session
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """The session, or None when it never existed or has expired."""
+        try:
+            return self._get(session_id)
+        finally:
+            self._notify()
+
+    def _get(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and session["last_used"] < now - self.ttl:
+                self._drop(session_id, ended=True)
+                self.expirations += 1
+                session = None
+
+        if self.persistence is not None:
+            header = self.persistence.header(session_id)
+            if header is None or header[2] < now - self.ttl:
+                with self._lock:
+                    if session_id in self._sessions:
+                        self._drop(session_id)
+                return None
+            index_key, created_at, _, count = header
+            if session is None:
+                session = {"index_key": index_key, "chat_history": [], "created_at": created_at, "bytes": _SESSION_OVERHEAD}
+            if len(session["chat_history"]) != count:
+                # other workers appended to this conversation; fetch what this one has not seen
+                known = min(len(session["chat_history"]), count)
+                tail = self.persistence.messages(session_id, known)
+                session = {**session, "chat_history": session["chat_history"][:known] + tail}
+                session["bytes"] = _SESSION_OVERHEAD + sum(_message_bytes(m) for m in session["chat_history"])
+        elif session is None:
+            return None
+
+        with self._lock:
+            session["last_used"] = now
+            self._insert(session_id, session)
+        return session
+
+    def add_message(self, session_id: str, role: str, text: str) -> int:
+        """Append a {"role", "text"} message. Returns the conversation's message count."""
+        try:
+            return self._add_message(session_id, role, text)
+        finally:
+            self._notify()
+
+    def _add_message(self, session_id: str, role: str, text: str) -> int:
+        session = self._get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        message = {"role": role, "text": text}
+        now = time.time()
+        if self.persistence is not None:
+            seq = self.persistence.append(session_id, role, text, now)
+            if seq != len(session["chat_history"]):
+                # a concurrent append landed in between; the next get() reloads the tail
+                with self._lock:
+                    if session_id in self._sessions:
+                        self._drop(session_id)
+                return seq + 1
+        with self._lock:
+            if self._sessions.get(session_id) is session:
+                self._drop(session_id)
+            session["chat_history"].append(message)
+            session["bytes"] += _message_bytes(message)
+            session["last_used"] = now
+            self._insert(session_id, session)
+            return len(session["chat_history"])
+
+    def history(self, session_id: str, offset: Optional[int] = None, limit: int = 50) -> Tuple[List[dict], int]:
+        """
+        A page of `limit` messages from `offset`, or the latest `limit` messages when
+        `offset` is None, with the total number of messages.
+        """
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        messages = session["chat_history"]
+        total = len(messages)
+        start = max(0, total - limit) if offset is None else max(0, offset)
+        return [dict(m) for m in messages[start:start + limit]], total
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "backend": "sqlite" if self.persistence is not None else "memory",
+                "cached_sessions": len(self._sessions),
+                "cached_bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+        if self.persistence is not None:
+            stats["persisted_sessions"] = len(self.persistence)
+        return stats
+
+
+def _make_store() -> SessionStore:
+    if SESSION_STORE_BACKEND == "sqlite":
+        return SessionStore(SQLiteSessions(SESSION_STORE_PATH))
+    return SessionStore()
+
+
+# Shared by every endpoint in the process
+sessions = _make_store()
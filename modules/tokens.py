@@ -0,0 +1,71 @@
+# modules/tokens.py
+import os
+import logging
+import threading
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+
+# used when the tiktoken encoding files cannot be loaded (e.g. offline hosts)
+_CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_failed = False
+_lock = threading.Lock()
+
+
+def get_encoding():
+    """The shared tiktoken encoding, or None when it is unavailable."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding {TOKEN_ENCODING} unavailable, estimating tokens from length: {e}")
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _slice_by_tokens(text: str, max_tokens: int) -> List[str]:
+    encoding = get_encoding()
+    if encoding is None:
+        step = max_tokens * _CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into sections of at most `max_tokens` tokens, breaking at paragraph
+    boundaries where possible and only slicing paragraphs that are too long on their own.
+    """
+    sections, current, current_tokens = [], [], 0
+    for para in text.split("\n\n"):
+        para_tokens = count_tokens(para)
+        if para_tokens > max_tokens:
+            pieces = _slice_by_tokens(para, max_tokens)
+        else:
+            pieces = [para]
+        for piece in pieces:
+            piece_tokens = para_tokens if len(pieces) == 1 else count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                sections.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
@@ -0,0 +1,161 @@
+# modules/uploads.py
+import io
+import os
+import uuid
+import hashlib
+import zipfile
+from pathlib import Path
+from contextlib import aclosing
+from typing import List, Optional, Union
+
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import Request
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# uploads up to this size stay in memory; larger ones spill to a uniquely named temp file
+UPLOAD_MEMORY_BYTES = int(os.getenv("UPLOAD_MEMORY_BYTES", str(16 * 1024 * 1024)))
+UPLOAD_TEMP_DIR = Path(os.getenv("UPLOAD_TEMP_DIR", "temp"))
+# limits for zip archives: documents inside, and their total uncompressed size
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "100"))
+ZIP_MAX_EXPANDED_BYTES = int(os.getenv("ZIP_MAX_EXPANDED_BYTES", str(4 * UPLOAD_MAX_BYTES)))
+
+_READ_BLOCK = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds UPLOAD_MAX_BYTES."""
+
+
+class _SpoolingMultiPartParser(MultiPartParser):
+    # Starlette spools multipart files to disk past 1 MB; keep them in memory up to the
+    # threshold at which read_upload would spill them anyway
+    spool_max_size = UPLOAD_MEMORY_BYTES
+
+
+class UploadRequest(Request):
+    """A request whose multipart files stay in memory up to UPLOAD_MEMORY_BYTES."""
+
+    async def _get_form(self, *, max_files: Union[int, float] = 1000, max_fields: Union[int, float] = 1000,
+                        max_part_size: int = 1024 * 1024) -> FormData:
+        if self._form is None and self.headers.get("content-type", "").startswith("multipart/form-data"):
+            try:
+                async with aclosing(self.stream()) as stream:
+                    parser = _SpoolingMultiPartParser(self.headers, stream, max_files=max_files,
+                                                      max_fields=max_fields, max_part_size=max_part_size)
+                    self._form = await parser.parse()
+            except MultiPartException as exc:
+                raise HTTPException(status_code=400, detail=exc.message)
+        return await super()._get_form(max_files=max_files, max_fields=max_fields, max_part_size=max_part_size)
+
+
+class UploadRoute(APIRoute):
+    """Route class that hands its endpoint an UploadRequest; set on one app's router, not globally."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return route_handler
+
+
+class BufferedUpload:
+    """
+    An upload read once into memory, or into a temp file when it is large, with its size and
+    sha256. `content` is what the extraction functions take: the bytes, or the spill path.
+    """
+
+    def __init__(self, filename: str, data: Optional[bytes], path: Optional[str], size: int, sha256: str):
+        self.filename = filename
+        self.data = data
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def content(self) -> Union[bytes, str]:
+        return self.data if self.path is None else self.path
+
+    def close(self):
+        """Drop the buffer and delete the spill file, if any."""
+        self.data = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def read_upload(file, max_bytes: int = UPLOAD_MAX_BYTES, memory_bytes: int = UPLOAD_MEMORY_BYTES) -> BufferedUpload:
+    """
+    Stream a FastAPI UploadFile into memory, hashing it on the way and rejecting it with
+    UploadTooLargeError once it passes `max_bytes`. Past `memory_bytes` the content moves
+    to a temp file named after a fresh UUID, so concurrent uploads never collide.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"Upload is {file.size} bytes; the limit is {max_bytes}.")
+
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spill, path, size = None, None, 0
+    try:
+        while True:
+            block = await file.read(_READ_BLOCK)
+            if not block:
+                break
+            size += len(block)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes.")
+            digest.update(block)
+            if spill is None:
+                buffer += block
+                if len(buffer) > memory_bytes:
+                    UPLOAD_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+                    path = str(UPLOAD_TEMP_DIR / f"{uuid.uuid4()}{Path(file.filename or '').suffix}")
+                    spill = open(path, "wb")
+                    spill.write(buffer)
+                    buffer = bytearray()
+            else:
+                spill.write(block)
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.remove(path)
+        raise
+    if spill is not None:
+        spill.close()
+
+    return BufferedUpload(file.filename, None if path else bytes(buffer), path, size, digest.hexdigest())
+
+
+def is_zip(upload: BufferedUpload) -> bool:
+    return Path(upload.filename or "").suffix.lower() == ".zip"
+
+
+def expand_zip(upload: BufferedUpload, extensions, max_members: int = ZIP_MAX_MEMBERS,
+               max_bytes: int = ZIP_MAX_EXPANDED_BYTES) -> List[BufferedUpload]:
+    """
+    The documents with one of `extensions` inside a zip upload, each as an in-memory upload.
+    Sizes are checked against the archive directory before anything is decompressed.
+    """
+    source = upload.content if upload.path is not None else io.BytesIO(upload.content)
+    with zipfile.ZipFile(source) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                   and Path(info.filename).suffix.lower() in extensions]
+        if len(members) > max_members:
+            raise UploadTooLargeError(f"Archive holds {len(members)} documents; the limit is {max_members}.")
+        if sum(info.file_size for info in members) > max_bytes:
+            raise UploadTooLargeError(f"Archive expands beyond the limit of {max_bytes} bytes.")
+
+        documents = []
+        for info in members:
+            # the directory sizes can lie; never read more than was declared
+            with archive.open(info) as member:
+                data = member.read(info.file_size + 1)
+            if len(data) > info.file_size:
+                raise UploadTooLargeError(f"{info.filename} is larger than its archive entry declares.")
+            documents.append(BufferedUpload(Path(info.filename).name, data, None, len(data),
+                                            hashlib.sha256(data).hexdigest()))
+    return documents
@@ -0,0 +1,261 @@
+# modules/vector_index.py
+import os
+import json
+import math
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")            # "flat", "ivf" or "hnsw"
+INDEX_STORAGE = os.getenv("INDEX_STORAGE", "float32")   # "float32", "float16" or "pq"
+INDEX_IVF_NLIST = int(os.getenv("INDEX_IVF_NLIST", "0"))  # 0: about 4 * sqrt(vectors)
+INDEX_IVF_NPROBE = int(os.getenv("INDEX_IVF_NPROBE", "8"))
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_HNSW_EF_SEARCH = int(os.getenv("INDEX_HNSW_EF_SEARCH", "64"))
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "0"))          # 0: one byte per 8 dimensions
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "texts.offsets.npy"
+
+# k-means wants this many training points per centroid; PQ codebooks have 256 centroids
+_POINTS_PER_CENTROID = 39
+_PQ_MIN_TRAIN = _POINTS_PER_CENTROID * 256
+_MIN_NLIST = 4
+
+
+def _pq_m(d: int) -> int:
+    """Largest number of PQ sub-quantizers that divides `d` and keeps at least 8 dimensions each."""
+    if INDEX_PQ_M:
+        return INDEX_PQ_M
+    for m in range(max(1, d // 8), 0, -1):
+        if d % m == 0:
+            return m
+    return 1
+
+
+def plan_index(d: int, n: int, index_type: str = None, storage: str = None) -> Tuple[str, str, str]:
+    """
+    The faiss factory string for `n` vectors of dimension `d`, with the index type and storage
+    actually used. Corpora too small to train the requested structure fall back to a flat
+    index (IVF) or float16 codes (PQ) until they grow.
+    """
+    index_type = index_type or INDEX_TYPE
+    storage = storage or INDEX_STORAGE
+    if storage == "pq" and n < _PQ_MIN_TRAIN:
+        storage = "float16"
+    nlist = 0
+    if index_type == "ivf":
+        nlist = min(INDEX_IVF_NLIST or int(4 * math.sqrt(n)), n // _POINTS_PER_CENTROID)
+        if nlist < _MIN_NLIST:
+            index_type = "flat"
+
+    codes = {"float32": "Flat", "float16": "SQfp16", "pq": f"PQ{_pq_m(d)}"}[storage]
+    if index_type == "ivf":
+        factory = f"IVF{nlist},{codes}"
+    elif index_type == "hnsw":
+        factory = f"HNSW{INDEX_HNSW_M}" + ("" if storage == "float32" else f",{codes}")
+    else:
+        factory = codes
+    return factory, index_type, storage
+
+
+def index_kind(index) -> Tuple[str, str]:
+    """(index type, vector storage) of an existing faiss index."""
+    index = faiss.downcast_index(index)
+    if hasattr(index, "hnsw"):
+        kind, codes = "hnsw", faiss.downcast_index(index.storage)
+    elif isinstance(index, faiss.IndexIVF):
+        kind, codes = "ivf", index
+    else:
+        kind, codes = "flat", index
+    if isinstance(codes, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return kind, "pq"
+    if isinstance(codes, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return kind, "float16"
+    return kind, "float32"
+
+
+def tune_index(index):
+    """Apply the query-time search parameters, which are not fixed at build time."""
+    kind, _ = index_kind(index)
+    if kind == "ivf":
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", INDEX_IVF_NPROBE)
+    elif kind == "hnsw":
+        faiss.ParameterSpace().set_index_parameter(index, "efSearch", INDEX_HNSW_EF_SEARCH)
+    return index
+
+
+def build_index(vectors: np.ndarray, index_type: str = None, storage: str = None):
+    """Train and fill a faiss index over `vectors` as configured by INDEX_TYPE / INDEX_STORAGE."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    factory, used_type, used_storage = plan_index(d, n, index_type, storage)
+    index = faiss.index_factory(d, factory, faiss.METRIC_L2)
+    codes = faiss.downcast_index(index)
+    if hasattr(codes, "hnsw"):
+        codes = faiss.downcast_index(codes.storage)
+    if hasattr(codes, "do_polysemous_training"):
+        # polysemous codes are never searched, and training them dominates PQ build time
+        codes.do_polysemous_training = False
+    if not index.is_trained:
+        index.train(vectors)
+    if used_type == "ivf":
+        # keep reconstruct() available for context packing and compaction
+        faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+    add_vectors(index, vectors)
+    if (used_type, used_storage) != (index_type or INDEX_TYPE, storage or INDEX_STORAGE):
+        logger.info(f"Index of {n} vectors built as {factory}; too few vectors to train the configured index")
+    return tune_index(index)
+
+
+def add_vectors(index, vectors: np.ndarray):
+    """
+    Append vectors at positions ntotal, ntotal + 1, ... An IVF direct map only records
+    explicit ids, so IVF indexes are given their positions as ids.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if index_kind(index)[0] == "ivf":
+        index.add_with_ids(vectors, np.arange(index.ntotal, index.ntotal + len(vectors), dtype=np.int64))
+    else:
+        index.add(vectors)
+
+
+def appends_in_place(index) -> bool:
+    """False for IVF lists memory-mapped from disk, which are read-only (faiss aborts on add)."""
+    if index_kind(index)[0] != "ivf":
+        return True
+    invlists = faiss.downcast_InvertedLists(faiss.extract_index_ivf(index).invlists)
+    return not (isinstance(invlists, faiss.OnDiskInvertedLists) and invlists.read_only)
+
+
+def removes_in_place(index) -> bool:
+    """
+    Whether remove_ids() renumbers the remaining vectors to stay contiguous, as the
+    docstore mapping assumes. IVF ids are labels that removal leaves as they were, and
+    HNSW graphs cannot remove vectors at all; both are rebuilt instead.
+    """
+    return index_kind(index)[0] == "flat"
+
+
+def bytes_per_vector(index) -> int:
+    """Approximate memory per stored vector: its code plus, for HNSW, the graph links."""
+    index = faiss.downcast_index(index)
+    try:
+        if hasattr(index, "hnsw"):
+            return faiss.downcast_index(index.storage).sa_code_size() + 2 * index.hnsw.nb_neighbors(0) * 4
+        return index.sa_code_size()
+    except RuntimeError:
+        return index.d * 4
+
+
+class ColumnarDocstore(Docstore, AddableMixin):
+    """
+    Docstore over the columnar on-disk format: chunk text in one memory-mapped UTF-8 blob
+    with an offsets array, metadata as one JSON list per key. Documents are only built when
+    searched. Added documents are kept in memory beside the mapped ones until the store is
+    saved again; stores that remove documents are copied into an InMemoryDocstore.
+    """
+
+    def __init__(self, ids: List[str], metadata: Dict[str, list], texts: np.ndarray, offsets: np.ndarray):
+        self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._metadata = metadata
+        self._texts = texts
+        self._offsets = offsets
+        self._added: Dict[str, Document] = {}
+        self._added_bytes = 0
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [doc_id for doc_id in texts if doc_id in self._rows or doc_id in self._added]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+        self._added_bytes += sum(len(doc.page_content.encode("utf-8")) for doc in texts.values())
+
+    def search(self, search: str):
+        row = self._rows.get(search)
+        if row is None:
+            return self._added.get(search, f"ID {search} not found.")
+        text = bytes(self._texts[self._offsets[row]:self._offsets[row + 1]]).decode("utf-8")
+        metadata = {key: values[row] for key, values in self._metadata.items() if values[row] is not None}
+        return Document(page_content=text, metadata=metadata)
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("ColumnarDocstore cannot remove documents; copy the store first.")
+
+    @property
+    def text_bytes(self) -> int:
+        return int(self._offsets[-1]) + self._added_bytes
+
+    def __len__(self):
+        return len(self._rows) + len(self._added)
+
+
+def write_store(path: Path, index, ids: List[str], docs: List[Document], extra: Optional[dict] = None):
+    """Write the faiss index and its docstore (in `ids` order, i.e. index position order)."""
+    path.mkdir(parents=True, exist_ok=True)
+    keys = []
+    for doc in docs:
+        keys.extend(k for k in doc.metadata if k not in keys)
+    metadata = {key: [doc.metadata.get(key) for doc in docs] for key in keys}
+
+    encoded = [doc.page_content.encode("utf-8") for doc in docs]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    with open(path / (TEXTS_FILE + ".tmp"), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    with open(path / (OFFSETS_FILE + ".tmp"), "wb") as f:
+        np.save(f, offsets)
+    (path / (DOCSTORE_FILE + ".tmp")).write_text(
+        json.dumps({"format": 1, "ids": ids, "metadata": metadata, **(extra or {})}, default=str))
+    faiss.write_index(index, str(path / (INDEX_FILE + ".tmp")))
+
+    # new files replace the old names, so readers that mapped the old files keep them;
+    # the index goes last and a loader checks it against the docstore row count
+    for name in (TEXTS_FILE, OFFSETS_FILE, DOCSTORE_FILE, INDEX_FILE):
+        os.replace(path / (name + ".tmp"), path / name)
+
+
+def read_store(path: Path, mmap: bool = INDEX_MMAP):
+    """Open an index saved by write_store. Returns (index, ids, docstore, extra fields)."""
+    header = json.loads((path / DOCSTORE_FILE).read_text())
+    offsets = np.load(path / OFFSETS_FILE, mmap_mode="r" if mmap else None)
+    if offsets[-1] > 0:
+        texts = np.memmap(path / TEXTS_FILE, dtype=np.uint8, mode="r") if mmap else np.fromfile(path / TEXTS_FILE, dtype=np.uint8)
+    else:
+        texts = np.zeros(0, dtype=np.uint8)
+
+    index = None
+    if mmap:
+        try:
+            # inverted lists are mapped from disk; other index types are read normally
+            index = faiss.read_index(str(path / INDEX_FILE), faiss.IO_FLAG_MMAP)
+        except RuntimeError as e:
+            logger.info(f"Memory-mapped read of {path} failed, reading into memory: {e}")
+    if index is None:
+        index = faiss.read_index(str(path / INDEX_FILE))
+    ids = header.pop("ids")
+    if index.ntotal != len(ids):
+        raise RuntimeError(f"Index at {path} has {index.ntotal} vectors but {len(ids)} documents")
+    docstore = ColumnarDocstore(ids, header.pop("metadata"), texts, offsets)
+    return tune_index(index), ids, docstore, header
+
+
+def copy_index(index, path: Optional[Path] = None):
+    """In-memory copy of an index. Memory-mapped IVF lists cannot be cloned, so re-read them."""
+    try:
+        return faiss.clone_index(index)
+    except RuntimeError:
+        if path is None:
+            raise
+        return tune_index(faiss.read_index(str(path / INDEX_FILE)))
@@ -2,9 +2,13 @@
 import streamlit as st
 from pathlib import Path
 import os
+import hashlib
 from dotenv import load_dotenv
-from modules.chunking import file_to_chunks
-from modules.embedding_store import build_faiss_from_chunks, INDEX_DIR
+from modules.chunking import file_to_chunk_records
+from modules.embedding_store import (
+    build_faiss_from_chunks, embedding_model_stats, index_path_for, load_faiss, warm_up_embedding_model,
+)
+from modules.vector_index import INDEX_FILE
 from modules.retriever import answer_query
 from modules.chatbot import init_chat, add_user_message, add_bot_message
 
@@ -14,7 +18,23 @@ st.set_page_config(page_title="DocChat (RAG)", layout="wide")
 
 DATA_DIR = Path("data/uploaded_docs")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
-INDEX_PATH = str(INDEX_DIR / "faiss_index")
+
+# Streamlit reruns this script on every interaction; the model and loaded indexes outlive reruns
+@st.cache_resource
+def load_embedding_model():
+    return warm_up_embedding_model()
+
+@st.cache_resource(max_entries=4)
+def load_index(index_path: str):
+    load_embedding_model()
+    return load_faiss(index_path=index_path)
+
+def build_key(file_hash: str, chunk_size: int, chunk_overlap: int) -> str:
+    """Builds of the same file with the same chunking share an index."""
+    return f"streamlit-{file_hash[:16]}-{chunk_size}-{chunk_overlap}"
+
+def index_exists(index_path: str) -> bool:
+    return (Path(index_path) / INDEX_FILE).exists()
 
 st.title("📚 DocChat — Ask questions from your documents")
 
@@ -25,6 +45,10 @@ if "uploaded_file" not in st.session_state:
     st.session_state.uploaded_file = None
 if "index_ready" not in st.session_state:
     st.session_state.index_ready = False
+if "uploaded_hash" not in st.session_state:
+    st.session_state.uploaded_hash = None
+if "index_path" not in st.session_state:
+    st.session_state.index_path = None
 
 with st.sidebar:
     st.header("Upload & Build DB")
@@ -36,25 +60,46 @@ with st.sidebar:
     st.markdown("---")
     st.write("Embedding model:", os.getenv("EMBEDDING_MODEL"))
     st.write("LLM model:", os.getenv("LLM_MODEL"))
+    for stats in embedding_model_stats():
+        st.caption(f"Loaded {stats['model_name']} in {stats['load_seconds']}s ({stats['memory_bytes'] / 1e6:.0f} MB)")
 
 if uploaded is not None:
     save_path = DATA_DIR / uploaded.name
-    with open(save_path, "wb") as f:
-        f.write(uploaded.getbuffer())
+    file_hash = hashlib.sha256(uploaded.getbuffer()).hexdigest()
+    # the uploader hands back the same file on every rerun; only a new one is written
+    if file_hash != st.session_state.uploaded_hash or not save_path.exists():
+        with open(save_path, "wb") as f:
+            f.write(uploaded.getbuffer())
+        st.session_state.uploaded_hash = file_hash
+        st.session_state.uploaded_file = str(save_path)
     st.success(f"Saved to {save_path}")
-    st.session_state.uploaded_file = str(save_path)
 
 if build_btn:
     if not st.session_state.uploaded_file:
         st.error("Upload a file first.")
     else:
-        with st.spinner("Chunking and building embeddings..."):
-            chunks = file_to_chunks(st.session_state.uploaded_file, chunk_size, chunk_overlap)
-            # optional: add small metadata (filename)
-            metadatas = [{"source": Path(st.session_state.uploaded_file).name, "chunk_id": i} for i in range(len(chunks))]
-            db = build_faiss_from_chunks(chunks, metadatas=metadatas, index_path=INDEX_PATH)
+        index_path = index_path_for(build_key(st.session_state.uploaded_hash, chunk_size, chunk_overlap))
+        if index_exists(index_path):
+            # same file, same chunking: the saved index is still valid
+            st.session_state.index_path = index_path
+            st.session_state.index_ready = True
+            st.info(f"File and chunk settings unchanged; using the index at {index_path}")
+        else:
+            with st.spinner("Chunking..."):
+                load_embedding_model()
+                chunks, pages = file_to_chunk_records(st.session_state.uploaded_file, chunk_size, chunk_overlap)
+            # optional: add small metadata (filename, page)
+            metadatas = [{"source": Path(st.session_state.uploaded_file).name, "chunk_id": i, **page} for i, page in enumerate(pages)]
+            progress = st.progress(0.0, text=f"Embedding 0 / {len(chunks)} chunks")
+
+            def on_progress(done: int, total: int):
+                progress.progress(done / total if total else 1.0, text=f"Embedding {done} / {total} chunks")
+
+            build_faiss_from_chunks(chunks, metadatas=metadatas, index_path=index_path, on_progress=on_progress)
+            progress.empty()
+            st.session_state.index_path = index_path
             st.session_state.index_ready = True
-            st.success(f"Built vector DB with {len(chunks)} chunks. Index saved to {INDEX_PATH}")
+            st.success(f"Built vector DB with {len(chunks)} chunks. Index saved to {index_path}")
 
 st.markdown("---")
 
@@ -72,7 +117,8 @@ with col1:
             add_user_message(st.session_state.chat_history, query)
             print("Query sent to LLM")
             with st.spinner("Searching documents & generating answer..."):
-                answer = answer_query(query)
+                index_path = st.session_state.index_path
+                answer = answer_query(query, index_path=index_path, db=load_index(index_path))
             add_bot_message(st.session_state.chat_history, answer)
             st.experimental_rerun()
 
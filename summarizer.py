@@ -1,23 +1,45 @@
 # backend/summarizer.py
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import json
+import time
+import asyncio
+import logging
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.output_parsers.pydantic import PydanticOutputParser
-from models import LegalDocSummary, LastDateResponse
+from models import LegalDocSummary, DocumentAnalysis
 from datetime import date
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+from modules.async_exec import run_llm
+from modules.llm_gateway import get_chat_model, LLM_BACKEND
+from modules.tokens import count_tokens, split_by_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gemini-2.0-flash")
+
+# Documents above this many tokens are summarized section by section, then reduced
+SUMMARY_LONG_DOC_TOKENS = int(os.getenv("SUMMARY_LONG_DOC_TOKENS", "24000"))
+SUMMARY_SECTION_TOKENS = int(os.getenv("SUMMARY_SECTION_TOKENS", "8000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
 
 def get_model(api_key: str):
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        temperature=0.0,
-        max_output_tokens=8192,
-        google_api_key=api_key
+    # pooled, rate-limited and retried by the LLM gateway
+    return get_chat_model(SUMMARY_MODEL, api_key, temperature=0.0, max_output_tokens=8192)
+
+def _error_summary(e: Exception) -> LegalDocSummary:
+    return LegalDocSummary(
+        category="Error",
+        description="Could not generate a summary due to an error.",
+        important_timeline=[],
+        main_takeaway=[f"An error occurred: {str(e)}"],
+        risk_factors=[],
+        next_steps=[],
+        urgency_percentage=0,
+        urgency_level="Low"
     )
 
-def generate_document_summary(document_content: str, language: str, google_api_key: str) -> LegalDocSummary:
-    # ... (existing code for summarization) ...
+def _summary_chain(google_api_key: str):
     model = get_model(google_api_key)
     parser = PydanticOutputParser(pydantic_object=LegalDocSummary)
     prompt = ChatPromptTemplate.from_messages([
@@ -27,37 +49,206 @@ def generate_document_summary(document_content: str, language: str, google_api_k
          "{format_instructions}"
         )
     ]).partial(format_instructions=parser.get_format_instructions())
-    chain = prompt | model | parser
-    
+    return prompt | model | parser
+
+def _analysis_chain(google_api_key: str):
+    model = get_model(google_api_key)
+    parser = PydanticOutputParser(pydantic_object=DocumentAnalysis)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an expert legal assistant. Summarize the following legal document in a structured format "
+         "and extract the final deadline or last date for action mentioned in it, in YYYY-MM-DD format."),
+        ("human", "Summarize the following document in {language}. "
+         "The document content is: \n\n{document_content}\n\n"
+         "{format_instructions}"
+        )
+    ]).partial(format_instructions=parser.get_format_instructions())
+    return prompt | model | parser
+
+def model_id() -> str:
+    """Identifies the model that produced a result, for cache keys."""
+    return f"{LLM_BACKEND}:{SUMMARY_MODEL}"
+
+def generate_document_summary(document_content: str, language: str, google_api_key: str) -> LegalDocSummary:
+    """Synchronous summary; long documents take the map-reduce path with a thread pool for the map."""
     try:
-        summary = chain.invoke({
+        if count_tokens(document_content) > SUMMARY_LONG_DOC_TOKENS:
+            inputs = _section_inputs(document_content, language)
+            results = _section_chain(google_api_key).batch(
+                inputs, config={"max_concurrency": SUMMARY_MAP_CONCURRENCY}, return_exceptions=True)
+            partials = _collect_partials(results, {})
+            try:
+                return _reduce_chain(google_api_key).invoke(_reduce_input(partials, language))
+            except Exception:
+                return _merge_summaries(partials)
+
+        return _summary_chain(google_api_key).invoke({
             "language": language,
             "document_content": document_content
         })
-        return summary
     except Exception as e:
-        return LegalDocSummary(
-            category="Error",
-            description="Could not generate a summary due to an error.",
-            important_timeline=[],
-            main_takeaway=[f"An error occurred: {str(e)}"],
-            risk_factors=[],
-            next_steps=[],
-            urgency_percentage=0,
-            urgency_level="Low"
+        return _error_summary(e)
+
+async def agenerate_document_summary(document_content: str, language: str, google_api_key: str) -> LegalDocSummary:
+    """Async variant of generate_document_summary that does not block the event loop."""
+    summary, _ = await asummarize_with_timings(document_content, language, google_api_key)
+    return summary
+
+
+def _section_chain(google_api_key: str):
+    model = get_model(google_api_key)
+    parser = PydanticOutputParser(pydantic_object=LegalDocSummary)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an expert legal assistant. Summarize one section of a longer legal document in a structured format."),
+        ("human", "This is section {section} of {sections} of the document. Summarize it in {language}, "
+         "keeping every date, deadline, risk and required action it mentions. "
+         "The section content is: \n\n{document_content}\n\n"
+         "{format_instructions}"
+        )
+    ]).partial(format_instructions=parser.get_format_instructions())
+    return prompt | model | parser
+
+def _reduce_chain(google_api_key: str, analysis: bool = False):
+    model = get_model(google_api_key)
+    parser = PydanticOutputParser(pydantic_object=DocumentAnalysis if analysis else LegalDocSummary)
+    extra = " Also give the final deadline or last date for action as last_date, in YYYY-MM-DD format." if analysis else ""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an expert legal assistant. Combine partial summaries of consecutive sections of one legal document into a single structured summary."),
+        ("human", "Write the combined summary in {language}. Merge and deduplicate the timelines (in chronological order), "
+         "risk factors and next steps; the urgency should reflect the most urgent section." + extra + " "
+         "The partial summaries are: \n\n{partials}\n\n"
+         "{format_instructions}"
         )
+    ]).partial(format_instructions=parser.get_format_instructions())
+    return prompt | model | parser
 
+def _dedupe(items: List[str]) -> List[str]:
+    seen, merged = set(), []
+    for item in items:
+        key = item.strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            merged.append(item)
+    return merged
 
-# New function for date extraction
-def extract_last_date(document_content: str, google_api_key: str) -> Optional[date]:
+def _merge_summaries(partials: List[LegalDocSummary]) -> LegalDocSummary:
+    """Deterministic reduce, used when the reduce call fails."""
+    most_urgent = max(partials, key=lambda p: p.urgency_percentage)
+    return LegalDocSummary(
+        category=partials[0].category,
+        description=partials[0].description,
+        important_timeline=_dedupe([t for p in partials for t in p.important_timeline]),
+        main_takeaway=_dedupe([t for p in partials for t in p.main_takeaway]),
+        risk_factors=_dedupe([r for p in partials for r in p.risk_factors]),
+        next_steps=_dedupe([n for p in partials for n in p.next_steps]),
+        urgency_percentage=most_urgent.urgency_percentage,
+        urgency_level=most_urgent.urgency_level
+    )
+
+def _section_inputs(document_content: str, language: str) -> List[Dict[str, Any]]:
+    sections = split_by_tokens(document_content, SUMMARY_SECTION_TOKENS)
+    return [{"section": i + 1, "sections": len(sections), "language": language, "document_content": section}
+            for i, section in enumerate(sections)]
+
+def _collect_partials(results: List[Any], timings: Dict[str, Any]) -> List[LegalDocSummary]:
     """
-    Extracts the last date to take action from a document.
+    Section summaries that succeeded. The numbers of failed sections go to
+    timings["failed_sections"], so a summary missing some of them is not taken as complete.
     """
-    model = get_model(google_api_key)
-    
-    class LastDateExtractor(BaseModel):
-        last_date: Optional[date] = Field(None, description="The last date to take action, in YYYY-MM-DD format. Return null if not found.")
+    partials, failed = [], []
+    for i, result in enumerate(results):
+        if result is None or isinstance(result, Exception):
+            failed.append(i + 1)
+        else:
+            partials.append(result)
+    timings["failed_sections"] = failed
+    if not partials:
+        raise RuntimeError("Every section of the document failed to summarize.")
+    if failed:
+        logger.warning(f"Summary is missing sections {failed} of {len(results)}")
+    return partials
+
+def _reduce_input(partials: List[LegalDocSummary], language: str) -> Dict[str, str]:
+    return {"language": language,
+            "partials": json.dumps([p.model_dump() for p in partials], ensure_ascii=False, indent=1)}
+
+async def _map_reduce_summary(document_content: str, language: str, google_api_key: str,
+                              timings: Dict[str, Any], analysis: bool = False):
+    start = time.perf_counter()
+    inputs = _section_inputs(document_content, language)
+    timings["split_seconds"] = time.perf_counter() - start
+    timings["sections"] = len(inputs)
+
+    section_chain = _section_chain(google_api_key)
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+
+    async def summarize_section(section_input: Dict[str, Any]):
+        async with semaphore:
+            try:
+                return await run_llm(section_chain, section_input)
+            except Exception as e:
+                return e
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(summarize_section(i) for i in inputs))
+    timings["map_seconds"] = time.perf_counter() - start
+    partials = _collect_partials(results, timings)
 
+    start = time.perf_counter()
+    try:
+        summary = await run_llm(_reduce_chain(google_api_key, analysis), _reduce_input(partials, language))
+    except Exception:
+        summary = _merge_summaries(partials)
+        if analysis:
+            summary = DocumentAnalysis(summary=summary, last_date=None)
+    timings["reduce_seconds"] = time.perf_counter() - start
+    return summary
+
+async def _arun_summary(document_content: str, language: str, google_api_key: str, analysis: bool):
+    total_start = time.perf_counter()
+    start = time.perf_counter()
+    tokens = count_tokens(document_content)
+    timings = {"tokens": tokens, "count_seconds": time.perf_counter() - start}
+
+    try:
+        if tokens <= SUMMARY_LONG_DOC_TOKENS:
+            timings["mode"] = "single"
+            start = time.perf_counter()
+            chain = _analysis_chain(google_api_key) if analysis else _summary_chain(google_api_key)
+            summary = await run_llm(chain, {"language": language, "document_content": document_content})
+            timings["llm_seconds"] = time.perf_counter() - start
+        else:
+            timings["mode"] = "map_reduce"
+            summary = await _map_reduce_summary(document_content, language, google_api_key, timings, analysis)
+    except Exception as e:
+        summary = DocumentAnalysis(summary=_error_summary(e), last_date=None) if analysis else _error_summary(e)
+
+    timings["total_seconds"] = time.perf_counter() - total_start
+    return summary, {k: round(v, 4) if isinstance(v, float) else v for k, v in timings.items()}
+
+async def asummarize_with_timings(document_content: str, language: str,
+                                  google_api_key: str) -> Tuple[LegalDocSummary, Dict[str, Any]]:
+    """
+    Summarize a document, choosing the single-call path for short documents and
+    map-reduce over token-budgeted sections for long ones. Returns the summary and
+    per-stage timings (seconds), including the mode used and the token count; for
+    map-reduce, `failed_sections` lists sections left out of the summary.
+    """
+    return await _arun_summary(document_content, language, google_api_key, analysis=False)
+
+async def aanalyze_document(document_content: str, language: str,
+                            google_api_key: str) -> Tuple[DocumentAnalysis, Dict[str, Any]]:
+    """
+    Summary and last date for action from the same LLM call (or the same map-reduce
+    run for long documents), with timings as in asummarize_with_timings.
+    """
+    return await _arun_summary(document_content, language, google_api_key, analysis=True)
+
+
+class LastDateExtractor(BaseModel):
+    last_date: Optional[date] = Field(None, description="The last date to take action, in YYYY-MM-DD format. Return null if not found.")
+
+def _last_date_chain(google_api_key: str):
+    model = get_model(google_api_key)
     parser = PydanticOutputParser(pydantic_object=LastDateExtractor)
     
     prompt = ChatPromptTemplate.from_messages([
@@ -65,11 +256,28 @@ def extract_last_date(document_content: str, google_api_key: str) -> Optional[da
         ("human", "Document content: \n\n{document_content}\n\n{format_instructions}")
     ]).partial(format_instructions=parser.get_format_instructions())
 
-    chain = prompt | model | parser
+    return prompt | model | parser
+
+# New function for date extraction
+def extract_last_date(document_content: str, google_api_key: str) -> Optional[date]:
+    """
+    Extracts the last date to take action from a document.
+    """
+    chain = _last_date_chain(google_api_key)
     
     try:
         response = chain.invoke({"document_content": document_content})
         return response.last_date
     except Exception as e:
-        print(f"Error extracting date: {e}")
-        return None
\ No newline at end of file
+        logger.exception(f"Error extracting date: {e}")
+        return None
+
+async def aextract_last_date(document_content: str, google_api_key: str) -> Optional[date]:
+    """Async variant of extract_last_date."""
+    chain = _last_date_chain(google_api_key)
+    try:
+        response = await run_llm(chain, {"document_content": document_content})
+        return response.last_date
+    except Exception as e:
+        logger.exception(f"Error extracting date: {e}")
+        return None
@@ -0,0 +1,65 @@
+# tests/conftest.py
+"""
+The app runs fully offline in tests: the fake LLM and the hashing embedder stand in for
+Gemini and the HuggingFace model, and everything it writes goes to a scratch directory.
+Settings are read at import time, so they are applied here before any module is imported.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.update({
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_LATENCY": "0",
+    "EMBEDDING_BACKEND": "hash",
+    "EMBEDDING_WARMUP": "false",
+    "RESULT_CACHE_BACKEND": "memory",
+    "SESSION_STORE_BACKEND": "memory",
+    "LLM_REQUESTS_PER_MINUTE": "0",
+    "LLM_TOKENS_PER_MINUTE": "0",
+    "INGEST_WORKERS": "1",
+    "GOOGLE_API_KEY": "test",
+})
+os.chdir(tempfile.mkdtemp(prefix="legaldoc-tests-"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app import app, stop_ingest_workers
+
+    yield TestClient(app)
+    stop_ingest_workers()
+
+
+def wait_for_job(client, job_id: str, timeout: float = 60.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/upload-and-build/{job_id}").json()
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(f"Ingestion job {job_id} did not finish")
+
+
+@pytest.fixture(scope="session")
+def ingest(client):
+    """Upload a synthetic document (to a new conversation, or an existing one) and wait for it."""
+    from benchmarks.corpus import make_document
+
+    def _ingest(filename: str, pages: int = 2, seed: int = 0, conversation_id: str = None) -> dict:
+        data = make_document(filename.rsplit(".", 1)[1], pages, seed)
+        url = f"/conversations/{conversation_id}/documents/" if conversation_id else "/upload-and-build/"
+        resp = client.post(url, files={"file": (filename, data)})
+        assert resp.status_code == 202, resp.text
+        status = wait_for_job(client, resp.json()["job_id"])
+        assert status["status"] == "done", status["error"]
+        return status
+
+    return _ingest
@@ -0,0 +1,74 @@
+# tests/test_answer_cache.py
+import numpy as np
+from langchain.schema import Document
+
+from modules.answer_cache import AnswerCache
+
+DOCS = [Document(page_content="Rent is due on the first.", metadata={"source": "lease.pdf", "chunk_id": 3}),
+        Document(page_content="Late fees apply.", metadata={"source": "lease.pdf", "chunk_id": 4})]
+
+
+def _unit(seed: int, dim: int = 16) -> np.ndarray:
+    vec = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def _near(vec: np.ndarray, cosine: float, seed: int = 99) -> np.ndarray:
+    """A unit vector at exactly `cosine` similarity to `vec`."""
+    other = _unit(seed, len(vec))
+    other -= (other @ vec) * vec
+    other /= np.linalg.norm(other)
+    return cosine * vec + np.sqrt(1 - cosine ** 2) * other
+
+
+def test_similarity_threshold():
+    cache = AnswerCache(threshold=0.95)
+    question = _unit(0)
+    cache.store("conv", 1, question, DOCS, "On the first.")
+
+    assert cache.lookup("conv", 1, 3 * question, DOCS) == "On the first."
+    assert cache.lookup("conv", 1, _near(question, 0.97), DOCS) == "On the first."
+    assert cache.lookup("conv", 1, _near(question, 0.90), DOCS) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_needs_the_same_chunk_set():
+    cache = AnswerCache(threshold=0.95)
+    question = _unit(1)
+    cache.store("conv", 1, question, DOCS, "On the first.")
+
+    # same chunks in another order still match; a different set does not
+    assert cache.lookup("conv", 1, question, DOCS[::-1]) == "On the first."
+    assert cache.lookup("conv", 1, question, DOCS[:1]) is None
+    assert cache.lookup("other", 1, question, DOCS) is None
+
+
+def test_index_version_change_and_invalidate_drop_answers():
+    cache = AnswerCache(threshold=0.95)
+    question = _unit(2)
+    cache.store("conv", 1, question, DOCS, "On the first.")
+    assert cache.lookup("conv", 2, question, DOCS) is None
+
+    cache.store("conv", 2, question, DOCS, "On the second.")
+    assert cache.lookup("conv", 2, question, DOCS) == "On the second."
+    assert cache.stats()["entries"] == 1
+
+    # a dropped conversation
+    cache.invalidate("conv")
+    assert cache.lookup("conv", 2, question, DOCS) is None
+    assert cache.stats()["indexes"] == 0
+
+
+def test_matrix_grows_with_entries_up_to_capacity():
+    cache = AnswerCache(threshold=0.99, max_entries=20)
+    cache.store("conv", 1, _unit(0), DOCS, "answer 0")
+    entries = cache._indexes["conv"]
+    assert len(entries.vectors) < 20
+
+    for i in range(1, 25):
+        cache.store("conv", 1, _unit(i), DOCS, f"answer {i}")
+    assert entries.size == 20 and len(entries.vectors) == 20
+    # the least recently used answers made room for the newest ones
+    assert cache.lookup("conv", 1, _unit(24), DOCS) == "answer 24"
+    assert cache.lookup("conv", 1, _unit(0), DOCS) is None
+    assert cache.lookup("conv", 1, _unit(10), DOCS) == "answer 10"
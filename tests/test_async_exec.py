@@ -0,0 +1,55 @@
+# tests/test_async_exec.py
+import pytest
+
+from modules import async_exec
+
+
+@pytest.fixture
+def process_executor(monkeypatch):
+    """Run the app with EXTRACTION_EXECUTOR=process for one test."""
+    async_exec.shutdown_executor()
+    monkeypatch.setattr(async_exec, "EXTRACTION_EXECUTOR", "process")
+    yield
+    async_exec.shutdown_executor()
+
+
+def test_chat_with_process_executor(client, ingest, process_executor):
+    conversation_id = ingest("notice.pdf", pages=2, seed=1)["conversation_id"]
+    resp = client.post("/chat/", json={"conversation_id": conversation_id, "query": "When is the rent due?"})
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["total_messages"] == 2
+
+    resp = client.get(f"/conversations/{conversation_id}/documents/")
+    assert resp.status_code == 200
+    assert list(resp.json()["sources"]) == ["notice.pdf"]
+
+
+def test_extraction_with_process_executor(client, process_executor):
+    from benchmarks.corpus import make_document
+
+    resp = client.post("/extract-last-date/", files={"file": ("notice.txt", make_document("txt", 1, seed=2))})
+    assert resp.status_code == 200, resp.text
+    assert isinstance(async_exec._executor, async_exec.ProcessPoolExecutor)
+
+
+def test_run_blocking_accepts_unpicklable_callables(process_executor):
+    import asyncio
+    import threading
+
+    lock = threading.Lock()
+    assert asyncio.run(async_exec.run_blocking(lambda: lock.locked())) is False
+
+
+def test_process_executor_parses_long_pdfs_without_nested_pool(process_executor, monkeypatch):
+    import asyncio
+    from benchmarks.corpus import make_document
+    from modules import extraction
+    from utils import extract_text_from_pdf
+
+    # read by the spawned workers when they import the module
+    monkeypatch.setenv("EXTRACTION_PARALLEL_PAGES", "4")
+    data = make_document("pdf", 12, seed=3)
+    text = asyncio.run(async_exec.run_cpu(extract_text_from_pdf, data, "long.pdf"))
+    monkeypatch.setattr(extraction, "_pool_allowed", False)
+    assert text == extract_text_from_pdf(data, "long.pdf")
+    assert async_exec._executor._mp_context.get_start_method() == "spawn"
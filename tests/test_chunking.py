@@ -0,0 +1,36 @@
+# tests/test_chunking.py
+import pytest
+
+from benchmarks.corpus import document_text, make_document
+from modules.chunking import chunk_text, file_to_chunk_records, iter_chunks
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 200), (300, 50), (500, 0)])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_incremental_chunks_match_whole_text_split(seed, chunk_size, chunk_overlap):
+    # enough pages that the buffer is flushed several times
+    pages = document_text(12, seed)
+    incremental = [chunk for chunk, _ in iter_chunks([(i + 1, p) for i, p in enumerate(pages)], chunk_size, chunk_overlap)]
+    assert incremental == chunk_text("\n".join(pages), chunk_size, chunk_overlap)
+
+
+def test_chunks_carry_the_page_they_start_on():
+    pages = document_text(12, seed=3)
+    for chunk, meta in iter_chunks([(i + 1, p) for i, p in enumerate(pages)], 500, 50):
+        assert chunk[:40] in pages[meta["page"] - 1]
+
+
+def test_blank_pages_are_skipped():
+    records = list(iter_chunks([(1, "First page text."), (2, "   "), (3, "Third page text.")]))
+    assert records == [("First page text.\nThird page text.", {"page": 1})]
+
+
+@pytest.mark.parametrize("kind", ["pdf", "docx", "txt"])
+def test_bytes_and_path_give_the_same_chunks(tmp_path, kind):
+    data = make_document(kind, 3, seed=4)
+    path = tmp_path / f"doc.{kind}"
+    path.write_bytes(data)
+    from_path = file_to_chunk_records(str(path))
+    from_bytes = file_to_chunk_records(data, filename=f"upload.{kind}")
+    assert from_bytes == from_path
+    assert from_bytes[0]
@@ -0,0 +1,142 @@
+# tests/test_corpus.py
+import pytest
+
+from modules import retriever
+from modules.corpus import corpus
+from modules.retriever import NOT_FOUND_ANSWER
+
+
+def _wait_for_maintenance():
+    # the maintenance executor has one thread, so this runs after every queued compaction
+    corpus._maintenance.submit(lambda: None).result()
+
+
+def _chat(client, conversation_id: str, **extra):
+    resp = client.post("/chat/", json={"conversation_id": conversation_id, "query": "When is the rent due?", **extra})
+    assert resp.status_code == 200, resp.text
+    return resp.json()["answer"]
+
+
+def test_add_list_and_filter_by_source(client, ingest):
+    conversation_id = ingest("lease.pdf", seed=10)["conversation_id"]
+    ingest("notice.txt", seed=11, conversation_id=conversation_id)
+
+    documents = client.get(f"/conversations/{conversation_id}/documents/").json()
+    assert sorted(documents["sources"]) == ["lease.pdf", "notice.txt"]
+    assert documents["chunks"] == sum(entry["chunks"] for entry in documents["sources"].values())
+
+    assert _chat(client, conversation_id, sources=["notice.txt"]) != NOT_FOUND_ANSWER
+    assert _chat(client, conversation_id, sources=["missing.pdf"]) == NOT_FOUND_ANSWER
+
+
+@pytest.mark.parametrize("packing", [True, False])
+def test_chat_after_removing_last_document(client, ingest, monkeypatch, packing):
+    monkeypatch.setattr(retriever, "CONTEXT_PACKING", packing)
+    conversation_id = ingest("only.pdf", seed=12)["conversation_id"]
+    assert client.delete(f"/conversations/{conversation_id}/documents/only.pdf").status_code == 200
+
+    # before compaction the removed chunks are filtered out; after it the index is empty
+    assert _chat(client, conversation_id) == NOT_FOUND_ANSWER
+    _wait_for_maintenance()
+    assert client.get(f"/conversations/{conversation_id}/documents/").json()["chunks"] == 0
+    assert _chat(client, conversation_id) == NOT_FOUND_ANSWER
+
+    resp = client.post("/chat/stream/", json={"conversation_id": conversation_id, "query": "When is the rent due?"})
+    assert resp.status_code == 200
+    assert NOT_FOUND_ANSWER in resp.text
+
+    # the conversation can still take new documents
+    ingest("again.pdf", seed=13, conversation_id=conversation_id)
+    assert _chat(client, conversation_id) != NOT_FOUND_ANSWER
+
+
+def test_remove_unknown_document(client, ingest):
+    conversation_id = ingest("one.txt", seed=14)["conversation_id"]
+    assert client.delete(f"/conversations/{conversation_id}/documents/other.txt").status_code == 404
+
+
+def test_evicted_index_manifest_is_saved_and_dropped(client, ingest, monkeypatch):
+    from modules.corpus import KEY_LOCK_STRIPES
+    from modules.index_cache import index_cache
+
+    first = ingest("first.pdf", seed=30)["conversation_id"]
+    second = ingest("second.txt", seed=31)["conversation_id"]
+    _wait_for_maintenance()
+    expected = client.get(f"/conversations/{first}/documents/").json()
+
+    monkeypatch.setattr(index_cache, "max_bytes", 1)
+    index_cache.get(second)
+    with index_cache._lock:
+        index_cache._evict()
+    index_cache._finish_evictions()
+    _wait_for_maintenance()
+    assert first not in corpus._manifests
+    assert not index_cache.contains(first)
+
+    assert client.get(f"/conversations/{first}/documents/").json() == expected
+    assert len(corpus._locks) == KEY_LOCK_STRIPES
+
+
+def test_fetch_candidates_skips_chunks_missing_from_docstore():
+    import numpy as np
+    from modules.context_packing import fetch_candidates
+    from modules.embedding_store import new_faiss
+
+    vectors = np.random.default_rng(0).random((3, 384), dtype=np.float32)
+    db = new_faiss(["a", "b", "c"], vectors, [{} for _ in range(3)], ["0", "1", "2"])
+    db.docstore.delete(["1"])
+
+    _, docs, doc_vecs = fetch_candidates(db, "query", fetch_k=3)
+    assert sorted(d.page_content for d in docs) == ["a", "c"]
+    assert len(doc_vecs) == 2
+
+
+def _vectors(n: int, seed: int):
+    import numpy as np
+    return np.random.default_rng(seed).random((n, 384), dtype=np.float32)
+
+
+def test_add_document_appends_in_place(client):
+    from modules.index_cache import index_cache
+    from modules.vector_index import ColumnarDocstore
+
+    key = "in-place-append"
+    corpus.add_document(key, "a.txt", [f"a {i}" for i in range(5)], _vectors(5, 0))
+    _wait_for_maintenance()
+    # reopen from disk: the docstore is the columnar one
+    index_cache.invalidate(key)
+    db = index_cache.get(key)
+    assert isinstance(db.docstore, ColumnarDocstore)
+
+    vectors = _vectors(3, 1)
+    corpus.add_document(key, "b.txt", ["b 0", "b 1", "b 2"], vectors)
+    assert index_cache.get(key) is db
+    assert db.index.ntotal == 8
+    _, found = db.index.search(vectors[:1], 1)
+    assert db.docstore.search(db.index_to_docstore_id[int(found[0][0])]).page_content == "b 0"
+
+    _wait_for_maintenance()
+    index_cache.invalidate(key)
+    reloaded = index_cache.get(key)
+    assert [reloaded.docstore.search(str(i)).page_content for i in (4, 7)] == ["a 4", "b 2"]
+    assert sorted(corpus.list_documents(key)["sources"]) == ["a.txt", "b.txt"]
+
+
+def test_store_lock_excludes_writers_during_reads():
+    import threading
+    from modules.embedding_store import ReadWriteLock
+
+    lock = ReadWriteLock()
+    events = []
+
+    def append():
+        with lock.write():
+            events.append("wrote")
+
+    with lock.read():
+        writer = threading.Thread(target=append)
+        writer.start()
+        writer.join(0.1)
+        assert events == [] and lock._writers_waiting == 1
+    writer.join(1)
+    assert events == ["wrote"]
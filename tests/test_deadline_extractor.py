@@ -0,0 +1,77 @@
+# tests/test_deadline_extractor.py
+from datetime import date
+
+import app as app_module
+from modules.deadline_extractor import extract_deadline, head_and_tail
+
+
+def test_deadline_phrase_before_date():
+    result = extract_deadline("Dated 01/02/2025. You must reply on or before 15th March 2025, "
+                              "failing which the matter proceeds. Hearing held on 2025-01-10.")
+    assert result.last_date == date(2025, 3, 15)
+    assert result.confidence >= 0.9
+    assert result.windows
+
+
+def test_numeric_dates_are_day_first():
+    assert extract_deadline("Last date: 05/03/2025").last_date == date(2025, 3, 5)
+
+
+def test_relative_deadline_resolved_against_document_date():
+    result = extract_deadline("Notice dated 1 January 2025. Reply within thirty (30) days of receipt of this notice.")
+    assert result.last_date == date(2025, 1, 31)
+    assert result.reason.startswith("within 30 days")
+
+
+def test_bare_dates_have_low_confidence():
+    result = extract_deadline("Agreement signed on 2024-05-01 and amended on 2024-08-09.")
+    assert result.last_date == date(2024, 8, 9)
+    assert result.confidence < 0.5
+
+
+def test_no_dates():
+    result = extract_deadline("Rent is payable thirty days after execution of this agreement.")
+    assert result.last_date is None and result.confidence == 0.0 and result.windows == []
+
+
+def test_head_and_tail():
+    assert head_and_tail("short", chars=10) == "short"
+    text = "a" * 50 + "b" * 50
+    assert head_and_tail(text, chars=10) == "a" * 10 + "\n...\n" + "b" * 10
+
+
+def _post(client, name: str, text: str):
+    resp = client.post("/extract-last-date/", files={"file": (name, text.encode("utf-8"))})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_endpoint_uses_rules_and_caches(client):
+    text = "LEGAL NOTICE dated 2025-01-01. The last date to pay the arrears is 2025-02-28."
+    first = _post(client, "rules.txt", text)
+    assert (first["last_date"], first["source"]) == ("2025-02-28", "rules")
+    assert _post(client, "rules.txt", text)["source"] == "cache"
+
+
+def test_endpoint_sends_prose_deadlines_to_llm(client, monkeypatch):
+    seen = []
+
+    async def fake_extract(context, api_key):
+        seen.append(context)
+        return date(2025, 6, 30)
+
+    monkeypatch.setattr(app_module, "aextract_last_date", fake_extract)
+    text = "This lease commences on execution. Rent is payable thirty days after execution."
+    result = _post(client, "prose.txt", text)
+    assert (result["last_date"], result["source"]) == ("2025-06-30", "llm")
+    assert seen == [text]
+
+
+def test_endpoint_does_not_cache_missing_dates(client, monkeypatch):
+    async def no_date(context, api_key):
+        return None
+
+    monkeypatch.setattr(app_module, "aextract_last_date", no_date)
+    text = "There is no deadline in this letter at all."
+    assert _post(client, "nodate.txt", text)["source"] == "llm"
+    assert _post(client, "nodate.txt", text)["source"] == "llm"
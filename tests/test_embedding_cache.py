@@ -0,0 +1,47 @@
+# tests/test_embedding_cache.py
+import os
+
+import numpy as np
+
+from modules.embedding_cache import EmbeddingCache, text_hash
+
+
+def _vectors(n: int, dim: int = 8, offset: int = 0):
+    return np.arange(offset, offset + n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_round_trip_and_counts(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    hashes = [text_hash(f"chunk {i}") for i in range(5)]
+    cache.put_many("m", hashes[:3], _vectors(3))
+
+    found = cache.get_many("m", hashes)
+    assert sorted(found) == sorted(hashes[:3])
+    np.testing.assert_array_equal(found[hashes[1]], _vectors(3)[1])
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_eviction_compacts_and_keeps_live_rows(tmp_path):
+    cache = EmbeddingCache(tmp_path, max_entries=4)
+    for start in range(0, 12, 2):
+        hashes = [text_hash(f"chunk {i}") for i in range(start, start + 2)]
+        cache.put_many("m", hashes, _vectors(2, offset=start * 8))
+
+    survivors = [text_hash(f"chunk {i}") for i in range(8, 12)]
+    found = cache.get_many("m", survivors)
+    assert len(found) == 4
+    np.testing.assert_array_equal(found[survivors[0]], _vectors(1, offset=64)[0])
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".f32")]) == 1
+
+
+def test_missing_vector_file_is_a_miss(tmp_path):
+    cache = EmbeddingCache(tmp_path)
+    hashes = [text_hash("a"), text_hash("b")]
+    cache.put_many("m", hashes, _vectors(2))
+    for name in os.listdir(tmp_path):
+        if name.endswith(".f32"):
+            os.remove(tmp_path / name)
+
+    fresh = EmbeddingCache(tmp_path)
+    assert fresh.get_many("m", hashes) == {}
+    assert fresh.misses == 2
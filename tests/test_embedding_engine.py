@@ -0,0 +1,78 @@
+# tests/test_embedding_engine.py
+import numpy as np
+
+from modules import embedding_engine
+from modules.embedding_engine import EmbeddingEngine
+from modules.embedding_store import get_embedding_model
+
+
+class RecordingModel:
+    """Encodes a text as (its length, its number); remembers every batch it was given."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[len(text), int(text.split()[-1])] for text in texts]
+
+
+def _texts(n: int, seed: int = 0):
+    lengths = np.random.default_rng(seed).integers(1, 40, n)
+    return [f"{'w' * length} {i}" for i, length in enumerate(lengths)]
+
+
+def _engine(model):
+    engine = EmbeddingEngine("test-model", "cpu", normalize=False, batch_size=4, workers=0)
+    engine._model = lambda: model
+    return engine
+
+
+def test_length_sorted_batches_come_back_in_input_order():
+    model = RecordingModel()
+    texts = _texts(23)
+    progress = []
+    vectors = _engine(model).embed_array(texts, on_progress=lambda done, total: progress.append((done, total)))
+
+    assert vectors.dtype == np.float32 and vectors.shape == (23, 2)
+    np.testing.assert_array_equal(vectors[:, 1], np.arange(23))
+    np.testing.assert_array_equal(vectors[:, 0], [len(text) for text in texts])
+    # batches run longest first, so each one holds texts of similar length
+    batch_lengths = [[len(text) for text in batch] for batch in model.batches]
+    assert [len(batch) for batch in model.batches] == [4] * 5 + [3]
+    assert sum(batch_lengths, []) == sorted(sum(batch_lengths, []), reverse=True)
+    assert progress[-1] == (23, 23)
+
+
+def test_normalized_rows_and_empty_input():
+    engine = _engine(RecordingModel())
+    engine.normalize = True
+    vectors = engine.embed_array(_texts(5))
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+    assert engine.embed_array([]).shape == (0, 0)
+    assert engine.stats()["chunks"] == 5
+
+
+def test_disabled_pool_encodes_in_process(monkeypatch):
+    monkeypatch.setattr(embedding_engine, "_pool_allowed", False)
+    engine = _engine(RecordingModel())
+    engine.workers = 4
+    assert engine._pool() is None
+    assert engine.stats()["workers"] == 0
+
+
+def test_worker_pool_matches_in_process_vectors(monkeypatch):
+    monkeypatch.setattr(embedding_engine, "EMBEDDING_PARALLEL_MIN_CHUNKS", 0)
+    model = get_embedding_model(normalize=False)
+    texts = [f"clause {i}: " + "payment due " * (i % 7) for i in range(30)]
+    # the workers load the hashing model, whatever the name, under the test settings
+    pooled = EmbeddingEngine("test-model", "cpu", normalize=True, batch_size=8, workers=2)
+    try:
+        vectors = pooled.embed_array(texts)
+        assert pooled._executor is not None
+    finally:
+        pooled.shutdown()
+
+    expected = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(vectors, expected, rtol=1e-5, atol=1e-6)
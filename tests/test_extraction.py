@@ -0,0 +1,88 @@
+# tests/test_extraction.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.corpus import make_document
+from modules import extraction
+
+
+class RecordingPool(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.sources = []
+
+    def submit(self, fn, source, *args):
+        self.sources.append(source)
+        return super().submit(fn, source, *args)
+
+
+@pytest.fixture
+def page_pool(monkeypatch, tmp_path):
+    """Parse every PDF of more than 4 pages in ranges of 2 pages, on a pool that records its inputs."""
+    pool = RecordingPool()
+    monkeypatch.setattr(extraction, "EXTRACTION_PARALLEL_PAGES", 4)
+    monkeypatch.setattr(extraction, "EXTRACTION_PAGE_RANGE", 2)
+    monkeypatch.setattr(extraction, "EXTRACTION_PAGE_WORKERS", 2)
+    monkeypatch.setattr(extraction, "_get_page_pool", lambda: pool)
+    monkeypatch.setattr(extraction.tempfile, "tempdir", str(tmp_path))
+    yield pool
+    pool.shutdown()
+
+
+def _sequential_pages(data: bytes):
+    with extraction._open_pdf(data) as doc:
+        return [(i + 1, doc[i].get_text()) for i in range(doc.page_count)]
+
+
+def test_parallel_pages_match_sequential(page_pool, tmp_path):
+    data = make_document("pdf", 9, seed=6)
+    pages = list(extraction.iter_pdf_pages(data))
+    assert pages == _sequential_pages(data)
+
+    # the bytes were written to one temp file, passed by path and removed afterwards
+    assert len(page_pool.sources) == 5
+    assert len(set(page_pool.sources)) == 1 and isinstance(page_pool.sources[0], str)
+    assert not os.listdir(tmp_path)
+
+
+def test_closing_early_removes_temp_file(page_pool, tmp_path):
+    pages = extraction.iter_pdf_pages(make_document("pdf", 9, seed=7))
+    assert next(pages)[0] == 1
+    pages.close()
+    assert not os.listdir(tmp_path)
+
+
+def test_disabled_pool_parses_in_process(page_pool, monkeypatch):
+    monkeypatch.setattr(extraction, "_pool_allowed", False)
+    data = make_document("pdf", 9, seed=8)
+    assert list(extraction.iter_pdf_pages(data)) == _sequential_pages(data)
+    assert page_pool.sources == []
+
+
+POOL_WORKER_SCRIPT = """
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.corpus import make_document
+from modules import extraction
+
+def pages(data):
+    return [n for n, _ in extraction.iter_pdf_pages(data)], extraction._page_pool is None
+
+if __name__ == "__main__":
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        numbers, no_nested_pool = pool.submit(pages, make_document("pdf", 12, seed=9)).result()
+    assert numbers == list(range(1, 13)) and no_nested_pool
+"""
+
+
+def test_extraction_in_pool_worker_exits():
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": root, "EXTRACTION_PARALLEL_PAGES": "4", "EXTRACTION_PAGE_WORKERS": "2"}
+    # a worker that started its own page pool would keep the interpreter from exiting
+    result = subprocess.run([sys.executable, "-c", POOL_WORKER_SCRIPT], cwd=root, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,68 @@
+# tests/test_index_cache.py
+import numpy as np
+
+from modules.embedding_store import new_faiss
+from modules.index_cache import IndexCache
+
+
+def _index(seed: int):
+    vectors = np.random.default_rng(seed).random((4, 8), dtype=np.float32)
+    return new_faiss([f"chunk {i}" for i in range(4)], vectors, [{} for _ in range(4)], [str(i) for i in range(4)])
+
+
+def test_eviction_drops_version_and_notifies():
+    cache = IndexCache(max_bytes=1)
+    evicted = []
+    cache.on_evict(evicted.append)
+
+    cache.put("a", _index(0))
+    version_a = cache.version("a")
+    cache.put("b", _index(1))
+    assert evicted == ["a"]
+    assert not cache.contains("a")
+    assert cache._versions.keys() == {"b"}
+    assert cache.version("a") == 0
+
+    cache.put("a", _index(0))
+    # a reloaded or rebuilt index never gets a version an answer cache may still hold
+    assert cache.version("a") not in (0, version_a)
+
+
+def test_invalidate_drops_version():
+    cache = IndexCache()
+    cache.put("a", _index(0))
+    cache.invalidate("a")
+    assert cache.version("a") == 0
+    assert not cache._versions
+
+
+def test_evicted_index_is_saved_outside_the_lock(monkeypatch):
+    import threading
+    from modules import index_cache as index_cache_module
+
+    started, release, saved = threading.Event(), threading.Event(), []
+
+    def slow_save(db, path):
+        started.set()
+        release.wait(5)
+        saved.append(db)
+
+    monkeypatch.setattr(index_cache_module, "save_faiss", slow_save)
+    cache = IndexCache(max_bytes=1)
+    evicted = []
+    cache.on_evict(evicted.append)
+    dirty = cache.put("a", _index(0), dirty=True)
+
+    putter = threading.Thread(target=cache.put, args=("b", _index(1)))
+    putter.start()
+    assert started.wait(5)
+    # the save is in progress: the cache still answers, and the evicted index is not
+    # reloaded from its stale files
+    assert cache.contains("b")
+    assert cache.get("a") is dirty
+    assert "a" not in evicted
+
+    release.set()
+    putter.join(5)
+    assert saved[0] is dirty and "a" in evicted
+    assert "a" not in cache._saving
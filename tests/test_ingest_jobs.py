@@ -0,0 +1,49 @@
+# tests/test_ingest_jobs.py
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+from benchmarks.corpus import make_document
+from modules import ingest_jobs as ingest_module
+from modules.ingest_jobs import ingest_jobs
+
+
+def test_corpus_update_runs_on_finisher_thread(ingest, monkeypatch):
+    threads = []
+    add_document = ingest_module.corpus.add_document
+
+    def recording_add_document(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return add_document(*args, **kwargs)
+
+    monkeypatch.setattr(ingest_module.corpus, "add_document", recording_add_document)
+    status = ingest("finisher.txt", seed=20)
+    assert status["chunks"] > 0
+    assert threads and threads[0].startswith("ingest-finish")
+    assert ingest_jobs.stats()["active"] == 0
+
+
+def test_failed_job_reports_error(client):
+    from tests.conftest import wait_for_job
+
+    resp = client.post("/upload-and-build/", files={"file": ("empty.txt", b"   ")})
+    status = wait_for_job(client, resp.json()["job_id"])
+    assert status["status"] == "failed"
+    assert "empty" in status["error"]
+    assert ingest_jobs.stats()["active"] == 0
+
+
+def test_submit_failure_releases_slot_and_upload(client, monkeypatch):
+    closed = []
+    monkeypatch.setattr(ingest_module.BufferedUpload, "close", lambda self: closed.append(self.filename))
+    ingest_jobs._ensure_started()
+
+    def broken_submit(*args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(ingest_jobs._executor, "submit", broken_submit)
+    jobs_before = len(ingest_jobs._jobs)
+    resp = client.post("/upload-and-build/", files={"file": ("broken.txt", make_document("txt", 1, seed=21))})
+    assert resp.status_code == 503
+    assert closed == ["broken.txt"]
+    assert ingest_jobs.stats()["active"] == 0
+    assert len(ingest_jobs._jobs) == jobs_before
@@ -0,0 +1,86 @@
+# tests/test_llm_gateway.py
+import asyncio
+import threading
+from typing import List
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from modules import llm_gateway as gateway_module
+from modules.fake_llm import FakeChatModel
+from modules.llm_gateway import LLMGateway, TransientLLMError
+
+PROMPT = [HumanMessage(content="When is the rent due?")]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Raises the queued errors in turn, then answers."""
+
+    errors: List[Exception] = []
+    attempts: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="On the first."))])
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(gateway_module, "LLM_RETRY_BASE_SECONDS", 0.0)
+    return LLMGateway(requests_per_minute=0, tokens_per_minute=0, max_retries=2)
+
+
+def test_transient_errors_are_retried(gateway):
+    client = ScriptedChatModel(errors=[TransientLLMError("quota"), TimeoutError("slow")])
+    result = gateway.generate(client, PROMPT)
+    assert result.generations[0].message.content == "On the first."
+    assert client.attempts == 3
+    assert gateway.stats()["retries"] == 2 and gateway.stats()["failures"] == 0
+
+
+def test_retries_stop_at_max_and_on_permanent_errors(gateway):
+    client = ScriptedChatModel(errors=[TransientLLMError("quota")] * 3)
+    with pytest.raises(TransientLLMError):
+        gateway.generate(client, PROMPT)
+    assert client.attempts == 3
+
+    client = ScriptedChatModel(errors=[ValueError("bad request")])
+    with pytest.raises(ValueError):
+        gateway.generate(client, PROMPT)
+    assert client.attempts == 1
+    assert gateway.stats()["failures"] == 2
+
+
+def test_identical_concurrent_calls_are_coalesced(gateway):
+    client = FakeChatModel(latency=0.2)
+
+    async def ask_twice():
+        return await asyncio.gather(gateway.agenerate(client, PROMPT), gateway.agenerate(client, PROMPT),
+                                    gateway.agenerate(client, [HumanMessage(content="Who are the parties?")]))
+
+    first, second, other = asyncio.run(ask_twice())
+    assert first.generations[0].message.content == second.generations[0].message.content
+    # callers get their own copy of the shared result
+    assert first is not second
+    stats = gateway.stats()
+    assert stats["calls"] == 2 and stats["coalesced"] == 1 and stats["in_flight"] == 0
+
+
+def test_sync_calls_from_threads_are_coalesced(gateway):
+    client = FakeChatModel(latency=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.generate(client, PROMPT))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 3
+    assert gateway.stats()["calls"] == 1 and gateway.stats()["coalesced"] == 2
@@ -0,0 +1,101 @@
+# tests/test_metrics.py
+import re
+from collections import defaultdict
+
+from modules.metrics import CallbackMetric, Counter, Histogram, Registry
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)",?')
+UNESCAPE = {"\\\\": "\\", "\\n": "\n", '\\"': '"'}
+
+
+def parse(text: str):
+    """
+    Read the text exposition format back: {family: {"help", "type", "samples"}}, where
+    samples are (name, labels, value). Fails on any line the format does not allow.
+    """
+    assert text.endswith("\n")
+    families, current = {}, None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            current, help = line[len("# HELP "):].split(" ", 1)
+            families[current] = {"help": help, "samples": []}
+        elif line.startswith("# TYPE "):
+            name, kind = line[len("# TYPE "):].split(" ")
+            assert name in families and kind in ("counter", "gauge", "histogram", "untyped")
+            families[name]["type"] = kind
+        elif line.startswith("# "):
+            continue
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"not a sample line: {line!r}"
+            name, raw_labels, value = match.groups()
+            labels = {}
+            if raw_labels:
+                assert LABEL.sub("", raw_labels) == "", f"bad labels: {raw_labels!r}"
+                labels = {key: re.sub(r'\\[\\n"]', lambda m: UNESCAPE[m.group()], raw)
+                          for key, raw in LABEL.findall(raw_labels)}
+            # every sample belongs to the family announced above it
+            assert current is not None and name.startswith(current)
+            families[current]["samples"].append((name, labels, float(value)))
+    return families
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.register(Histogram("op_seconds", "Operation latency.", ["op"], buckets=(0.1, 1.0)))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, op="read")
+    latency.observe(0.2, op="write")
+
+    family = parse(registry.render())["op_seconds"]
+    assert family["type"] == "histogram" and family["help"] == "Operation latency."
+    series = defaultdict(dict)
+    for name, labels, value in family["samples"]:
+        op = labels.pop("op")
+        series[op][(name, labels.get("le"))] = value
+
+    # a value equal to a bound falls in that bucket; +Inf counts everything
+    assert series["read"] == {
+        ("op_seconds_bucket", "0.1"): 2, ("op_seconds_bucket", "1"): 3, ("op_seconds_bucket", "+Inf"): 4,
+        ("op_seconds_sum", None): 3.65, ("op_seconds_count", None): 4,
+    }
+    assert series["write"][("op_seconds_bucket", "0.1")] == 0
+    assert series["write"][("op_seconds_bucket", "+Inf")] == series["write"][("op_seconds_count", None)] == 1
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    errors = registry.register(Counter("errors_total", "Errors by message.", ["message"]))
+    message = 'path C:\\tmp\\x "quoted"\nsecond line'
+    errors.inc(message=message)
+    errors.inc(2, message=message)
+
+    text = registry.render()
+    assert '\\\\tmp' in text and '\\"quoted\\"' in text and "\\nsecond" in text
+    assert parse(text)["errors_total"]["samples"] == [("errors_total", {"message": message}, 3.0)]
+
+
+def test_failing_callback_does_not_break_the_scrape():
+    registry = Registry()
+    registry.register(CallbackMetric("queue_depth", "Queued jobs.", "gauge", [], lambda: 1 / 0))
+    registry.register(CallbackMetric("workers", "Live workers.", "gauge", ["pool"], lambda: {("ingest",): 2}))
+
+    families = parse(registry.render())
+    assert families["queue_depth"]["samples"] == []
+    assert "# queue_depth unavailable: division by zero" in registry.render()
+    assert families["workers"] == {"help": "Live workers.", "type": "gauge",
+                                   "samples": [("workers", {"pool": "ingest"}, 2.0)]}
+
+
+def test_metrics_endpoint_is_valid_exposition(client):
+    client.get("/stats/result-cache")
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    families = parse(resp.text)
+    assert {"legaldoc_request_seconds", "legaldoc_stage_seconds", "legaldoc_cache_lookups_total"} <= families.keys()
+    assert all("type" in family for family in families.values())
+    requests = [labels for name, labels, _ in families["legaldoc_request_seconds"]["samples"]
+                if name == "legaldoc_request_seconds_count"]
+    assert {"method": "GET", "route": "/stats/result-cache", "status": "200"} in requests
@@ -0,0 +1,81 @@
+# tests/test_result_cache.py
+import time
+
+import pytest
+
+from modules.result_cache import InMemoryBackend, ResultCache, SQLiteBackend, make_key
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBackend(tmp_path / "results.sqlite", max_entries=3)
+    return InMemoryBackend(max_entries=3)
+
+
+def _expire(monkeypatch, seconds: float):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + seconds)
+
+
+def test_round_trip_and_stats(backend):
+    cache = ResultCache(backend, ttl=60)
+    assert cache.get("k") is None
+    cache.set("k", {"summary": ["a", "b"], "score": 0.5})
+    assert cache.get("k") == {"summary": ["a", "b"], "score": 0.5}
+    assert cache.stats() == {"backend": type(backend).__name__, "entries": 1, "hits": 1, "misses": 1,
+                             "hit_rate": 0.5}
+
+
+def test_entries_expire_after_ttl(backend, monkeypatch):
+    cache = ResultCache(backend, ttl=60)
+    cache.set("k", 1)
+    _expire(monkeypatch, 59)
+    assert cache.get("k") == 1
+    _expire(monkeypatch, 61)
+    assert cache.get("k") is None
+    # an expired entry is dropped on lookup, not only hidden
+    assert len(backend) == 0
+
+
+def test_least_recently_used_entry_is_evicted(backend, monkeypatch):
+    cache = ResultCache(backend, ttl=60)
+    for i, key in enumerate("abc"):
+        # distinct timestamps, so the SQLite backend orders by last use deterministically
+        _expire(monkeypatch, i)
+        cache.set(key, key)
+    _expire(monkeypatch, 3)
+    assert cache.get("a") == "a"
+    _expire(monkeypatch, 4)
+    cache.set("d", "d")
+    assert len(backend) == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+
+
+def test_sqlite_entries_are_shared_across_instances(tmp_path):
+    path = tmp_path / "results.sqlite"
+    ResultCache(SQLiteBackend(path, max_entries=3), ttl=60).set("k", {"last_date": "2025-03-31"})
+    assert ResultCache(SQLiteBackend(path, max_entries=3), ttl=60).get("k") == {"last_date": "2025-03-31"}
+
+
+def test_keys_change_with_any_part():
+    assert make_key("analysis", "abc", "English") == make_key("analysis", "abc", "English")
+    assert make_key("analysis", "abc", "English") != make_key("analysis", "abd", "English")
+    # the separator keeps ("ab", "c") and ("a", "bc") apart
+    assert make_key("ab", "c") != make_key("a", "bc")
+
+
+def test_summary_is_cached_by_content_hash(client):
+    data = {"language": "English"}
+    text = "The tenant shall pay the outstanding rent of 800 EUR on or before 2025-05-15."
+    first = client.post("/summarize/", files={"file": ("notice.txt", text.encode())}, data=data).json()
+    assert first["timings"].get("cache") != "hit"
+
+    # the same bytes under another name hit; changed content misses
+    renamed = client.post("/summarize/", files={"file": ("copy.txt", text.encode())}, data=data).json()
+    assert renamed["timings"] == {"cache": "hit"}
+    assert renamed["summary"] == first["summary"]
+    edited = client.post("/summarize/", files={"file": ("notice.txt", (text + " Amended.").encode())},
+                         data=data).json()
+    assert edited["timings"].get("cache") != "hit"
@@ -0,0 +1,59 @@
+# tests/test_session_store.py
+import os
+
+from modules.corpus import corpus
+from modules.embedding_store import index_path_for
+from modules.session_store import SessionStore, SQLiteSessions
+
+
+def _recording(store: SessionStore) -> list:
+    ended = []
+    store.on_end(lambda session_id, index_key: ended.append((session_id, index_key)))
+    return ended
+
+
+def test_memory_store_reports_evicted_and_expired_sessions():
+    store = SessionStore(max_sessions=2)
+    ended = _recording(store)
+    store.create("a", "index-a")
+    store.create("b", "index-b")
+    store.add_message("a", "user", "hello")
+    assert ended == []
+
+    store.create("c", "index-c")
+    assert ended == [("b", "index-b")]
+
+    store.ttl = -1
+    assert store.get("a") is None
+    assert ended[1:] == [("a", "index-a")]
+
+
+def test_persisted_sessions_end_when_purged(tmp_path):
+    store = SessionStore(SQLiteSessions(tmp_path / "sessions.sqlite"), max_sessions=1)
+    ended = _recording(store)
+    store.create("a", "index-a")
+    store.create("b", "index-b")
+    # evicted from the cache only; it can still be resumed from disk
+    assert ended == []
+    assert store.get("a") is not None
+
+    store.ttl = -1
+    store._last_purge = 0.0
+    store.create("c", "index-c")
+    assert sorted(ended) == [("a", "index-a"), ("b", "index-b")]
+
+
+def test_ended_conversation_index_is_deleted(client, ingest):
+    from app import sessions
+    from modules.answer_cache import answer_cache
+
+    conversation_id = ingest("lease.pdf", seed=20)["conversation_id"]
+    assert os.path.isdir(index_path_for(conversation_id))
+
+    answer_cache.store(conversation_id, 1, [1.0, 0.0], [], "cached")
+    sessions._sessions[conversation_id]["last_used"] = 0.0
+    assert client.get(f"/conversations/{conversation_id}/history").status_code == 400
+    corpus._maintenance.submit(lambda: None).result()
+    assert not os.path.exists(index_path_for(conversation_id))
+    assert conversation_id not in corpus._manifests
+    assert answer_cache.lookup(conversation_id, 1, [1.0, 0.0], []) is None
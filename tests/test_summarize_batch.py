@@ -0,0 +1,93 @@
+# tests/test_summarize_batch.py
+import io
+import json
+import asyncio
+import zipfile
+import functools
+
+from modules import uploads
+
+
+def _notice(tag: str) -> bytes:
+    return (f"NOTICE {tag}: The tenant shall pay the outstanding rent of 1,200 EUR on or before "
+            f"2025-03-31. Failure to pay may lead to termination of the lease.").encode()
+
+
+def _batch(client, files, **form):
+    resp = client.post("/summarize/batch/", files=[("files", f) for f in files],
+                       data={"language": "English", **{k: str(v).lower() for k, v in form.items()}})
+    records = [json.loads(line) for line in resp.text.splitlines()] if resp.status_code == 200 else None
+    return resp, records
+
+
+def _zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_records_stream_in_completion_order(client, monkeypatch):
+    import app
+
+    analyze = app.aanalyze_document
+
+    async def slow_for_first(document_content, *args, **kwargs):
+        if "slow-1" in document_content:
+            await asyncio.sleep(0.3)
+        return await analyze(document_content, *args, **kwargs)
+
+    monkeypatch.setattr(app, "aanalyze_document", slow_for_first)
+    resp, records = _batch(client, [("first.txt", _notice("slow-1")), ("second.txt", _notice("fast-2"))])
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert [(r["type"], r.get("filename")) for r in records] == [
+        ("summary", "second.txt"), ("summary", "first.txt"), ("done", None)]
+    assert [r["index"] for r in records[:2]] == [1, 0]
+    assert records[-1]["documents"] == 2 and records[-1]["failed"] == 0
+
+
+def test_zip_members_are_expanded(client):
+    archive = _zip({"a.txt": _notice("zip-a"), "nested/b.txt": _notice("zip-b"), "image.png": b"\x89PNG",
+                    "__MACOSX/._a.txt": b"resource fork"})
+    _, records = _batch(client, [("bundle.zip", archive), ("c.txt", _notice("zip-c"))])
+    assert sorted(r["filename"] for r in records if r["type"] == "summary") == ["a.txt", "b.txt", "c.txt"]
+    assert records[-1]["documents"] == 3
+
+
+def test_failed_document_gets_an_error_record(client):
+    _, records = _batch(client, [("broken.pdf", b"%PDF-1.4 truncated"), ("ok.txt", _notice("error-row"))])
+    by_name = {r.get("filename"): r for r in records}
+    assert by_name["broken.pdf"]["type"] == "error" and by_name["broken.pdf"]["error"]
+    assert by_name["ok.txt"]["type"] == "summary"
+    assert records[-1]["failed"] == 1
+
+
+def test_file_and_size_limits(client, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "SUMMARY_BATCH_MAX_FILES", 2)
+    resp, _ = _batch(client, [(f"{i}.txt", _notice(f"limit-{i}")) for i in range(3)])
+    assert resp.status_code == 413
+    resp, _ = _batch(client, [("bundle.zip", _zip({f"{i}.txt": _notice(f"zip-limit-{i}") for i in range(3)}))])
+    assert resp.status_code == 413
+
+    monkeypatch.setattr(app, "expand_zip", functools.partial(uploads.expand_zip, max_bytes=100))
+    resp, _ = _batch(client, [("bundle.zip", _zip({"big.txt": b"x" * 1000}))])
+    assert resp.status_code == 413
+
+    resp, _ = _batch(client, [("broken.zip", b"not a zip")])
+    assert resp.status_code == 400
+
+
+def test_ranking_by_urgency(client):
+    count = 4
+    files = [(f"{i}.txt", _notice(f"rank-{i}")) for i in range(count)]
+    _, records = _batch(client, files, sort_by_urgency=True)
+    summaries = {r["index"]: r["summary"] for r in records if r["type"] == "summary"}
+    ranking = records[-1]["ranking"]
+
+    assert sorted(r["index"] for r in ranking) == list(range(count))
+    urgencies = [r["urgency_percentage"] for r in ranking]
+    assert urgencies == sorted(urgencies, reverse=True)
+    assert all(summaries[r["index"]]["urgency_percentage"] == r["urgency_percentage"] for r in ranking)
@@ -0,0 +1,82 @@
+# tests/test_summarizer.py
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+import summarizer
+from benchmarks.corpus import document_text
+from models import LegalDocSummary
+
+
+def _partial(section: int) -> LegalDocSummary:
+    return LegalDocSummary(
+        category="Notice", description=f"Section {section}", important_timeline=[f"2025-01-0{section}"],
+        main_takeaway=["Pay the arrears."], risk_factors=[], next_steps=[], urgency_percentage=10 * section,
+        urgency_level="Low",
+    )
+
+
+@pytest.fixture
+def long_documents(monkeypatch):
+    """Send every document down the map-reduce path, in sections of a few hundred tokens."""
+    monkeypatch.setattr(summarizer, "SUMMARY_LONG_DOC_TOKENS", 100)
+    monkeypatch.setattr(summarizer, "SUMMARY_SECTION_TOKENS", 400)
+    return "\n".join(document_text(3, seed=5))
+
+
+@pytest.fixture
+def failing_section(monkeypatch):
+    def summarize(inputs):
+        if inputs["section"] == 2:
+            raise RuntimeError("quota exceeded")
+        return _partial(inputs["section"])
+
+    monkeypatch.setattr(summarizer, "_section_chain", lambda api_key: RunnableLambda(summarize))
+
+
+def test_sync_summary_works_inside_a_running_loop(long_documents):
+    async def caller():
+        return summarizer.generate_document_summary(long_documents, "English", "key")
+
+    summary = asyncio.run(caller())
+    assert summary.category != "Error"
+
+
+def test_map_reduce_reports_failed_sections(long_documents, failing_section):
+    summary, timings = asyncio.run(summarizer.asummarize_with_timings(long_documents, "English", "key"))
+    assert timings["mode"] == "map_reduce"
+    assert timings["sections"] > 2
+    assert timings["failed_sections"] == [2]
+    assert summary.category != "Error"
+
+
+def test_map_reduce_complete_run_has_no_failed_sections(long_documents):
+    _, timings = asyncio.run(summarizer.aanalyze_document(long_documents, "English", "key"))
+    assert timings["failed_sections"] == []
+
+
+def test_collect_partials_fails_when_every_section_failed():
+    with pytest.raises(RuntimeError):
+        summarizer._collect_partials([RuntimeError("a"), None], {})
+
+
+def test_partial_summary_is_not_cached(client, long_documents, failing_section):
+    data = {"language": "English"}
+    files = {"file": ("long.txt", long_documents.encode("utf-8"))}
+    first = client.post("/summarize/", files=files, data=data).json()
+    assert first["timings"]["failed_sections"] == [2]
+    second = client.post("/summarize/", files=files, data=data).json()
+    assert second["timings"].get("cache") != "hit"
+
+
+def test_failed_date_extraction_is_logged(monkeypatch, caplog):
+    def fail(inputs):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(summarizer, "_last_date_chain", lambda api_key: RunnableLambda(fail))
+    with caplog.at_level("ERROR", logger=summarizer.__name__):
+        assert summarizer.extract_last_date("text", "key") is None
+        assert asyncio.run(summarizer.aextract_last_date("text", "key")) is None
+    failures = [r for r in caplog.records if r.getMessage() == "Error extracting date: quota exceeded"]
+    assert len(failures) == 2 and all(r.exc_info for r in failures)
@@ -0,0 +1,46 @@
+# tests/test_uploads.py
+import asyncio
+
+from starlette.formparsers import MultiPartParser
+
+from modules.uploads import UPLOAD_MEMORY_BYTES, UploadRequest, UploadRoute
+
+BOUNDARY = "upload-test-boundary"
+
+
+def _form(request_class, size: int):
+    body = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.txt\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n").encode() + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+    scope = {"type": "http", "method": "POST", "path": "/",
+             "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def parse():
+        form = await request_class(scope, receive).form()
+        upload = form["file"]
+        rolled = upload.file._rolled
+        await form.close()
+        return rolled
+
+    return asyncio.run(parse())
+
+
+def test_upload_request_keeps_files_in_memory_without_patching_starlette():
+    from starlette.requests import Request
+
+    size = 2 * 1024 * 1024
+    assert size < UPLOAD_MEMORY_BYTES
+    assert _form(UploadRequest, size) is False
+    # other apps in the process keep Starlette's default spooling
+    assert _form(Request, size) is True
+    assert MultiPartParser.spool_max_size == 1024 * 1024
+
+
+def test_app_routes_parse_uploads_with_upload_request():
+    from fastapi.routing import APIRoute
+    from app import app
+
+    routes = [route for route in app.routes if isinstance(route, APIRoute)]
+    assert routes and all(isinstance(route, UploadRoute) for route in routes)
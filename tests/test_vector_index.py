@@ -0,0 +1,134 @@
+# tests/test_vector_index.py
+import numpy as np
+import pytest
+
+from modules.embedding_store import clone_faiss, load_faiss, new_faiss, save_faiss
+from modules.vector_index import ColumnarDocstore, read_store
+
+TEXTS = ["Rent is due on the first.", "Délai de préavis: trente jours.", "", "Schedule A — fees"]
+METADATAS = [{"source": "a.pdf", "page": 1}, {"source": "b.docx"}, {"source": "a.pdf", "page": 2}, {"note": None}]
+
+
+def _store():
+    vectors = np.random.default_rng(0).random((len(TEXTS), 384), dtype=np.float32)
+    return new_faiss(TEXTS, vectors, METADATAS, [str(i) for i in range(len(TEXTS))]), vectors
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, monkeypatch, mmap):
+    from modules import vector_index
+    monkeypatch.setattr(vector_index, "INDEX_MMAP", mmap)
+    db, vectors = _store()
+    save_faiss(db, str(tmp_path))
+
+    index, ids, docstore, extra = read_store(tmp_path, mmap=mmap)
+    assert ids == ["0", "1", "2", "3"]
+    assert isinstance(docstore, ColumnarDocstore)
+    for i, text in enumerate(TEXTS):
+        doc = docstore.search(str(i))
+        assert doc.page_content == text
+        # None values are not written back as keys
+        assert doc.metadata == {k: v for k, v in METADATAS[i].items() if v is not None}
+    assert docstore.search("99") == "ID 99 not found."
+    assert extra["normalize_L2"] is False
+
+    loaded = load_faiss(str(tmp_path))
+    _, expected = db.index.search(vectors[:1], 4)
+    _, found = loaded.index.search(vectors[:1], 4)
+    assert found.tolist() == expected.tolist()
+
+
+def test_loaded_store_is_read_only_until_cloned(tmp_path):
+    db, _ = _store()
+    save_faiss(db, str(tmp_path))
+    loaded = load_faiss(str(tmp_path))
+    with pytest.raises(NotImplementedError):
+        loaded.docstore.delete(["0"])
+
+    copy = clone_faiss(loaded)
+    copy.add_embeddings([("New clause", np.ones(384, dtype=np.float32))], metadatas=[{"source": "c.txt"}], ids=["4"])
+    assert copy.index.ntotal == 5 and loaded.index.ntotal == 4
+    save_faiss(copy, str(tmp_path))
+    assert load_faiss(str(tmp_path)).docstore.search("4").page_content == "New clause"
+
+
+def test_empty_texts_round_trip(tmp_path):
+    vectors = np.random.default_rng(1).random((2, 384), dtype=np.float32)
+    save_faiss(new_faiss(["", ""], vectors, None, ["0", "1"]), str(tmp_path))
+    assert load_faiss(str(tmp_path)).docstore.search("1").page_content == ""
+
+
+def _clustered(n: int, d: int = 32, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(64, d))
+    return (centres[rng.integers(0, 64, n)] + 0.1 * rng.normal(size=(n, d))).astype(np.float32)
+
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "pq"])
+def test_ivf_reconstructs_after_build_append_and_rebuild(monkeypatch, tmp_path, storage):
+    from modules import vector_index
+    from modules.embedding_store import append_faiss, needs_rebuild, rebuild_faiss, remove_faiss
+    from modules.vector_index import index_kind
+
+    monkeypatch.setattr(vector_index, "INDEX_TYPE", "ivf")
+    monkeypatch.setattr(vector_index, "INDEX_STORAGE", storage)
+    # above the PQ training threshold, so every storage mode is really built
+    vectors = _clustered(10_050)
+    vectors, extra = vectors[:10_000], vectors[10_000:]
+    n = len(vectors)
+    db = new_faiss([f"chunk {i}" for i in range(n)], vectors, None, [str(i) for i in range(n)])
+    assert index_kind(db.index) == ("ivf", storage)
+
+    rebuilt = rebuild_faiss(db, drop_ids=["0", "1"])
+    assert rebuilt.index.ntotal == n - 2
+    assert rebuilt.docstore.search(rebuilt.index_to_docstore_id[0]).page_content == "chunk 2"
+
+    db = append_faiss(clone_faiss(db), [f"new {i}" for i in range(50)], extra, [{} for _ in range(50)],
+                      [str(n + i) for i in range(50)])
+    tail = db.index.reconstruct_batch(np.arange(n, n + 50, dtype=np.int64))
+    error = np.linalg.norm(tail - extra, axis=1).mean() / np.linalg.norm(extra, axis=1).mean()
+    assert error < (0.5 if storage == "pq" else 1e-3)
+
+    smaller = remove_faiss(db, [str(i) for i in range(10)])
+    assert smaller.index.ntotal == n + 40
+    assert [smaller.index_to_docstore_id[i] for i in (0, n + 39)] == ["10", str(n + 49)]
+    _, found = smaller.index.search(extra[-1:], 1)
+    assert smaller.index_to_docstore_id[int(found[0][0])] == str(n + 49)
+
+    save_faiss(smaller, str(tmp_path))
+    loaded = load_faiss(str(tmp_path))
+    loaded.index.reconstruct_batch(np.arange(loaded.index.ntotal, dtype=np.int64))
+    assert not needs_rebuild(loaded)
+
+
+def test_float16_ivf_grows_into_pq(monkeypatch):
+    from modules import vector_index
+    from modules.embedding_store import append_faiss, needs_rebuild, rebuild_faiss
+    from modules.vector_index import index_kind
+
+    monkeypatch.setattr(vector_index, "INDEX_TYPE", "ivf")
+    monkeypatch.setattr(vector_index, "INDEX_STORAGE", "pq")
+    vectors = _clustered(10_100)
+    vectors, extra = vectors[:9_900], vectors[9_900:]
+    db = new_faiss([""] * len(vectors), vectors, None, [str(i) for i in range(len(vectors))])
+    assert index_kind(db.index) == ("ivf", "float16")
+
+    db = append_faiss(clone_faiss(db), [""] * 200, extra, [{} for _ in range(200)],
+                      [str(len(vectors) + i) for i in range(200)])
+    assert needs_rebuild(db)
+    assert index_kind(rebuild_faiss(db).index) == ("ivf", "pq")
+
+
+def test_pickled_index_needs_explicit_migration(tmp_path):
+    from modules.embedding_store import LegacyIndexError
+    from modules.migrate_indexes import main
+
+    db, vectors = _store()
+    legacy = tmp_path / "conversation"
+    db.save_local(str(legacy))
+    with pytest.raises(LegacyIndexError):
+        load_faiss(str(legacy))
+
+    assert main([str(tmp_path)]) == 0
+    assert not (legacy / "index.pkl").exists()
+    assert load_faiss(str(legacy)).docstore.search("1").page_content == TEXTS[1]
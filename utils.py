@@ -1,16 +1,10 @@
 # app/utils.py
-# (Example for PDF, you can expand for other formats)
-import fitz  # PyMuPDF
+from modules.extraction import extract_text
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extracts text from a PDF file."""
-    text = ""
+def extract_text_from_pdf(file_path, filename: str = None) -> str:
+    """Extracts text from a PDF file (a path, or its bytes plus the filename)."""
     try:
-        doc = fitz.open(file_path)
-        for page in doc:
-            text += page.get_text()
-        doc.close()
+        return extract_text(file_path, filename)
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
         return ""
-    return text
\ No newline at end of file